@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken
+from pybit.unified_trading import HTTP
+from exchange import Exchange
+
+# Authenticated clients kept open at once, and how long an unused one survives
+ACCOUNT_POOL_SIZE = int(os.getenv('ACCOUNT_POOL_SIZE', '64'))
+ACCOUNT_IDLE_TIMEOUT = float(os.getenv('ACCOUNT_IDLE_TIMEOUT', '900'))
+# Bybit requests one account may have in flight; each account gets its own workers
+ACCOUNT_WORKERS = int(os.getenv('ACCOUNT_WORKERS', '4'))
+# A client used this recently may still be mid-handler and is never evicted for space
+MIN_IDLE_BEFORE_EVICTION = 60
+
+# user_data key holding a user's encrypted API key and secret
+CREDENTIALS_KEY = 'bybit_credentials'
+
+
+class CredentialCipher:
+    """Encrypts API credentials before they reach user data and the persistence file."""
+
+    def __init__(self, key):
+        self._fernet = Fernet(key)
+
+    def encrypt(self, api_key, api_secret):
+        return self._fernet.encrypt(json.dumps([api_key, api_secret]).encode())
+
+    def decrypt(self, token):
+        api_key, api_secret = json.loads(self._fernet.decrypt(token))
+        return api_key, api_secret
+
+
+class _PooledAccount:
+    __slots__ = ('exchange', 'api_secret', 'last_used')
+
+    def __init__(self, exchange, api_secret):
+        self.exchange = exchange
+        self.api_secret = api_secret
+        self.last_used = time.monotonic()
+
+
+class AccountPool:
+    """Maps Telegram users to Bybit accounts and keeps their clients warm.
+
+    Users who stored their own keys get a pooled Exchange per API key: the
+    pybit session keeps its connections alive between updates, and each
+    account has its own workers, rate limit buckets and cache, so a burst
+    from one account only ever queues behind itself. The pool is an LRU
+    bounded by ``size``; clients idle for ``idle_timeout`` seconds are
+    closed. Users without keys fall back to ``default`` (the account from
+    the environment) if they are in ``default_users``, or always when
+    ``default_users`` is None. ``client_class`` builds the clients, pybit's
+    HTTP unless the bot runs against the simulator; ``cache_factory``, given
+    an API key, builds the account's snapshot cache.
+    """
+
+    def __init__(self, cipher=None, default=None, default_users=None, size=ACCOUNT_POOL_SIZE,
+                 idle_timeout=ACCOUNT_IDLE_TIMEOUT, workers=ACCOUNT_WORKERS, testnet=False, client_class=HTTP,
+                 cache_factory=None):
+        self.cipher = cipher
+        self.default = default
+        self.default_users = default_users
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.workers = workers
+        self.testnet = testnet
+        self.client_class = client_class
+        self.cache_factory = cache_factory
+        self._accounts = OrderedDict()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def credentials(self, user_data):
+        token = user_data.get(CREDENTIALS_KEY) if user_data else None
+        if token is None or self.cipher is None:
+            return None
+        try:
+            return self.cipher.decrypt(token)
+        except InvalidToken:
+            logging.error("Stored credentials cannot be decrypted with the configured key")
+            return None
+
+    def get(self, user_id, user_data):
+        """The Exchange for this user, or None if they have no account to trade."""
+        credentials = self.credentials(user_data)
+        if credentials is not None:
+            return self.client(*credentials)
+        if self.default is not None and (self.default_users is None or user_id in self.default_users):
+            return self.default
+        return None
+
+    def client(self, api_key, api_secret):
+        account = self._accounts.get(api_key)
+        if account is not None and account.api_secret != api_secret:
+            self.discard(api_key)
+            account = None
+        if account is None:
+            client = self.client_class(
+                testnet=self.testnet,
+                api_key=api_key,
+                api_secret=api_secret,
+                return_response_headers=True
+            )
+            account = self._accounts[api_key] = _PooledAccount(
+                Exchange(
+                    client,
+                    max_workers=self.workers,
+                    cache=self.cache_factory(api_key) if self.cache_factory is not None else None
+                ),
+                api_secret
+            )
+            self._trim()
+        else:
+            self._accounts.move_to_end(api_key)
+        account.last_used = time.monotonic()
+        return account.exchange
+
+    def active(self):
+        """The environment account, if any, and every pooled client, without touching the LRU."""
+        exchanges = [account.exchange for account in self._accounts.values()]
+        if self.default is not None:
+            exchanges.insert(0, self.default)
+        return exchanges
+
+    def store(self, user_data, api_key, api_secret):
+        user_data[CREDENTIALS_KEY] = self.cipher.encrypt(api_key, api_secret)
+
+    def forget(self, user_data):
+        credentials = self.credentials(user_data)
+        user_data.pop(CREDENTIALS_KEY, None)
+        if credentials is not None:
+            self.discard(credentials[0])
+        return credentials is not None
+
+    def discard(self, api_key):
+        account = self._accounts.pop(api_key, None)
+        if account is not None:
+            account.exchange.shutdown()
+
+    def _trim(self):
+        # Oldest first; anything used within the last minute may still be in a handler
+        now = time.monotonic()
+        for api_key, account in list(self._accounts.items()):
+            if len(self._accounts) <= self.size:
+                return
+            if now - account.last_used >= MIN_IDLE_BEFORE_EVICTION:
+                self.discard(api_key)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        idle = [
+            api_key for api_key, account in self._accounts.items()
+            if now - account.last_used >= self.idle_timeout
+        ]
+        for api_key in idle:
+            self.discard(api_key)
+        return len(idle)
+
+    def close(self):
+        for api_key in list(self._accounts):
+            self.discard(api_key)
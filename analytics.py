@@ -0,0 +1,122 @@
+import numpy as np
+
+# Symbol suffixes that follow the base coin; USDC perpetuals end in PERP
+QUOTE_COINS = ('USDT', 'USDC', 'USD', 'PERP')
+
+
+def base_coin(symbol):
+    """Best guess at a contract's base coin when its instrument info is not at hand."""
+    if '-' in symbol:
+        # Options and dated futures, e.g. BTC-27DEC24-60000-C
+        return symbol.split('-', 1)[0]
+    for quote in QUOTE_COINS:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)]
+    return symbol
+
+
+def _column(rows, key):
+    # Bybit sends numbers as strings, empty when not applicable
+    return np.fromiter((float(row.get(key) or 0) for row in rows), dtype=float, count=len(rows))
+
+
+class PositionFrame:
+    """Open positions held as one numpy column per field.
+
+    Parsing the rows is the only per-position Python work; PnL, ROE,
+    exposure and risk figures are whole-array operations, so their cost
+    per position stays flat as the book grows.
+    """
+
+    def __init__(self, rows, coin_of=base_coin):
+        self.rows = [row for row in rows if float(row.get('size') or 0) > 0]
+        rows = self.rows
+        self.symbols = np.array([row['symbol'] for row in rows], dtype=str)
+        self.coins = np.array([coin_of(row['symbol']) for row in rows], dtype=str)
+        self.sign = np.fromiter((1.0 if row.get('side') == 'Buy' else -1.0 for row in rows), dtype=float, count=len(rows))
+        self.size = _column(rows, 'size')
+        self.entry_price = _column(rows, 'avgPrice')
+        self.mark_price = _column(rows, 'markPrice')
+        self.unrealised_pnl = _column(rows, 'unrealisedPnl')
+        self.margin = _column(rows, 'positionIM')
+        self.leverage = _column(rows, 'leverage')
+        self.liq_price = _column(rows, 'liqPrice')
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.notional = self.size * self.mark_price
+            self.pnl_pct = np.where(
+                self.entry_price > 0,
+                self.sign * (self.mark_price - self.entry_price) / self.entry_price * 100,
+                0.0
+            )
+            self.roe = np.where(self.margin > 0, self.unrealised_pnl / self.margin * 100, 0.0)
+            # How far the mark price may still move against the position, in percent
+            self.liq_distance = np.where(
+                (self.liq_price > 0) & (self.mark_price > 0),
+                self.sign * (self.mark_price - self.liq_price) / self.mark_price * 100,
+                np.nan
+            )
+            # Margin the position ties up at its leverage; Bybit's own figure when there is no leverage
+            self.margin_used = np.where(self.leverage > 0, self.notional / self.leverage, self.margin)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def exposure(self):
+        """(coin, net, gross) notional per base coin, largest gross exposure first."""
+        coins, index = np.unique(self.coins, return_inverse=True)
+        net = np.bincount(index, weights=self.sign * self.notional, minlength=len(coins))
+        gross = np.bincount(index, weights=self.notional, minlength=len(coins))
+        order = np.argsort(-gross, kind='stable')
+        return [(str(coins[i]), float(net[i]), float(gross[i])) for i in order]
+
+    def risk(self, equity=0.0):
+        """Portfolio-wide exposure, margin and concentration figures as a dict."""
+        gross = float(self.notional.sum())
+        exposure = self.exposure()
+        shares = np.array([coin_gross for _, _, coin_gross in exposure]) / gross if gross else np.zeros(0)
+        summary = {
+            'positions': len(self),
+            'gross_exposure': gross,
+            'net_exposure': float((self.sign * self.notional).sum()),
+            'unrealised_pnl': float(self.unrealised_pnl.sum()),
+            'margin_used': float(self.margin_used.sum()),
+            'exposure': exposure,
+            'largest_share': float(shares[0]) if len(shares) else 0.0,
+            # Herfindahl index of gross exposure: 1 when everything is in one coin
+            'concentration': float((shares ** 2).sum()),
+            'nearest_liquidation': None,
+        }
+        if equity > 0:
+            summary['effective_leverage'] = gross / equity
+            summary['margin_usage'] = summary['margin_used'] / equity
+        if len(self) and not np.isnan(self.liq_distance).all():
+            i = int(np.nanargmin(self.liq_distance))
+            summary['nearest_liquidation'] = (str(self.symbols[i]), float(self.liq_distance[i]))
+        return summary
+
+
+def account_totals(wallet_response):
+    """Equity and margin totals of the first account in a wallet balance response."""
+    accounts = wallet_response.get('result', {}).get('list', [])
+    account = accounts[0] if accounts else {}
+    return {
+        'equity': float(account.get('totalEquity') or 0),
+        'initial_margin': float(account.get('totalInitialMargin') or 0),
+        'maintenance_margin': float(account.get('totalMaintenanceMargin') or 0),
+    }
+
+
+def coin_values(coins, prices, quote='USDT'):
+    """Value every wallet coin in ``quote`` at once; returns (values, total, unpriced coins)."""
+    names = [coin['coin'] for coin in coins]
+    balances = _column(coins, 'walletBalance')
+    rates = np.fromiter(
+        (1.0 if name == quote else float(prices.get(f"{name}{quote}", np.nan)) for name in names),
+        dtype=float,
+        count=len(names)
+    )
+    values = balances * rates
+    priced = ~np.isnan(values)
+    unpriced = [name for name, ok in zip(names, priced) if not ok]
+    return values, float(values[priced].sum()), unpriced
@@ -0,0 +1,291 @@
+"""Replay thousands of simulated users against the bot, offline, and report latency and throughput.
+
+Every user taps through the menus and runs order and leverage
+conversations in their own chat, all users at once. Updates go through
+the same update processor, handlers, exchange layer and outbound
+throttler as in production; only Bybit (simulator.SimulatedBybit) and the
+Bot API (simulator.SimulatedTelegram) are local stand-ins.
+
+    python benchmark.py --users 1000 --rounds 3 --latency 0.05 --error-rate 0.01
+
+With --workers the bot runs sharded as sharding.py runs it: this process
+routes every update to the worker process that owns its chat and waits
+for it to be handled. Comparing runs with 1, 2, 4... workers shows how
+throughput scales; give every user an account of their own (--accounts
+equal to --users) so one account's order rate limit does not cap it.
+
+    python benchmark.py --users 2000 --accounts 2000 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from decimal import Decimal
+from cryptography.fernet import Fernet
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500, help="simulated users, each in their own chat")
+    parser.add_argument('--rounds', type=int, default=3, help="times every user runs the scenario")
+    parser.add_argument('--accounts', type=int, default=1,
+                        help="Bybit accounts the users are spread over; 1 shares the environment account")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="worker processes to shard the bot over; 0 runs it in this process")
+    parser.add_argument('--latency', type=float, default=0.05, help="Bybit request latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Bybit latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of Bybit requests that fail")
+    parser.add_argument('--symbols', type=int, default=50, help="simulated instruments")
+    parser.add_argument('--positions', type=int, default=20, help="open positions per account")
+    parser.add_argument('--orders', type=int, default=30, help="open orders per account")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="Bot API latency in seconds")
+    parser.add_argument('--telegram-rate', type=float, default=10000,
+                        help="messages per second across all chats; Telegram's real limit is 30")
+    parser.add_argument('--think', type=float, default=0.0, help="longest pause between a user's taps, in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log', action='store_true', help="keep the bot's logging; handler errors are counted either way")
+    return parser.parse_args()
+
+
+def configure(args):
+    # The bot reads its settings at import time; worker processes inherit them
+    state_dir = tempfile.mkdtemp(prefix='bybit-benchmark-')
+    os.environ.update({
+        'BYBIT_SIMULATOR': '1',
+        'BYBIT_API_KEY': 'simulated',
+        'BYBIT_SECRET_KEY': 'simulated',
+        'TELEGRAM_BOT_TOKEN': '1:simulated',
+        'CREDENTIALS_ENCRYPTION_KEY': Fernet.generate_key().decode(),
+        'PERSISTENCE_FILE': os.path.join(state_dir, 'bot_state.sqlite3'),
+        'HISTORY_FILE': os.path.join(state_dir, 'trade_history.sqlite3'),
+        'SHARED_CACHE_FILE': os.path.join(state_dir, 'exchange_cache.sqlite3'),
+        'METRICS_PORT': '0',
+        'SIMULATOR_LATENCY': str(args.latency),
+        'SIMULATOR_JITTER': str(args.jitter),
+        'SIMULATOR_ERROR_RATE': str(args.error_rate),
+        'SIMULATOR_SYMBOLS': str(max(0, args.symbols - 5)),
+        'SIMULATOR_POSITIONS': str(args.positions),
+        'SIMULATOR_ORDERS': str(args.orders),
+        'ACCOUNT_POOL_SIZE': str(max(64, args.accounts)),
+        'BENCHMARK_TELEGRAM_LATENCY': str(args.telegram_latency),
+        'BENCHMARK_TELEGRAM_RATE': str(args.telegram_rate),
+    })
+    if not args.log:
+        os.environ['BENCHMARK_QUIET'] = '1'
+
+
+def build_application():
+    """The bot with simulated Bot API access; also what every worker process runs."""
+    import bot
+    from outbound import OutboundThrottler
+    from simulator import SimulatedTelegram
+    if os.getenv('BENCHMARK_QUIET'):
+        logging.getLogger().setLevel(logging.CRITICAL)
+    # Workers split the message budget the way sharding.worker_environ splits the real one
+    rate = float(os.environ['BENCHMARK_TELEGRAM_RATE']) / int(os.getenv('SHARD_WORKERS') or 1)
+    return bot.build_application(
+        request=SimulatedTelegram(latency=float(os.environ['BENCHMARK_TELEGRAM_LATENCY'])),
+        rate_limiter=OutboundThrottler(overall_rate=rate, private_rate=rate)
+    )
+
+
+def minimum_quantities():
+    from simulator import SimulatedBybit
+    instruments = SimulatedBybit(latency=0, seed_positions=0, seed_orders=0).instruments
+    return {symbol: Decimal(info['lotSizeFilter']['minOrderQty']) for symbol, info in instruments.items()}
+
+
+def scenario(user_id, round_number, min_qty):
+    """The steps one user takes in a round: (label, 'press' or 'send', payload)."""
+    from simulator import REFERENCE_PRICES
+    symbols = list(REFERENCE_PRICES)
+    symbol = symbols[(user_id + round_number) % len(symbols)]
+    qty = str(min_qty[symbol] * 10) if symbol in min_qty else '1'
+    # Never the simulator's default of 10, and never the same twice in a row
+    leverage = str(2 + round_number % 8)
+    return [
+        ('/start', 'send', '/start'),
+        ('balance', 'press', 'balance'),
+        ('positions', 'press', 'positions'),
+        ('positions page 2', 'press', 'positions_page_1'),
+        ('orders', 'press', 'orders'),
+        ('risk', 'press', 'risk'),
+        ('menu', 'press', 'back_to_menu'),
+        ('order: start', 'press', 'place_order'),
+        ('order: symbol', 'press', f'symbol_{symbol}'),
+        ('order: type', 'press', 'type_market'),
+        ('order: side', 'press', 'side_buy' if round_number % 2 == 0 else 'side_sell'),
+        ('order: quantity', 'send', qty),
+        ('leverage: start', 'press', 'set_leverage'),
+        ('leverage: symbol', 'press', f'leverage_{symbol}'),
+        ('leverage: value', 'send', leverage),
+    ]
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+async def run_user(handle, driver, user_id, args, min_qty, rng, latencies):
+    for round_number in range(args.rounds):
+        for label, kind, payload in scenario(user_id, round_number, min_qty):
+            if args.think:
+                await asyncio.sleep(rng.uniform(0, args.think))
+            data = driver.press_data(user_id, payload) if kind == 'press' else driver.send_data(user_id, payload)
+            start = time.perf_counter()
+            await handle(data)
+            latencies.setdefault(label, []).append(time.perf_counter() - start)
+
+
+async def store_credentials(users, count):
+    # Spread users over their own simulated accounts, stored the way /setkeys stores them
+    from accounts import CredentialCipher, CREDENTIALS_KEY
+    from persistence import SharedPersistence
+    cipher = CredentialCipher(os.environ['CREDENTIALS_ENCRYPTION_KEY'])
+    persistence = SharedPersistence(os.environ['PERSISTENCE_FILE'])
+    for user_id in range(1, users + 1):
+        account = user_id % count
+        if account:
+            await persistence.update_user_data(
+                user_id, {CREDENTIALS_KEY: cipher.encrypt(f'simulated-{account}', 'simulated')}
+            )
+    await persistence.flush()
+
+
+def report(args, latencies, elapsed, bybit_calls=None, telegram_requests=None, errors=None):
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    updates = len(all_latencies)
+    mode = f" on {args.workers} workers" if args.workers else ""
+    print(f"\n{updates} updates from {args.users} users{mode} in {elapsed:.2f}s: {updates / elapsed:.0f} updates/s\n")
+    print(f"{'step':<20}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, values in list(latencies.items()) + [('all', all_latencies)]:
+        values = sorted(values)
+        print(
+            f"{label:<20}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+            f"{percentile(values, 0.99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}"
+        )
+
+    if bybit_calls is not None:
+        print("\nBybit requests: " + ", ".join(f"{method} {count}" for method, count in sorted(bybit_calls.items())))
+    if telegram_requests is not None:
+        print("Telegram requests: " + ", ".join(
+            f"{endpoint} {count}" for endpoint, count in sorted(telegram_requests.items())
+        ))
+    if errors:
+        print("Handler errors: " + ", ".join(f"{name} {count}" for name, count in errors.items()))
+
+
+async def run_in_process(args, min_qty):
+    import bot
+    from metrics import HANDLER_ERRORS
+    from simulator import UpdateDriver
+    from telegram import Update
+
+    application = build_application()
+    await application.initialize()
+    await bot.refresh_instruments(application)
+    telegram = application.bot.request
+
+    async def handle(data):
+        update = Update.de_json(data, application.bot)
+        await application.update_processor.process_update(update, application.process_update(update))
+
+    driver = UpdateDriver(application.bot)
+    rng = random.Random(args.seed)
+    latencies = {}
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_user(handle, driver, user_id, args, min_qty, rng, latencies)
+            for user_id in range(1, args.users + 1)
+        ))
+        elapsed = time.perf_counter() - start
+
+        calls = {}
+        for account in bot.accounts.active():
+            for method, count in account.client.calls.items():
+                calls[method] = calls.get(method, 0) + count
+        errors = {name: count for (name,), count in HANDLER_ERRORS.values.items()}
+        report(args, latencies, elapsed, calls, telegram.requests, errors)
+    finally:
+        await application.shutdown()
+        await bot.post_shutdown(application)
+
+
+async def run_sharded(args, min_qty):
+    from sharding import start_workers, stop_workers, shard_of
+    from simulator import UpdateDriver
+
+    loop = asyncio.get_running_loop()
+    done = multiprocessing.get_context('spawn').Queue()
+    processes, queues = start_workers(args.workers, done=done, build=build_application)
+    waiting = {}
+    worker_errors = {}
+
+    def finished(item):
+        if isinstance(item, tuple):
+            _, index, errors = item
+            worker_errors[f'worker {index}'] = errors
+            return
+        future = waiting.pop(item, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def collect():
+        while True:
+            item = done.get()
+            if item is None:
+                return
+            loop.call_soon_threadsafe(finished, item)
+
+    collector = threading.Thread(target=collect, name='benchmark-results', daemon=True)
+    collector.start()
+
+    async def handle(data):
+        future = waiting[data['update_id']] = loop.create_future()
+        queues[shard_of(data, len(queues))].put(json.dumps(data))
+        await future
+
+    driver = UpdateDriver()
+    # Workers start up (imports, instruments) before the clock starts: one /start each
+    warm_up = [args.users + 1 + index for index in range(args.workers * 4)]
+    await asyncio.gather(*(
+        handle(driver.send_data(user_id, '/start')) for user_id in warm_up
+    ))
+
+    rng = random.Random(args.seed)
+    latencies = {}
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_user(handle, driver, user_id, args, min_qty, rng, latencies)
+            for user_id in range(1, args.users + 1)
+        ))
+        elapsed = time.perf_counter() - start
+    finally:
+        await loop.run_in_executor(None, stop_workers, processes, queues)
+        done.put(None)
+        await loop.run_in_executor(None, collector.join)
+    report(args, latencies, elapsed, errors={name: count for name, count in worker_errors.items() if count})
+
+
+def main():
+    args = parse_args()
+    configure(args)
+    min_qty = minimum_quantities()
+    asyncio.run(store_credentials(args.users, args.accounts))
+    if args.workers:
+        asyncio.run(run_sharded(args, min_qty))
+    else:
+        asyncio.run(run_in_process(args, min_qty))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
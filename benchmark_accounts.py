@@ -0,0 +1,124 @@
+"""Check that one account's burst of Bybit requests does not slow down other accounts, offline.
+
+Many simulated users each trade their own account through accounts.AccountPool,
+the way users who linked keys with /setkeys do, against
+simulator.SimulatedBybit with Bybit's per-account rate limits. Every
+account but the first reads its positions at a steady pace. In "quiet"
+mode the first account does the same; in "burst" mode it offers --load
+times its order and read limits at once. The other accounts' read latency
+should be the same in both modes: each account has its own workers, rate
+limit buckets and cache, so the burst only queues behind itself.
+
+    python benchmark_accounts.py --accounts 50 --seconds 5 --load 4
+"""
+import time
+import asyncio
+import argparse
+import functools
+from accounts import AccountPool
+from benchmark import percentile
+from ratelimit import ENDPOINT_LIMITS
+from simulator import SimulatedBybit, REFERENCE_PRICES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=50, help="accounts, one simulated user each")
+    parser.add_argument('--seconds', type=float, default=5, help="how long requests keep arriving")
+    parser.add_argument('--rate', type=float, default=4, help="reads per second of every steady account")
+    parser.add_argument('--load', type=float, default=4, help="the burst, as a multiple of the order and read limits")
+    parser.add_argument('--latency', type=float, default=0.05, help="Bybit request latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01, help="Bybit latency jitter in seconds")
+    parser.add_argument('--workers', type=int, default=4, help="request workers per account")
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help="seconds the steady accounts' p99 may grow by in burst mode")
+    parser.add_argument('--modes', default='quiet,burst', help="comma separated modes to run")
+    return parser.parse_args()
+
+
+def read(exchange):
+    return exchange.call('get_positions', category="linear", settleCoin="USDT")
+
+
+def order(exchange, n):
+    symbol = list(REFERENCE_PRICES)[n % len(REFERENCE_PRICES)]
+    # Far from the market, so the orders rest instead of piling up positions
+    price = str(round(REFERENCE_PRICES[symbol] * 0.5, 4))
+    qty = exchange.client.instruments[symbol]['lotSizeFilter']['minOrderQty']
+    return exchange.place_order(category="linear", symbol=symbol, side="Buy", orderType="Limit", qty=qty, price=price)
+
+
+async def offer(request, rate, seconds, latencies):
+    """Start ``rate`` requests a second for ``seconds`` and record how long each took."""
+    start = time.perf_counter()
+    tasks = []
+
+    async def one(n):
+        sent = time.perf_counter()
+        try:
+            await request(n)
+        except Exception:
+            latencies.append(float('inf'))
+        else:
+            latencies.append(time.perf_counter() - sent)
+
+    for n in range(int(rate * seconds)):
+        tasks.append(asyncio.ensure_future(one(n)))
+        await asyncio.sleep(max(0.0, start + (n + 1) / rate - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+
+async def run(mode, args):
+    pool = AccountPool(
+        size=args.accounts,
+        workers=args.workers,
+        client_class=functools.partial(
+            SimulatedBybit, latency=args.latency, jitter=args.jitter, seed_positions=0, seed_orders=0
+        )
+    )
+    exchanges = [pool.client(f'key-{n}', f'secret-{n}') for n in range(args.accounts)]
+    steady = []
+    bursting = []
+
+    offers = [
+        offer(lambda n, exchange=exchange: read(exchange), args.rate, args.seconds, steady)
+        for exchange in exchanges[1:]
+    ]
+    if mode == 'burst':
+        first = exchanges[0]
+        offers.append(offer(lambda n: read(first), ENDPOINT_LIMITS['read'] * args.load, args.seconds, bursting))
+        offers.append(offer(lambda n: order(first, n), ENDPOINT_LIMITS['order'] * args.load, args.seconds, bursting))
+    else:
+        offers.append(offer(lambda n: read(exchanges[0]), args.rate, args.seconds, bursting))
+    await asyncio.gather(*offers)
+    pool.close()
+
+    steady.sort()
+    bursting.sort()
+    failed = sum(latency == float('inf') for latency in steady)
+    print(
+        f"{mode:<8}{len(steady):>9}{percentile(steady, 0.5) * 1000:>9.0f}{percentile(steady, 0.99) * 1000:>9.0f}"
+        f"{failed:>8}{len(bursting):>10}{percentile(bursting, 0.5) * 1000:>9.0f}"
+        f"{percentile(bursting, 0.99) * 1000:>9.0f}"
+    )
+    return percentile(steady, 0.99)
+
+
+def main():
+    args = parse_args()
+    print(
+        f"{args.accounts} accounts, {args.accounts - 1} reading {args.rate:g}/s for {args.seconds:g}s; "
+        f"the first bursts {args.load:g}x its order and read limits\n"
+    )
+    print(f"{'':<8}{'--- steady accounts ---':>35}{'--- first account ---':>28}")
+    print(f"{'mode':<8}{'requests':>9}{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}{'requests':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    p99 = {mode: asyncio.run(run(mode, args)) for mode in args.modes.split(',')}
+    if 'quiet' in p99 and 'burst' in p99:
+        isolated = p99['burst'] <= p99['quiet'] + args.tolerance
+        print(f"\nsteady accounts unaffected by the burst: {'yes' if isolated else 'NO'}")
+        return 0 if isolated else 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""Compare analytics.PositionFrame with the per-position Decimal loop it replaced, offline.
+
+The positions view used to work out PnL %, ROE and the page total one
+position at a time with Decimal arithmetic. PositionFrame parses the rows
+into numpy columns once and computes those figures, and the Risk view's
+exposure and concentration summary, as whole-array operations. Both are
+timed over the same synthetic rows, shaped like Bybit's, for each book
+size; the script also checks that they agree.
+
+    python benchmark_analytics.py --sizes 10,100,1000,10000
+"""
+import time
+import random
+import argparse
+from decimal import Decimal
+from analytics import PositionFrame
+from simulator import REFERENCE_PRICES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000,10000', help="comma separated numbers of positions")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per size; the fastest is reported")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def positions(n, rng):
+    """``n`` open positions as Bybit sends them, numbers as strings."""
+    rows = []
+    symbols = list(REFERENCE_PRICES)
+    for i in range(n):
+        symbol = symbols[i % len(symbols)]
+        entry = REFERENCE_PRICES[symbol] * rng.uniform(0.9, 1.1)
+        mark = REFERENCE_PRICES[symbol]
+        size = rng.randint(1, 1000) / 100
+        side = rng.choice(['Buy', 'Sell'])
+        leverage = rng.choice([1, 2, 5, 10, 20])
+        sign = 1 if side == 'Buy' else -1
+        rows.append({
+            'symbol': symbol,
+            'side': side,
+            'size': str(size),
+            'avgPrice': f"{entry:.4f}",
+            'markPrice': f"{mark:.4f}",
+            'unrealisedPnl': f"{sign * (mark - entry) * size:.4f}",
+            'positionIM': f"{entry * size / leverage:.4f}",
+            'leverage': str(leverage),
+            'liqPrice': f"{entry * (1 - sign / leverage * 0.9):.4f}",
+        })
+    return rows
+
+
+def decimal_loop(rows):
+    """The positions view's arithmetic before PositionFrame."""
+    figures = []
+    total_pnl = Decimal('0')
+    for position in rows:
+        if float(position.get('size', 0)) > 0:
+            entry_price = Decimal(str(position.get('avgPrice', '0')))
+            current_price = Decimal(str(position.get('markPrice', '0')))
+            unrealized_pnl = Decimal(str(position.get('unrealisedPnl', '0')))
+            margin = position.get('positionIM', 'N/A')
+            side = position.get('side', 'N/A')
+
+            if entry_price > 0:
+                if side == 'Buy':
+                    pnl_percentage = ((current_price - entry_price) / entry_price) * 100
+                else:
+                    pnl_percentage = ((entry_price - current_price) / entry_price) * 100
+            else:
+                pnl_percentage = Decimal('0')
+
+            if margin and margin != 'N/A' and Decimal(str(margin)) > 0:
+                roe = (unrealized_pnl / Decimal(str(margin))) * 100
+            else:
+                roe = Decimal('0')
+
+            figures.append((float(pnl_percentage), float(roe)))
+            total_pnl += unrealized_pnl
+    return figures, float(total_pnl)
+
+
+def frame(rows):
+    positions = PositionFrame(rows)
+    return positions, float(positions.unrealised_pnl.sum())
+
+
+def fastest(function, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    print(f"{'positions':>10}{'decimal ms':>12}{'frame ms':>10}{'+ risk ms':>11}{'decimal us/pos':>16}{'frame us/pos':>14}")
+    agree = True
+    for n in (int(size) for size in args.sizes.split(',')):
+        rows = positions(n, rng)
+        decimal_seconds, (figures, decimal_total) = fastest(decimal_loop, rows, args.repeat)
+        frame_seconds, (positions_frame, frame_total) = fastest(frame, rows, args.repeat)
+        risk_seconds, _ = fastest(lambda rows: PositionFrame(rows).risk(equity=1e6), rows, args.repeat)
+
+        agree = agree and abs(decimal_total - frame_total) <= 1e-6 * max(1.0, abs(decimal_total)) and all(
+            abs(pnl_pct - positions_frame.pnl_pct[i]) <= 1e-9 and abs(roe - positions_frame.roe[i]) <= 1e-9
+            for i, (pnl_pct, roe) in enumerate(figures)
+        )
+        print(
+            f"{n:>10}{decimal_seconds * 1000:>12.2f}{frame_seconds * 1000:>10.2f}{risk_seconds * 1000:>11.2f}"
+            f"{decimal_seconds / n * 1e6:>16.2f}{frame_seconds / n * 1e6:>14.2f}"
+        )
+    print(f"\nfigures agree: {'yes' if agree else 'NO'}")
+    return 0 if agree else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""Time mirroring a simulated account's trade history into SQLite, offline.
+
+A simulator.SimulatedBybit account starts with --trades round trips
+spread over the last --days days, each an opening and a closing
+execution and a closed PnL row. history.TradeHistory backfills them into
+a fresh HistoryStore through exchange.Exchange, then syncs again with
+nothing new, and once more after a few new trades. The script checks
+that the store holds every row once, that the repeat syncs fetch only
+the overlap before the watermark plus what is new, and that the /daily
+and /weekly summaries add up to the account's closed PnL.
+
+    python benchmark_history.py --trades 2000 --days 90
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+from exchange import Exchange
+from history import HistoryStore, TradeHistory, WINDOW_MS, account_key
+from simulator import SimulatedBybit
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trades', type=int, default=2000, help="round trips the account starts with")
+    parser.add_argument('--days', type=float, default=90, help="days those trades are spread over, and backfilled")
+    parser.add_argument('--new-trades', type=int, default=5, help="round trips made between the second and third sync")
+    parser.add_argument('--latency', type=float, default=0.0, help="Bybit request latency in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def stored_rows(path, account):
+    connection = sqlite3.connect(path)
+    try:
+        return tuple(
+            connection.execute(f'SELECT COUNT(*) FROM {table} WHERE account = ?', (account,)).fetchone()[0]
+            for table in ('executions', 'closed_pnl')
+        )
+    finally:
+        connection.close()
+
+
+def closed_pnl_total(client, days):
+    """The account's closed PnL straight from REST, window by window."""
+    now = int(time.time() * 1000)
+    start = now - int(days * 24 * 3600 * 1000)
+    total = 0.0
+    while start < now:
+        end = min(start + WINDOW_MS, now)
+        cursor = ''
+        while True:
+            page = client.get_closed_pnl(category="linear", startTime=start, endTime=end, limit=100, cursor=cursor)
+            total += sum(float(row['closedPnl']) for row in page['result']['list'])
+            cursor = page['result']['nextPageCursor']
+            if not cursor:
+                break
+        start = end
+    return total
+
+
+def history_requests(client):
+    return client.calls.get('get_executions', 0) + client.calls.get('get_closed_pnl', 0)
+
+
+async def timed_sync(history, exchange, client):
+    requests = history_requests(client)
+    start = time.perf_counter()
+    fetched = await history.sync(exchange)
+    return fetched, history_requests(client) - requests, time.perf_counter() - start
+
+
+async def main_async(args):
+    client = SimulatedBybit(
+        api_key='benchmark', latency=args.latency, jitter=0, rate_limits=False, seed_positions=0,
+        seed_orders=0, seed_trades=args.trades, history_days=args.days, seed=args.seed
+    )
+    exchange = Exchange(client, max_workers=4)
+    path = os.path.join(tempfile.mkdtemp(prefix='bybit-history-'), 'history.sqlite3')
+    store = HistoryStore(path)
+    # A day more than the trades span, so the first sync backfills all of them
+    history = TradeHistory(store, backfill_days=args.days + 1)
+    account = account_key(exchange)
+    ok = True
+
+    print(f"{args.trades} round trips over {args.days:g} days\n")
+    print(f"{'sync':<10}{'fetched':>9}{'requests':>10}{'ms':>9}{'executions':>12}{'closed PnL':>12}")
+    expected = (2 * args.trades, args.trades)
+    for sync in ('backfill', 'repeat', 'new'):
+        if sync == 'new':
+            for _ in range(args.new_trades):
+                client.place_order(category="linear", symbol="BTCUSDT", side="Buy", orderType="Market", qty="0.01")
+                client.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty="0.01",
+                                   reduceOnly=True)
+            expected = (expected[0] + 2 * args.new_trades, expected[1] + args.new_trades)
+        fetched, requests, seconds = await timed_sync(history, exchange, client)
+        rows = stored_rows(path, account)
+        print(f"{sync:<10}{fetched:>9}{requests:>10}{seconds * 1000:>9.1f}{rows[0]:>12}{rows[1]:>12}")
+        if rows != expected:
+            print(f"  expected {expected[0]} executions and {expected[1]} closed PnL rows")
+            ok = False
+
+    weeks = int(args.days // 7) + 2
+    print()
+    for period, count in (('day', int(args.days) + 2), ('week', weeks)):
+        start = time.perf_counter()
+        periods = await history.summary(exchange, period, count)
+        seconds = time.perf_counter() - start
+        print(f"/{'daily' if period == 'day' else 'weekly'} over {count} {period}s: {len(periods)} with trades, "
+              f"{seconds * 1000:.2f} ms")
+    total = sum(totals['pnl'] for _, totals in periods)
+    expected_total = closed_pnl_total(client, args.days + 7)
+    if abs(total - expected_total) > 1e-6 * max(1.0, abs(expected_total)):
+        print(f"summary PnL {total:.2f} != {expected_total:.2f} from REST")
+        ok = False
+    else:
+        print(f"summary PnL matches REST: {total:.2f}")
+
+    await store.close()
+    exchange.shutdown()
+    return 0 if ok else 1
+
+
+def main():
+    return asyncio.run(main_async(parse_args()))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
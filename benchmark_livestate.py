@@ -0,0 +1,227 @@
+"""Replay a simulated account's private stream into AccountState and check it against REST, offline.
+
+A simulator.SimulatedBybit account trades at random: market orders that
+open, add to, flip and close positions, resting limit orders, cancels
+and leverage changes. Every change pushes the position, order and wallet
+messages Bybit's private stream would, and those are written to a file
+in the LIVE_STATE_RECORD format. A fresh AccountState is loaded the way
+LiveStream.resync does, and the file is replayed into it with
+livestate.ReplayStream. At every checkpoint the state's
+positions_response, orders_response and wallet_response, page by page
+for every scope, must match the REST snapshot taken at that point in the
+run. Mark-price-driven figures are left out of the comparison: those
+come from the ticker stream and move between any two reads.
+
+    python benchmark_livestate.py --actions 2000 --checks 10 --write stream.jsonl
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pybit.exceptions import InvalidRequestError
+from exchange import Exchange
+from livestate import AccountState, LiveStream, ReplayStream
+from portfolio import POSITION_SCOPES, ORDER_SCOPES, scope_params
+from simulator import SimulatedBybit
+
+# Position and wallet fields that follow the mark price rather than the stream's pushes
+MARK_FIELDS = {'markPrice', 'unrealisedPnl', 'positionMM'}
+WALLET_FIELDS = ('accountType', 'totalInitialMargin')
+WALLET_COIN_FIELDS = ('coin', 'walletBalance', 'totalPositionIM', 'totalOrderIM')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--actions', type=int, default=2000, help="random trades, orders, cancels and leverage changes")
+    parser.add_argument('--checks', type=int, default=10, help="checkpoints spread over the actions")
+    parser.add_argument('--symbols', type=int, default=20, help="extra simulated instruments")
+    parser.add_argument('--positions', type=int, default=10, help="positions the account starts with")
+    parser.add_argument('--orders', type=int, default=30, help="open orders the account starts with")
+    parser.add_argument('--page-size', type=int, default=7, help="rows per page when comparing responses")
+    parser.add_argument('--write', help="keep the recorded stream in this file")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def act(client, rng):
+    """One random change to the account."""
+    symbol = rng.choice(list(client.instruments))
+    lot = client.instruments[symbol]['lotSizeFilter']
+    qty = str(float(lot['minOrderQty']) * rng.randint(1, 5))
+    side = rng.choice(['Buy', 'Sell'])
+    kind = rng.random()
+    try:
+        if kind < 0.35:
+            client.place_order(category="linear", symbol=symbol, side=side, orderType="Market", qty=qty)
+        elif kind < 0.45:
+            client.place_order(category="linear", symbol=symbol, side=side, orderType="Market", qty=qty,
+                               reduceOnly=True)
+        elif kind < 0.75:
+            # Far from the market, so the order rests
+            price = client.price(symbol) * (0.8 if side == 'Buy' else 1.2)
+            tick = client.instruments[symbol]['priceFilter']['tickSize']
+            price = round(price / float(tick)) * float(tick)
+            client.place_order(category="linear", symbol=symbol, side=side, orderType="Limit", qty=qty,
+                               price=f"{price:.10f}".rstrip('0').rstrip('.'))
+        elif kind < 0.9:
+            client.cancel_all_orders(category="linear", symbol=symbol)
+        else:
+            leverage = str(rng.randint(1, 20))
+            client.set_leverage(category="linear", symbol=symbol, buyLeverage=leverage, sellLeverage=leverage)
+    except InvalidRequestError:
+        # Reduce-only without a position to reduce, leverage already at that level
+        pass
+
+
+def pages(fetch, page_size, **params):
+    """Every page of a listing, following the cursor."""
+    result = []
+    cursor = ''
+    while True:
+        response = fetch(limit=page_size, cursor=cursor, **params)
+        if isinstance(response, tuple):
+            response = response[0]
+        page = response['result']
+        result.append(page['list'])
+        cursor = page.get('nextPageCursor')
+        if not cursor:
+            return result
+
+
+def snapshot(client, page_size):
+    """What REST lists for every scope, page by page, and the wallet."""
+    return {
+        'positions': {
+            scope: pages(client.get_positions, page_size, **scope_params(scope)) for scope in POSITION_SCOPES
+        },
+        'orders': {
+            scope: pages(client.get_open_orders, page_size, **scope_params(scope)) for scope in ORDER_SCOPES
+        },
+        'wallet': client.get_wallet_balance(accountType="UNIFIED")[0]['result']['list'],
+    }
+
+
+def position_differences(rest_pages, state_pages):
+    rest = [row for page in rest_pages for row in page]
+    state = [row for page in state_pages for row in page]
+    if [len(page) for page in rest_pages] != [len(page) for page in state_pages]:
+        return [f"page sizes {[len(page) for page in rest_pages]} != {[len(page) for page in state_pages]}"]
+    differences = []
+    for rest_row, state_row in zip(rest, state):
+        for key in rest_row.keys() - MARK_FIELDS:
+            if str(rest_row[key]) != str(state_row.get(key)):
+                differences.append(f"{rest_row['symbol']} {key}: REST {rest_row[key]}, stream {state_row.get(key)}")
+    return differences
+
+
+def order_differences(rest_pages, state_pages):
+    rest = [row for page in rest_pages for row in page]
+    state = [row for page in state_pages for row in page]
+    if [len(page) for page in rest_pages] != [len(page) for page in state_pages]:
+        return [f"page sizes {[len(page) for page in rest_pages]} != {[len(page) for page in state_pages]}"]
+    differences = []
+    # Orders created in the same millisecond may list in either order, on Bybit too
+    if [row['createdTime'] for row in rest] != [row['createdTime'] for row in state]:
+        differences.append("orders listed in a different order")
+    if len({row['orderId'] for row in state}) != len(state):
+        differences.append("an order listed twice across pages")
+    state_by_id = {row['orderId']: row for row in state}
+    for rest_row in rest:
+        state_row = state_by_id.get(rest_row['orderId'])
+        if state_row is None:
+            differences.append(f"order {rest_row['orderId']} missing from the stream state")
+            continue
+        for key, value in rest_row.items():
+            if str(value) != str(state_row.get(key)):
+                differences.append(f"order {rest_row['orderId']} {key}: REST {value}, stream {state_row.get(key)}")
+    return differences
+
+
+def wallet_differences(rest, state):
+    if len(rest) != len(state):
+        return [f"{len(rest)} wallet accounts from REST, {len(state)} from the stream"]
+    differences = []
+    for rest_account, state_account in zip(rest, state):
+        for key in WALLET_FIELDS:
+            if rest_account[key] != state_account.get(key):
+                differences.append(f"wallet {key}: REST {rest_account[key]}, stream {state_account.get(key)}")
+        state_coins = {coin['coin']: coin for coin in state_account.get('coin', [])}
+        for coin in rest_account['coin']:
+            for key in WALLET_COIN_FIELDS:
+                value = state_coins.get(coin['coin'], {}).get(key)
+                if coin[key] != value:
+                    differences.append(f"wallet {coin['coin']} {key}: REST {coin[key]}, stream {value}")
+    return differences
+
+
+def compare(state, rest, page_size):
+    differences = []
+    for scope, rest_pages in rest['positions'].items():
+        state_pages = pages(state.positions_response, page_size, **scope_params(scope))
+        differences += [f"positions {scope}: {d}" for d in position_differences(rest_pages, state_pages)]
+    for scope, rest_pages in rest['orders'].items():
+        state_pages = pages(state.orders_response, page_size, **scope_params(scope))
+        differences += [f"orders {scope}: {d}" for d in order_differences(rest_pages, state_pages)]
+    differences += wallet_differences(rest['wallet'], state.wallet_response(accountType="UNIFIED")['result']['list'])
+    return differences
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    client = SimulatedBybit(
+        latency=0, jitter=0, rate_limits=False, return_response_headers=True, extra_symbols=args.symbols,
+        seed_positions=args.positions, seed_orders=args.orders, seed=args.seed
+    )
+    exchange = Exchange(client, max_workers=4)
+    state = AccountState()
+    # The snapshot a (re)connect starts from, through the same code the bot runs
+    await LiveStream(exchange, state).resync()
+    if not state.ready:
+        print("The REST snapshot could not be loaded")
+        return 1
+
+    messages = []
+    client.stream_listeners.append(messages.append)
+    checkpoints = []
+    per_check = max(1, args.actions // args.checks)
+    for check in range(args.checks):
+        for _ in range(per_check):
+            act(client, rng)
+        checkpoints.append((len(messages), snapshot(client, args.page_size)))
+    exchange.shutdown()
+
+    path = args.write or os.path.join(tempfile.mkdtemp(prefix='bybit-stream-'), 'live_state.jsonl')
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(message) + '\n' for message in messages)
+    recorded = ReplayStream.from_file(state, path).messages
+
+    print(f"{per_check * args.checks} actions, {len(recorded)} stream messages in {path}\n")
+    print(f"{'check':>6}{'messages':>10}{'positions':>11}{'orders':>8}{'differences':>13}")
+    replayed = 0
+    replay_seconds = 0.0
+    failed = False
+    for check, (end, rest) in enumerate(checkpoints, 1):
+        start = time.perf_counter()
+        ReplayStream(state, recorded[replayed:end]).replay()
+        replay_seconds += time.perf_counter() - start
+        replayed = end
+        differences = compare(state, rest, args.page_size)
+        positions = sum(len(page) for scope_pages in rest['positions'].values() for page in scope_pages)
+        orders = sum(len(page) for scope_pages in rest['orders'].values() for page in scope_pages)
+        print(f"{check:>6}{end:>10}{positions:>11}{orders:>8}{len(differences):>13}")
+        for difference in differences[:5]:
+            print(f"        {difference}")
+        failed = failed or bool(differences)
+    print(f"\nreplayed {replayed} messages at {replayed / replay_seconds:,.0f} messages/s" if replay_seconds else "")
+    return 1 if failed else 0
+
+
+def main():
+    return asyncio.run(main_async(parse_args()))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
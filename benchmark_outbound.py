@@ -0,0 +1,185 @@
+"""Flood a Bot API that enforces Telegram's limits and count what gets through, offline.
+
+A local Bot API (simulator.SimulatedTelegram) answers 429 with retry_after
+once a chat gets more than --chat-limit requests in a second, or all chats
+together more than --overall-limit, and 400 "message is not modified"
+for an edit that changes nothing. Every chat then opens a view of two
+messages and taps Refresh in quick succession, so the first message is
+edited over and over, sometimes with unchanged content.
+
+"throttled" sends through outbound.OutboundThrottler as the bot does and
+should surface no errors at all; "unthrottled" sends the same requests
+straight through, for comparison. Either way each edited message must end
+up showing the last content asked for.
+
+    python benchmark_outbound.py --chats 50 --taps 6
+"""
+import json
+import time
+import math
+import random
+import asyncio
+import logging
+import argparse
+from collections import deque
+from telegram.error import RetryAfter, BadRequest
+from telegram.ext import ExtBot
+from outbound import OutboundThrottler
+from simulator import SimulatedTelegram
+
+RETRY_AFTER_DESCRIPTION = "Too Many Requests: retry after {}"
+NOT_MODIFIED_DESCRIPTION = (
+    "Bad Request: message is not modified: specified new message content and reply markup of the "
+    "existing message are exactly the same as a current content and reply markup of the message"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=50, help="private chats, each opening one view")
+    parser.add_argument('--taps', type=int, default=6, help="Refresh taps per chat, each an edit")
+    parser.add_argument('--tap-interval', type=float, default=0.05, help="seconds between a user's taps")
+    parser.add_argument('--chat-limit', type=int, default=5, help="requests per second the Bot API allows a chat")
+    parser.add_argument('--overall-limit', type=int, default=40, help="requests per second it allows the bot")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="Bot API latency in seconds")
+    parser.add_argument('--modes', default='throttled,unthrottled', help="comma separated modes to run")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+class FloodingTelegram(SimulatedTelegram):
+    """A SimulatedTelegram that enforces flood limits over sliding one-second windows."""
+
+    def __init__(self, chat_limit, overall_limit, **kwargs):
+        super().__init__(**kwargs)
+        self.chat_limit = chat_limit
+        self.overall_limit = overall_limit
+        self.flood_waits = 0
+        self.not_modified = 0
+        self.texts = {}
+        self._overall = deque()
+        self._chats = {}
+
+    def _retry_after(self, chat_id):
+        now = time.monotonic()
+        windows = [(self._overall, self.overall_limit), (self._chats.setdefault(chat_id, deque()), self.chat_limit)]
+        for window, _ in windows:
+            while window and now - window[0] >= 1:
+                window.popleft()
+        waits = [window[0] + 1 - now for window, limit in windows if len(window) >= limit]
+        if waits:
+            # Telegram asks for whole seconds
+            return max(1, math.ceil(max(waits)))
+        for window, _ in windows:
+            window.append(now)
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint not in ('sendMessage', 'editMessageText'):
+            return await super().do_request(url, method, request_data)
+
+        chat_id = int(params['chat_id'])
+        retry_after = self._retry_after(chat_id)
+        if retry_after is not None:
+            self.flood_waits += 1
+            await asyncio.sleep(self.latency)
+            return 429, json.dumps({
+                'ok': False, 'error_code': 429,
+                'description': RETRY_AFTER_DESCRIPTION.format(retry_after),
+                'parameters': {'retry_after': retry_after},
+            }).encode()
+
+        status, payload = await super().do_request(url, method, request_data)
+        message_id = json.loads(payload)['result']['message_id']
+        key = (chat_id, message_id)
+        if endpoint == 'editMessageText' and self.texts.get(key) == params['text']:
+            self.not_modified += 1
+            return 400, json.dumps({'ok': False, 'error_code': 400, 'description': NOT_MODIFIED_DESCRIPTION}).encode()
+        self.texts[key] = params['text']
+        return status, payload
+
+
+async def run(mode, args):
+    telegram = FloodingTelegram(args.chat_limit, args.overall_limit, latency=args.telegram_latency)
+    throttler = OutboundThrottler() if mode == 'throttled' else None
+    bot = ExtBot('1:simulated', request=telegram, get_updates_request=SimulatedTelegram(), rate_limiter=throttler)
+    await bot.initialize()
+    rng = random.Random(args.seed)
+    results = {'ok': 0, '429': 0, 'not modified': 0, 'failed': 0}
+    expected = {}
+
+    async def request(coroutine):
+        try:
+            await coroutine
+            results['ok'] += 1
+        except RetryAfter:
+            results['429'] += 1
+        except BadRequest as e:
+            results['not modified' if 'not modified' in str(e) else 'failed'] += 1
+        except Exception:
+            results['failed'] += 1
+
+    async def run_chat(chat_id):
+        await asyncio.sleep(rng.uniform(0, 1))
+        # The view's first message has to exist before it can be edited
+        while True:
+            try:
+                view = await bot.send_message(chat_id, "view 0")
+                break
+            except RetryAfter as e:
+                results['429'] += 1
+                await asyncio.sleep(e.retry_after)
+        results['ok'] += 1
+        requests = [asyncio.ensure_future(request(bot.send_message(chat_id, "view 0, continued")))]
+        content = 0
+        for _ in range(args.taps):
+            await asyncio.sleep(args.tap_interval)
+            # About every third tap finds nothing changed since the last one
+            content += rng.random() > 1 / 3
+            expected[(chat_id, view.message_id)] = text = f"view {content}"
+            requests.append(asyncio.ensure_future(request(bot.edit_message_text(text, chat_id, view.message_id))))
+        await asyncio.gather(*requests)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_chat(chat_id) for chat_id in range(1, args.chats + 1)))
+    elapsed = time.perf_counter() - start
+    await bot.shutdown()
+
+    offered = args.chats * (2 + args.taps)
+    sent = telegram.requests.get('sendMessage', 0) + telegram.requests.get('editMessageText', 0)
+    current = sum(telegram.texts.get(key) == text for key, text in expected.items())
+    print(
+        f"{mode:<12}{offered:>8}{sent:>7}{telegram.flood_waits:>7}{results['429']:>9}"
+        f"{results['not modified'] + results['failed']:>8}{current:>6}/{len(expected):<4}{elapsed:>8.1f}"
+    )
+    if throttler is not None:
+        print(
+            f"{'':<12}merged {throttler.coalesced} edits, skipped {throttler.skipped} unchanged, "
+            f"retried {throttler.retried} after 429"
+        )
+    return results['429'] == results['not modified'] == results['failed'] == 0 and current == len(expected)
+
+
+def main():
+    args = parse_args()
+    # Retried flood waits are counted below rather than logged one by one
+    logging.getLogger().setLevel(logging.ERROR)
+    print(
+        f"{args.chats} chats x (2 messages + {args.taps} edits) against {args.chat_limit}/s per chat "
+        f"and {args.overall_limit}/s overall\n"
+    )
+    print(f"{'mode':<12}{'offered':>8}{'sent':>7}{'429s':>7}{'raised':>9}{'errors':>8}{'current':>11}{'seconds':>8}")
+    clean = {mode: asyncio.run(run(mode, args)) for mode in args.modes.split(',')}
+    print(
+        "\nsent: requests the Bot API served; 429s: flood waits it answered instead; raised: 429s"
+        "\nthat reached the caller; errors: other errors that did; current: messages showing the last edit"
+    )
+    # Only the throttled run has to come through clean
+    return 0 if clean.get('throttled', True) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
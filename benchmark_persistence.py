@@ -0,0 +1,118 @@
+"""Measure what persistence costs per update and how long a cold start takes to restore state.
+
+Users' data and conversation states go through the persistence backends
+the way the Application drives them: every update of a sharded bot first
+asks SharedPersistence whether another worker wrote newer user data,
+and every PERSISTENCE_INTERVAL the changes of all updates since are
+handed over in one round. Handing them over is what runs on the event
+loop; the commit runs on the persistence thread. A cold start then
+reloads everything from the file into a fresh instance.
+
+    python benchmark_persistence.py --users 5000 --updates 20000
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from persistence import SQLitePersistence, SharedPersistence
+
+CONVERSATIONS = ('order_conversation', 'leverage_conversation', 'ladder_conversation')
+BACKENDS = {'sqlite': SQLitePersistence, 'shared': SharedPersistence}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000, help="users with stored data and a conversation")
+    parser.add_argument('--updates', type=int, default=20000, help="updates handled between the rounds")
+    parser.add_argument('--rounds', type=int, default=4, help="persistence rounds the updates are spread over")
+    parser.add_argument('--backends', default='sqlite,shared', help="comma separated: " + ', '.join(BACKENDS))
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def user_data(rng):
+    # Roughly what a user of the bot carries around
+    symbols = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT']
+    return {
+        'symbol': rng.choice(symbols),
+        'side': rng.choice(['buy', 'sell']),
+        'quantity': str(rng.randint(1, 100) / 100),
+        'recent_symbols': rng.sample(symbols, 3),
+        'favorite_symbols': rng.sample(symbols, 2),
+        'positions_starts': [[['', 0]] * 4],
+        'credentials': os.urandom(160),
+    }
+
+
+async def run(name, args):
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix='bybit-persistence-'), 'bot_state.sqlite3')
+    persistence = BACKENDS[name](path)
+    users = {user_id: user_data(rng) for user_id in range(1, args.users + 1)}
+
+    # Every user starts out stored, mid-way through some conversation
+    for user_id, data in users.items():
+        await persistence.update_user_data(user_id, data)
+        await persistence.update_conversation(CONVERSATIONS[user_id % 3], (user_id, user_id), 1)
+    await persistence._write_task
+
+    refresh_seconds = 0.0
+    handover_seconds = 0.0
+    commit_seconds = 0.0
+    per_round = args.updates // args.rounds
+    for _ in range(args.rounds):
+        changed = set()
+        for _ in range(per_round):
+            user_id = rng.randint(1, args.users)
+            start = time.perf_counter()
+            await persistence.refresh_user_data(user_id, users[user_id])
+            refresh_seconds += time.perf_counter() - start
+            users[user_id]['quantity'] = str(rng.randint(1, 100) / 100)
+            changed.add(user_id)
+
+        # What Application.update_persistence hands over for the round
+        start = time.perf_counter()
+        for user_id in changed:
+            await persistence.update_user_data(user_id, users[user_id])
+            await persistence.update_conversation(CONVERSATIONS[user_id % 3], (user_id, user_id), 2)
+        handover_seconds += time.perf_counter() - start
+        await persistence._write_task
+        commit_seconds += time.perf_counter() - start
+    await persistence.flush()
+
+    start = time.perf_counter()
+    fresh = BACKENDS[name](path)
+    restored = await fresh.get_user_data()
+    conversations = 0
+    for conversation in CONVERSATIONS:
+        conversations += len(await fresh.get_conversations(conversation))
+    await fresh.get_chat_data()
+    await fresh.get_bot_data()
+    restore_seconds = time.perf_counter() - start
+    await fresh.flush()
+    assert len(restored) == args.users and conversations == args.users
+
+    updates = per_round * args.rounds
+    print(
+        f"{name:<8}{refresh_seconds / updates * 1e6:>12.1f}{handover_seconds / updates * 1e6:>12.1f}"
+        f"{commit_seconds / args.rounds * 1000:>12.1f}{restore_seconds * 1000:>12.1f}"
+    )
+
+
+def main():
+    args = parse_args()
+    print(f"{args.users} users, {args.updates} updates over {args.rounds} persistence rounds\n")
+    print(f"{'backend':<8}{'refresh us':>12}{'handover us':>12}{'round ms':>12}{'restore ms':>12}")
+    for name in args.backends.split(','):
+        asyncio.run(run(name, args))
+    print(
+        "\nrefresh: time an update waits for the newer user data check; handover: event loop"
+        "\ntime per update; round: handover plus commit of one persistence round; restore:"
+        "\nloading every user and conversation into a fresh instance"
+    )
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
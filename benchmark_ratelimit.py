@@ -0,0 +1,111 @@
+"""Offer more Bybit requests than the rate limits allow and count 10006 errors, offline.
+
+Every endpoint class (order, cancel, account, read, market) is sent
+--load times its per-UID limit for --seconds seconds through an
+exchange.Exchange, against a simulator.SimulatedBybit that enforces
+Bybit's limits in one-second windows the way Bybit does. With the
+RequestScheduler's throttling the run should see no rate limit errors at
+all while each class still gets close to its limit; "unthrottled" sends
+the same load with the buckets opened up, for comparison.
+
+    python benchmark_ratelimit.py --seconds 5 --load 2
+"""
+import time
+import asyncio
+import argparse
+from exchange import Exchange
+from ratelimit import RequestScheduler, ENDPOINT_LIMITS, RATE_LIMIT_ERROR
+from simulator import SimulatedBybit, REFERENCE_PRICES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5, help="how long requests keep arriving")
+    parser.add_argument('--load', type=float, default=2, help="requests offered per second, as a multiple of the limit")
+    parser.add_argument('--latency', type=float, default=0.05, help="Bybit request latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Bybit latency jitter in seconds")
+    parser.add_argument('--workers', type=int, default=16, help="Exchange thread pool size")
+    parser.add_argument('--modes', default='throttled,unthrottled', help="comma separated modes to run")
+    return parser.parse_args()
+
+
+def requests_for(exchange, endpoint, n):
+    """A coroutine making the n-th request of ``endpoint``'s class."""
+    symbol = list(REFERENCE_PRICES)[n % len(REFERENCE_PRICES)]
+    if endpoint == 'order':
+        # Far from the market, so the orders rest instead of piling up positions
+        price = str(round(REFERENCE_PRICES[symbol] * 0.5, 4))
+        qty = exchange.client.instruments[symbol]['lotSizeFilter']['minOrderQty']
+        return exchange.place_order(
+            category="linear", symbol=symbol, side="Buy", orderType="Limit", qty=qty, price=price
+        )
+    if endpoint == 'cancel':
+        return exchange.cancel_all_orders(category="linear", symbol=symbol)
+    if endpoint == 'account':
+        leverage = str(2 + n % 5)
+        return exchange.set_leverage(category="linear", symbol=symbol, buyLeverage=leverage, sellLeverage=leverage)
+    if endpoint == 'read':
+        return exchange.call('get_positions', category="linear", settleCoin="USDT")
+    return exchange.call('get_tickers', category="linear", symbol=symbol)
+
+
+async def offer(exchange, endpoint, rate, seconds, results):
+    """Start ``rate`` requests a second for ``seconds``, without waiting for earlier ones."""
+    start = time.perf_counter()
+    tasks = []
+    total = int(rate * seconds)
+
+    async def one(n):
+        try:
+            await requests_for(exchange, endpoint, n)
+            results[endpoint]['ok'] += 1
+        except Exception as e:
+            key = 'rate limited' if getattr(e, 'status_code', None) == RATE_LIMIT_ERROR else 'failed'
+            results[endpoint][key] += 1
+        results[endpoint]['finished'] = time.perf_counter() - start
+
+    for n in range(total):
+        tasks.append(asyncio.ensure_future(one(n)))
+        await asyncio.sleep(max(0.0, start + (n + 1) / rate - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+
+async def run(mode, args):
+    client = SimulatedBybit(
+        latency=args.latency, jitter=args.jitter, return_response_headers=True,
+        seed_positions=0, seed_orders=0
+    )
+    limits = ENDPOINT_LIMITS if mode == 'throttled' else dict.fromkeys(ENDPOINT_LIMITS, 10 ** 6)
+    # Retried 10006s are counted by the scheduler; the unthrottled run surfaces them instead
+    scheduler = RequestScheduler(args.workers, limits=limits, max_rate_limit_retries=5 if mode == 'throttled' else 0)
+    exchange = Exchange(client, max_workers=args.workers, scheduler=scheduler)
+    results = {endpoint: {'ok': 0, 'rate limited': 0, 'failed': 0, 'finished': 0.0} for endpoint in ENDPOINT_LIMITS}
+    await asyncio.gather(*(
+        offer(exchange, endpoint, limit * args.load, args.seconds, results)
+        for endpoint, limit in ENDPOINT_LIMITS.items()
+    ))
+    exchange.shutdown()
+
+    rate_limited = scheduler.rate_limited + sum(result['rate limited'] for result in results.values())
+    print(f"\n{mode}: 10006 responses from the simulator: {rate_limited}")
+    print(f"{'endpoint':<10}{'limit/s':>9}{'offered':>9}{'ok':>7}{'10006':>7}{'failed':>8}{'done/s':>9}")
+    for endpoint, result in results.items():
+        offered = int(ENDPOINT_LIMITS[endpoint] * args.load * args.seconds)
+        rate = result['ok'] / result['finished'] if result['finished'] else 0
+        print(
+            f"{endpoint:<10}{ENDPOINT_LIMITS[endpoint]:>9}{offered:>9}{result['ok']:>7}"
+            f"{result['rate limited']:>7}{result['failed']:>8}{rate:>9.1f}"
+        )
+    return rate_limited == 0
+
+
+def main():
+    args = parse_args()
+    print(f"Offering {args.load:g}x every endpoint class's limit for {args.seconds:g}s")
+    clean = {mode: asyncio.run(run(mode, args)) for mode in args.modes.split(',')}
+    # Only the throttled run has to stay clear of the limits
+    return 0 if clean.get('throttled', True) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+"""Time rendering a page of positions and open orders, offline.
+
+render.py builds each view from templates compiled once, escapes each
+rendered block for MarkdownV2 and packs the blocks into messages under
+Telegram's 4096 limit. The views used to be built by appending f-strings to one string,
+unescaped and unsplit; that rendering is timed alongside for comparison.
+For every message the script also checks that it fits the limit and is
+valid MarkdownV2, i.e. that no special character outside *bold* markers is
+left unescaped.
+
+    python benchmark_render.py --rows 100 --repeat 200
+"""
+import time
+import random
+import argparse
+from analytics import PositionFrame
+from benchmark_analytics import positions
+from render import MARKDOWN_SPECIALS, MESSAGE_LIMIT, render_positions, render_orders, _length
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100, help="positions and orders on the page")
+    parser.add_argument('--repeat', type=int, default=200, help="renders timed per view and round")
+    parser.add_argument('--rounds', type=int, default=5, help="rounds per view; the fastest is reported")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def orders(n, rng):
+    """``n`` open orders as Bybit sends them; ids and option symbols carry -."""
+    rows = []
+    for i in range(n):
+        rows.append({
+            'symbol': rng.choice(['BTCUSDT', 'ETHUSDT', '1000PEPEUSDT', 'BTC-27DEC24-60000-C']),
+            'orderId': f"{rng.getrandbits(32):08x}-{i:04d}-4e1b-9c3a-{rng.getrandbits(48):012x}",
+            'side': rng.choice(['Buy', 'Sell']),
+            'price': f"{rng.uniform(0.01, 70000):.2f}",
+            'qty': f"{rng.randint(1, 1000) / 100}",
+            'orderType': 'Limit',
+            'orderStatus': 'New',
+        })
+    return rows
+
+
+def fstring_positions(frame, page, has_next):
+    """The positions view before render.py."""
+    position_text = "📊 *Current Positions*\n\n"
+    for i, position in enumerate(frame.rows):
+        entry_price = frame.entry_price[i]
+        current_price = frame.mark_price[i]
+        unrealized_pnl = frame.unrealised_pnl[i]
+        leverage = position.get('leverage', 'N/A')
+        margin = position.get('positionIM', 'N/A')
+        side = position.get('side', 'N/A')
+
+        side_emoji = "🟢 Long" if side == "Buy" else "🔴 Short"
+        pnl_color = "🟢" if unrealized_pnl >= 0 else "🔴"
+        roe_color = "🟢" if frame.roe[i] >= 0 else "🔴"
+        price_trend = "📈" if current_price > entry_price else "📉"
+
+        position_text += f"{'='*30}\n"
+        position_text += f"*{position['symbol']}* {price_trend}\n"
+        position_text += f"Side: {side_emoji}\n"
+        position_text += f"Size: {float(frame.size[i])} ({leverage}x)\n"
+        position_text += f"Entry: ${entry_price:.4f}\n"
+        position_text += f"Current: ${current_price:.4f}\n\n"
+        position_text += f"*PnL Information:*\n"
+        position_text += f"{pnl_color} PnL: ${unrealized_pnl:.2f} ({frame.pnl_pct[i]:.2f}%)\n"
+        if margin != 'N/A':
+            position_text += f"Margin: ${float(frame.margin[i])} USDT\n"
+        position_text += f"{roe_color} ROE: {frame.roe[i]:.2f}%\n\n"
+
+    total_pnl = frame.unrealised_pnl.sum()
+    if total_pnl != 0:
+        position_text += f"{'='*30}\n"
+        total_pnl_color = "🟢" if total_pnl >= 0 else "🔴"
+        position_text += f"\n*Portfolio Summary:*\n"
+        if page > 0 or has_next:
+            position_text += f"{total_pnl_color} *Page {page + 1} PnL: ${total_pnl:.2f} USDT*\n"
+        else:
+            position_text += f"{total_pnl_color} *Total PnL: ${total_pnl:.2f} USDT*\n"
+    return [position_text]
+
+
+def fstring_orders(rows, page):
+    """The open orders view before render.py."""
+    orders_text = "📝 Open Orders:\n\n" if page == 0 else f"📝 Open Orders (page {page + 1}):\n\n"
+    for order in rows:
+        orders_text += f"*{order['symbol']}*:\n"
+        orders_text += f"Order ID: {order['orderId']}\n"
+        orders_text += f"Side: {order['side']}\n"
+        orders_text += f"Price: {order['price']}\n"
+        orders_text += f"Quantity: {order['qty']}\n"
+        orders_text += f"Type: {order['orderType']}\n"
+        orders_text += f"Status: {order['orderStatus']}\n\n"
+    return [orders_text]
+
+
+def valid(message):
+    """Whether Telegram would accept ``message`` as MarkdownV2 of at most MESSAGE_LIMIT."""
+    if _length(message) > MESSAGE_LIMIT:
+        return False
+    escaped = False
+    bold = False
+    for char in message:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '*':
+            bold = not bold
+        elif char in MARKDOWN_SPECIALS:
+            return False
+    # A message may not end inside *bold* or halfway through an escape
+    return not bold and not escaped
+
+
+def timed(render, repeat, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            messages = render()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best, messages
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    frame = PositionFrame(positions(args.rows, rng))
+    order_rows = orders(args.rows, rng)
+    views = [
+        ('positions', 'templates', lambda: render_positions(frame, 0, True)),
+        ('positions', 'f-strings', lambda: fstring_positions(frame, 0, True)),
+        ('orders', 'templates', lambda: render_orders(order_rows, 0)),
+        ('orders', 'f-strings', lambda: fstring_orders(order_rows, 0)),
+    ]
+    print(f"A page of {args.rows} rows, {args.repeat} renders each\n")
+    print(f"{'view':<11}{'rendering':<11}{'ms/page':>9}{'us/row':>8}{'messages':>10}{'valid':>7}")
+    all_valid = True
+    for view, rendering, render in views:
+        seconds, messages = timed(render, args.repeat, args.rounds)
+        accepted = sum(valid(message) for message in messages)
+        if rendering == 'templates':
+            all_valid = all_valid and accepted == len(messages)
+        print(
+            f"{view:<11}{rendering:<11}{seconds * 1000:>9.2f}{seconds / args.rows * 1e6:>8.1f}"
+            f"{len(messages):>10}{accepted:>7}"
+        )
+    print("\nvalid: messages within Telegram's limit with all MarkdownV2 specials escaped")
+    return 0 if all_valid else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+"""Place market orders against a simulated Bybit that stalls and fails requests, offline.
+
+simulator.SimulatedBybit holds --stall-rate of all requests for
+--stall-seconds before answering and fails --error-rate of them with a
+server error. A stalled request still goes through once it wakes up, as
+a request that timed out on our side may at Bybit. Orders are placed
+through exchange.Exchange with an order timeout well under the stall, so
+stalled attempts time out and are retried with the same orderLinkId.
+
+Every order must come back placed, and once the stalled requests have
+finished the account must show exactly one fill per order: a retry of an
+attempt that got through is answered as a duplicate orderLinkId, which
+counts as placed rather than placing the order twice.
+
+    python benchmark_resilience.py --orders 30 --stall-rate 0.3
+"""
+import time
+import random
+import asyncio
+import logging
+import argparse
+from exchange import Exchange
+from resilience import CircuitBreaker
+from simulator import SimulatedBybit
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=30, help="market orders to place")
+    parser.add_argument('--concurrency', type=int, default=5, help="orders in flight at the same time")
+    parser.add_argument('--stall-rate', type=float, default=0.3, help="share of requests that stall")
+    parser.add_argument('--stall-seconds', type=float, default=1.0, help="how long a stalled request takes")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="share of requests that fail with a server error")
+    parser.add_argument('--timeout', type=float, default=0.25, help="seconds before an order attempt is abandoned")
+    parser.add_argument('--attempts', type=int, default=5, help="attempts per order")
+    parser.add_argument('--latency', type=float, default=0.02, help="Bybit request latency in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+async def main_async(args):
+    random.seed(args.seed)
+    client = SimulatedBybit(
+        latency=args.latency, jitter=0, rate_limits=False, seed_positions=0, seed_orders=0,
+        slow_rate=args.stall_rate, slow_latency=args.stall_seconds, error_rate=args.error_rate, seed=args.seed
+    )
+    # Enough failures in a row to ride out the injected ones; the breaker is not what is measured here
+    breaker = CircuitBreaker(failures=args.orders * args.attempts)
+    exchange = Exchange(client, breaker=breaker, max_attempts=args.attempts,
+                        timeouts={'order': args.timeout, 'read': 5.0})
+    semaphore = asyncio.Semaphore(args.concurrency)
+    outcomes = {'placed': 0, 'duplicate answers': 0, 'failed': 0}
+
+    async def place(n):
+        async with semaphore:
+            try:
+                response = await exchange.place_order(
+                    category="linear", symbol="BTCUSDT", side="Buy" if n % 2 == 0 else "Sell",
+                    orderType="Market", qty="0.001"
+                )
+            except Exception as e:
+                outcomes['failed'] += 1
+                print(f"  order {n} failed: {type(e).__name__}: {e}")
+                return
+            outcomes['placed'] += 1
+            # Exchange.place_order answers a duplicate orderLinkId without an orderId
+            if not response['result']['orderId']:
+                outcomes['duplicate answers'] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(place(n) for n in range(args.orders)))
+    elapsed = time.perf_counter() - start
+    # Let stalled attempts that were given up on reach the simulated exchange
+    await asyncio.sleep(args.stall_seconds + args.latency + 0.5)
+    exchange.shutdown()
+
+    fills = 0
+    cursor = ''
+    while True:
+        page = client.get_executions(category="linear", limit=100, cursor=cursor)['result']
+        fills += len(page['list'])
+        cursor = page['nextPageCursor']
+        if not cursor:
+            break
+    attempts = client.calls.get('place_order', 0)
+    print(
+        f"{args.orders} orders, {args.stall_rate:.0%} of requests stalling {args.stall_seconds:g}s, "
+        f"{args.error_rate:.0%} failing, {args.timeout:g}s order timeout\n"
+    )
+    print(f"attempts sent:      {attempts}")
+    print(f"placed:             {outcomes['placed']} ({outcomes['duplicate answers']} answered as duplicates)")
+    print(f"failed:             {outcomes['failed']}")
+    print(f"fills at Bybit:     {fills}")
+    print(f"seconds:            {elapsed:.2f}")
+    ok = outcomes['placed'] == args.orders and fills == args.orders
+    print(f"\none fill per order: {'yes' if ok else 'NO'}")
+    return 0 if ok else 1
+
+
+def main():
+    # Retries are counted below rather than logged one by one
+    logging.getLogger().setLevel(logging.ERROR)
+    return asyncio.run(main_async(parse_args()))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""Check that a write through one worker's shared cache reaches another's, offline.
+
+Two cache.SharedTTLCache instances, each with its own SQLiteCacheStore on
+one file, stand in for two worker processes serving the same account.
+The first writes every --write-interval seconds: the account's version
+goes up and the cache is invalidated, as Exchange.write_call does. The
+second reads as fast as it can meanwhile. It may serve an old version
+for at most its generation check interval after a write, never longer,
+however much of the TTL its copy has left.
+
+Each interval is run in turn; 0 checks the store's generation on every
+read, as the cache used to. The script reports reads per second, store
+generation queries, and the longest time an old version was served.
+
+    python benchmark_sharedcache.py --intervals 0,0.25 --seconds 3
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from cache import SharedTTLCache, SQLiteCacheStore
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--intervals', default='0,0.25', help="comma separated generation check intervals, seconds")
+    parser.add_argument('--seconds', type=float, default=3, help="how long the second cache reads for")
+    parser.add_argument('--write-interval', type=float, default=0.5, help="seconds between writes by the first")
+    parser.add_argument('--ttl', type=float, default=10, help="TTL of the cached snapshots")
+    return parser.parse_args()
+
+
+class CountingStore(SQLiteCacheStore):
+    """A SQLiteCacheStore that counts generation queries."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generation_queries = 0
+
+    async def generation(self, namespace, kind):
+        self.generation_queries += 1
+        return await super().generation(namespace, kind)
+
+
+async def run(interval, args):
+    path = os.path.join(tempfile.mkdtemp(prefix='bybit-cache-'), 'exchange_cache.sqlite3')
+    ttls = {'positions': args.ttl}
+    writer_store = CountingStore(path)
+    reader_store = CountingStore(path)
+    writer = SharedTTLCache(writer_store, 'account', ttls, generation_check_interval=interval)
+    reader = SharedTTLCache(reader_store, 'account', ttls, generation_check_interval=interval)
+    account = {'version': 0}
+    # version -> when the write that made it finished
+    written_at = {0: time.monotonic()}
+
+    async def load():
+        return account['version']
+
+    await writer.get_or_load('positions', {}, load)
+    done = False
+
+    async def write():
+        while not done:
+            await asyncio.sleep(args.write_interval)
+            account['version'] += 1
+            writer.invalidate('positions')
+            written_at[account['version']] = time.monotonic()
+
+    writes = asyncio.ensure_future(write())
+    reads = 0
+    longest = 0.0
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        served = await reader.get_or_load('positions', {}, load)
+        reads += 1
+        now = time.monotonic()
+        newer = [at for version, at in written_at.items() if version > served]
+        if newer:
+            # Served while a newer version existed: stale since the first write after it
+            longest = max(longest, now - min(newer))
+        if not reads % 100:
+            await asyncio.sleep(0)
+    done = True
+    writes.cancel()
+    queries = reader_store.generation_queries
+    writer_store.close()
+    reader_store.close()
+    return reads, queries, longest
+
+
+def main():
+    args = parse_args()
+    print(f"one write every {args.write_interval:g}s for {args.seconds:g}s, snapshots live {args.ttl:g}s\n")
+    print(f"{'interval':>9}{'reads/s':>10}{'queries':>9}{'per read':>10}{'stale ms':>10}{'within':>8}")
+    ok = True
+    for interval in (float(value) for value in args.intervals.split(',')):
+        reads, queries, longest = asyncio.run(run(interval, args))
+        # Allow for the store round trip of the check itself
+        within = longest <= interval + 0.05
+        ok = ok and within
+        print(
+            f"{interval:>9g}{reads / args.seconds:>10,.0f}{queries:>9}{queries / reads:>10.3f}"
+            f"{longest * 1000:>10.1f}{'yes' if within else 'NO':>8}"
+        )
+    print("\nqueries: generation queries by the reading cache; stale: longest an old version was served")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
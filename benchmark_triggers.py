@@ -0,0 +1,157 @@
+"""Replay a ticker stream through TriggerEngine and check it against a naive per-rule scan, offline.
+
+The ticker messages come from a file recorded with LIVE_STATE_RECORD (one
+JSON message per line; anything but tickers is skipped) or are generated
+as random walks over --symbols contracts. Alerts, brackets and long and
+short trailing stops are set around each symbol's first price, then every
+tick goes through triggers.replay and, separately, through a scan of
+every rule of the symbol. Both must fire the same rules at the same
+prices; the script reports how long each took per tick.
+
+    python benchmark_triggers.py --symbols 5 --ticks 20000 --rules 2000
+    python benchmark_triggers.py --record live_state.jsonl
+"""
+import json
+import math
+import time
+import random
+import argparse
+from simulator import REFERENCE_PRICES
+from triggers import TriggerEngine, TRAILING_STOP, replay, ticker_prices
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--record', help="recorded stream to replay instead of generated prices")
+    parser.add_argument('--write', help="also save the generated ticker messages to this file")
+    parser.add_argument('--symbols', type=int, default=5, help="symbols with generated prices")
+    parser.add_argument('--ticks', type=int, default=20000, help="generated ticker messages")
+    parser.add_argument('--volatility', type=float, default=0.002, help="standard deviation of a tick's return")
+    parser.add_argument('--rules', type=int, default=2000, help="alerts, brackets and trailing stops set before the replay")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def generated_messages(args, rng):
+    """Ticker messages shaped like Bybit's, one random walk per symbol."""
+    symbols = list(REFERENCE_PRICES)[:args.symbols]
+    prices = {symbol: REFERENCE_PRICES[symbol] for symbol in symbols}
+    messages = []
+    for n in range(args.ticks):
+        symbol = rng.choice(symbols)
+        prices[symbol] *= math.exp(rng.gauss(0, args.volatility))
+        messages.append({
+            'topic': f'tickers.{symbol}',
+            'type': 'snapshot',
+            'ts': 1700000000000 + n * 100,
+            'data': {'symbol': symbol, 'lastPrice': f"{prices[symbol]:.6g}"},
+        })
+    return messages
+
+
+def add_rules(engine, first_prices, count, rng):
+    """Random rules around each symbol's first price, as plain dicts for the naive scan."""
+    rules = []
+    symbols = sorted(first_prices)
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        price = first_prices[symbol]
+        side = rng.choice(['Buy', 'Sell'])
+        kind = rng.random()
+        if kind < 0.4:
+            direction = rng.choice(['above', 'below'])
+            level = price * (1 + rng.uniform(0.001, 0.05) * (1 if direction == 'above' else -1))
+            added = [engine.add_alert(1, symbol, direction, level)]
+        elif kind < 0.7:
+            away = 1 if side == 'Buy' else -1
+            added = engine.add_bracket(
+                1, symbol, side, '1',
+                take_profit=price * (1 + away * rng.uniform(0.001, 0.05)),
+                stop_loss=price * (1 - away * rng.uniform(0.001, 0.05))
+            )
+        else:
+            added = [engine.add_trailing_stop(1, symbol, side, '1', rng.uniform(0.001, 0.02), price=price)]
+        for rule in added:
+            rules.append({
+                'id': rule.id, 'symbol': symbol, 'kind': rule.kind, 'direction': rule.direction,
+                'price': rule.price, 'pct': rule.pct, 'side': rule.side, 'linked_id': rule.linked_id,
+                'peak': price,
+            })
+    return rules
+
+
+def naive_scan(rules, prices):
+    """Check every active rule of the symbol on every tick; returns {rule id: price fired at}."""
+    by_symbol = {}
+    for rule in rules:
+        by_symbol.setdefault(rule['symbol'], []).append(rule)
+    active = {rule['id'] for rule in rules}
+    fired = {}
+    for symbol, price in prices:
+        for rule in by_symbol.get(symbol, ()):
+            if rule['id'] not in active:
+                continue
+            if rule['kind'] == TRAILING_STOP:
+                # Longs trail the highest price since the stop was set, shorts the lowest
+                if rule['side'] == 'Buy':
+                    rule['peak'] = max(rule['peak'], price)
+                    hit = price <= rule['peak'] * (1 - rule['pct'])
+                else:
+                    rule['peak'] = min(rule['peak'], price)
+                    hit = -price <= -rule['peak'] * (1 + rule['pct'])
+            elif rule['direction'] == 'above':
+                hit = price >= rule['price']
+            else:
+                hit = price <= rule['price']
+            if hit:
+                active.discard(rule['id'])
+                active.discard(rule['linked_id'])
+                fired[rule['id']] = price
+    return fired
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    if args.record:
+        with open(args.record) as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+    else:
+        messages = generated_messages(args, rng)
+        if args.write:
+            with open(args.write, 'w') as f:
+                f.writelines(json.dumps(message) + '\n' for message in messages)
+    prices = list(ticker_prices(messages))
+    if not prices:
+        print("No ticker messages to replay")
+        return 1
+
+    first_prices = {}
+    for symbol, price in prices:
+        first_prices.setdefault(symbol, price)
+    engine = TriggerEngine()
+    rules = add_rules(engine, first_prices, args.rules, rng)
+
+    start = time.perf_counter()
+    engine_fired = {rule.id: price for rule, price in replay(engine, messages)}
+    engine_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    naive_fired = naive_scan(rules, prices)
+    naive_seconds = time.perf_counter() - start
+
+    differing = sorted(
+        rule_id for rule_id in set(engine_fired) | set(naive_fired)
+        if engine_fired.get(rule_id) != naive_fired.get(rule_id)
+    )
+    print(f"{len(prices)} ticks over {len(first_prices)} symbols, {len(rules)} rules\n")
+    print(f"{'':<8}{'fired':>8}{'us/tick':>10}")
+    print(f"{'engine':<8}{len(engine_fired):>8}{engine_seconds / len(prices) * 1e6:>10.2f}")
+    print(f"{'naive':<8}{len(naive_fired):>8}{naive_seconds / len(prices) * 1e6:>10.2f}")
+    print(f"\nrules fired differently: {len(differing)}")
+    for rule_id in differing[:10]:
+        print(f"  #{rule_id}: engine {engine_fired.get(rule_id)}, naive {naive_fired.get(rule_id)}")
+    return 1 if differing else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""Measure handler throughput when many chats send updates at once, offline.
+
+Every update's handler makes one Bybit read against simulator.SimulatedBybit.
+Two ways of handling them are compared:
+
+- blocking: pybit is called on the event loop and updates are handled one
+  at a time, the way the bot worked before it had an async exchange layer;
+- concurrent: calls go through exchange.Exchange's thread pool and updates
+  through updates.ChatUpdateProcessor, as bot.py runs them.
+
+Updates of one chat must still be handled in the order they arrived; the
+script checks that as well. Simulated rate limits, and the scheduler's
+throttling to them, are off so only the handling itself is measured
+(benchmark_ratelimit.py covers those).
+
+    python benchmark_updates.py --chats 100 --updates 3 --latency 0.05
+"""
+import time
+import asyncio
+import argparse
+from telegram import Update
+from telegram.ext import SimpleUpdateProcessor
+from benchmark import percentile
+from exchange import Exchange
+from ratelimit import RequestScheduler, ENDPOINT_LIMITS
+from simulator import SimulatedBybit, UpdateDriver
+from updates import ChatUpdateProcessor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=100, help="chats sending updates at the same time")
+    parser.add_argument('--updates', type=int, default=3, help="updates each chat sends")
+    parser.add_argument('--latency', type=float, default=0.05, help="Bybit request latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01, help="Bybit latency jitter in seconds")
+    parser.add_argument('--workers', type=int, default=16, help="Exchange thread pool size in concurrent mode")
+    parser.add_argument('--modes', default='blocking,concurrent', help="comma separated modes to run")
+    return parser.parse_args()
+
+
+async def run(mode, args):
+    client = SimulatedBybit(
+        latency=args.latency, jitter=args.jitter, rate_limits=False, seed_positions=0, seed_orders=0
+    )
+    if mode == 'blocking':
+        processor = SimpleUpdateProcessor(1)
+
+        async def read():
+            return client.get_wallet_balance(accountType="UNIFIED")
+    else:
+        unlimited = RequestScheduler(args.workers, limits=dict.fromkeys(ENDPOINT_LIMITS, 10 ** 6))
+        exchange = Exchange(client, max_workers=args.workers, scheduler=unlimited)
+        processor = ChatUpdateProcessor()
+
+        async def read():
+            return await exchange.call('get_wallet_balance', accountType="UNIFIED")
+
+    driver = UpdateDriver()
+    handled = {}
+    latencies = []
+
+    async def handler(update, received):
+        await read()
+        handled.setdefault(update.effective_chat.id, []).append(update.update_id)
+        latencies.append(time.perf_counter() - received)
+
+    # Everything arrives at once, as after a burst of taps across chats
+    updates = [
+        Update.de_json(driver.send_data(chat_id, f'update {n}'), None)
+        for n in range(args.updates)
+        for chat_id in range(1, args.chats + 1)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        processor.process_update(update, handler(update, start)) for update in updates
+    ))
+    elapsed = time.perf_counter() - start
+    if mode != 'blocking':
+        exchange.shutdown()
+
+    in_order = all(ids == sorted(ids) for ids in handled.values())
+    latencies.sort()
+    print(
+        f"{mode:<12}{len(updates):>8}{elapsed:>10.2f}{len(updates) / elapsed:>12.0f}"
+        f"{percentile(latencies, 0.5) * 1000:>10.0f}{percentile(latencies, 0.99) * 1000:>10.0f}"
+        f"{'yes' if in_order else 'NO':>10}"
+    )
+    return in_order
+
+
+def main():
+    args = parse_args()
+    print(f"{args.chats} chats x {args.updates} updates, {args.latency * 1000:.0f} ms Bybit latency\n")
+    print(f"{'mode':<12}{'updates':>8}{'seconds':>10}{'updates/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'ordered':>10}")
+    ordered = [asyncio.run(run(mode, args)) for mode in args.modes.split(',')]
+    return 0 if all(ordered) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
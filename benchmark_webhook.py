@@ -0,0 +1,146 @@
+"""Compare update latency with webhook delivery and with long polling, offline.
+
+Simulated users send /start over and over, each waiting for the bot's
+reply before sending the next one. In "webhook" mode every update is
+POSTed to the bot's own webhook server on localhost, secret token and
+all, as Telegram would; in "polling" mode it is handed to a local Bot API
+(simulator.SimulatedTelegram) that answers the bot's getUpdates long
+polls. Either way an update spends half the Bot API latency on its way
+to the bot, as it would crossing the network from Telegram. Latency runs
+from Telegram having the update to the bot's reply leaving; Bybit is
+simulator.SimulatedBybit, answering at once.
+
+The webhook requests are sent from the bot's own process, so on a
+single core their HTTP client's work counts against the webhook numbers.
+
+    python benchmark_webhook.py --users 50 --rounds 5
+"""
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+import httpx
+from benchmark import configure, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help="simulated users, each in their own chat")
+    parser.add_argument('--rounds', type=int, default=5, help="updates every user sends, one after another")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="Bot API latency in seconds")
+    parser.add_argument('--modes', default='webhook,polling', help="comma separated modes to run")
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run(mode, args):
+    import bot
+    from outbound import OutboundThrottler
+    from simulator import SimulatedTelegram, UpdateDriver
+    # The bot configures logging when imported
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    replies = {}
+
+    class RepliedTelegram(SimulatedTelegram):
+        """Resolves the waiting sender of a chat when the bot replies to it."""
+
+        def _answer(self, endpoint, params):
+            if endpoint == 'sendMessage':
+                future = replies.pop(int(params.get('chat_id', 0)), None)
+                if future is not None and not future.done():
+                    future.set_result(time.perf_counter())
+            return super()._answer(endpoint, params)
+
+    telegram = RepliedTelegram(latency=args.telegram_latency)
+    application = bot.build_application(
+        request=telegram,
+        rate_limiter=OutboundThrottler(overall_rate=10000, private_rate=10000)
+    )
+    await application.initialize()
+    await application.post_init(application)
+    port = free_port()
+    if mode == 'webhook':
+        await application.updater.start_webhook(
+            listen='127.0.0.1',
+            port=port,
+            url_path=bot.WEBHOOK_PATH,
+            secret_token=bot.WEBHOOK_SECRET,
+            webhook_url=f'http://127.0.0.1:{port}/{bot.WEBHOOK_PATH}',
+            allowed_updates=bot.ALLOWED_UPDATES
+        )
+    else:
+        await application.updater.start_polling(allowed_updates=bot.ALLOWED_UPDATES)
+    await application.start()
+
+    driver = UpdateDriver(application.bot)
+    url = f'http://127.0.0.1:{port}/{bot.WEBHOOK_PATH}'
+    headers = {'X-Telegram-Bot-Api-Secret-Token': bot.WEBHOOK_SECRET}
+    latencies = []
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def deliver(data):
+            if mode == 'webhook':
+                await asyncio.sleep(args.telegram_latency / 2)
+                response = await client.post(url, json=data, headers=headers)
+                response.raise_for_status()
+            else:
+                telegram.deliver(data)
+
+        async def run_user(user_id):
+            for _ in range(args.rounds):
+                replied = replies[user_id] = asyncio.get_running_loop().create_future()
+                start = time.perf_counter()
+                await deliver(driver.send_data(user_id, '/start'))
+                latencies.append(await asyncio.wait_for(replied, 30) - start)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(run_user(user_id) for user_id in range(1, args.users + 1)))
+            elapsed = time.perf_counter() - start
+        finally:
+            await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+            await application.post_shutdown(application)
+
+    latencies.sort()
+    print(
+        f"{mode:<10}{len(latencies):>8}{len(latencies) / elapsed:>12.0f}"
+        f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+        f"{latencies[-1] * 1000:>10.1f}"
+    )
+
+
+def run_mode(mode, args):
+    # A process per mode, so each starts from a freshly imported bot
+    asyncio.run(run(mode, args))
+
+
+def main():
+    args = parse_args()
+    configure(argparse.Namespace(
+        latency=0.0, jitter=0.0, error_rate=0.0, symbols=5, positions=0, orders=0, accounts=1,
+        telegram_latency=args.telegram_latency, telegram_rate=10000, log=False
+    ))
+    print(f"{args.users} users x {args.rounds} updates, {args.telegram_latency * 1000:.0f} ms Bot API latency\n")
+    print(f"{'mode':<10}{'updates':>8}{'updates/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}", flush=True)
+    context = multiprocessing.get_context('spawn')
+    for mode in args.modes.split(','):
+        process = context.Process(target=run_mode, args=(mode, args))
+        process.start()
+        process.join()
+        if process.exitcode:
+            return process.exitcode
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,38 @@
 import os
+import time
+import asyncio
+import functools
+import hashlib
 import logging
+import secrets
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 from pybit.unified_trading import HTTP
 import json
 from decimal import Decimal
+from exchange import Exchange
+from cache import SQLiteCacheStore, SharedTTLCache
+from accounts import AccountPool, CredentialCipher
+from updates import ChatUpdateProcessor
+from outbound import OutboundThrottler
+from metrics import Gauge, MetricsServer, instrument_handlers, MONITOR_MESSAGES, MONITOR_SECONDS
+from livestate import AccountState, LiveStream
+from instruments import InstrumentIndex, OrderValidationError, parse_decimal
+from symbols import SymbolSearch, symbol_keyboard, remember_symbol, toggle_favorite
+from persistence import SQLitePersistence, SharedPersistence
+from ladder import parse_ladder, build_ladder, batch_requests, chunked, batch_results
+from analytics import PositionFrame, account_totals, coin_values, base_coin
+from portfolio import (
+    fetch_positions, sample_orders, positions_page, orders_page, first_page_starts, cancel_orders,
+    POSITION_SCOPES, ORDER_SCOPES, SCOPE_LABELS, CATEGORY_LABELS
+)
+from render import render_balance, render_positions, render_orders, render_order_placed, render_risk, render_digest
+from history import HistoryStore, TradeHistory
+from simulator import SimulatedBybit
+from triggers import TriggerEngine, ALERT, TAKE_PROFIT, STOP_LOSS, TRAILING_STOP
+from monitor import PortfolioMonitor, MONITOR_INTERVAL, DEFAULT_THRESHOLDS, DIGEST_HOURS, snapshot_accounts, funding_rates
 
 # Load environment variables
 load_dotenv()
@@ -16,18 +43,149 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# BYBIT_SIMULATOR=1 trades against the offline simulator in simulator.py instead of Bybit
+BYBIT_SIMULATOR = os.getenv('BYBIT_SIMULATOR') == '1'
+BYBIT_TESTNET = os.getenv('BYBIT_TESTNET') == '1'
+BybitHTTP = SimulatedBybit if BYBIT_SIMULATOR else HTTP
+
+# Set in the worker processes sharding.py starts; unset in a single process bot
+SHARD_INDEX = int(os.getenv('SHARD_INDEX')) if os.getenv('SHARD_INDEX') else None
+# Only one worker runs the bot-wide jobs and holds trigger rules and monitor subscriptions
+PRIMARY = SHARD_INDEX in (None, 0)
+# Bybit snapshots the workers share, so a read one worker made serves the others
+SHARED_CACHE_FILE = os.getenv('SHARED_CACHE_FILE', 'exchange_cache.sqlite3')
+cache_store = SQLiteCacheStore(SHARED_CACHE_FILE) if SHARD_INDEX is not None else None
+
+def account_cache(api_key):
+    """The snapshot cache of one account; shared between workers when sharded."""
+    if cache_store is None:
+        return None
+    namespace = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else 'default'
+    return SharedTTLCache(cache_store, namespace)
+
 # Initialize Bybit client
-client = HTTP(
-    testnet=False,
+client = BybitHTTP(
+    testnet=BYBIT_TESTNET,
     api_key=os.getenv('BYBIT_API_KEY'),
-    api_secret=os.getenv('BYBIT_SECRET_KEY')
+    api_secret=os.getenv('BYBIT_SECRET_KEY'),
+    return_response_headers=True
+)
+# The account from the environment; also serves all public market data
+exchange = Exchange(client, cache=account_cache(None))
+
+# Users may link their own Bybit keys, stored encrypted with this Fernet key
+CREDENTIALS_ENCRYPTION_KEY = os.getenv('CREDENTIALS_ENCRYPTION_KEY')
+# Telegram user ids allowed to trade the environment account; everyone when unset
+DEFAULT_ACCOUNT_USERS = os.getenv('DEFAULT_ACCOUNT_USERS')
+accounts = AccountPool(
+    CredentialCipher(CREDENTIALS_ENCRYPTION_KEY) if CREDENTIALS_ENCRYPTION_KEY else None,
+    default=exchange if os.getenv('BYBIT_API_KEY') else None,
+    default_users={int(user_id) for user_id in DEFAULT_ACCOUNT_USERS.split(',') if user_id.strip()}
+    if DEFAULT_ACCOUNT_USERS else None,
+    testnet=BYBIT_TESTNET,
+    client_class=BybitHTTP,
+    cache_factory=account_cache
 )
+ACCOUNT_EVICTION_INTERVAL = 60
+
+# Trading rules for linear contracts, used to validate input before it reaches Bybit
+instruments = InstrumentIndex('linear')
+INSTRUMENTS_REFRESH_INTERVAL = int(os.getenv('INSTRUMENTS_REFRESH_INTERVAL', '3600'))
+symbol_search = SymbolSearch()
+
+# Rows per page in the positions and open orders views; sized to stay
+# well under Telegram's 4096 character message limit
+POSITIONS_PAGE_SIZE = 8
+ORDERS_PAGE_SIZE = 10
+# Coins listed individually in the risk view
+RISK_COINS_SHOWN = 10
+# Symbols offered for a targeted cancel
+CANCEL_SYMBOLS_SHOWN = 8
+
+# Offered when the instrument index could not be loaded
+FALLBACK_SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+
+# Conditional orders and price alerts, evaluated on every price update
+trigger_engine = TriggerEngine()
+# Seconds between REST price polls for the trigger engine while the ticker stream is down
+TRIGGER_POLL_INTERVAL = float(os.getenv('TRIGGER_POLL_INTERVAL', '2'))
+TRIGGER_LABELS = {
+    ALERT: "🔔 Alert",
+    TAKE_PROFIT: "🎯 Take profit",
+    STOP_LOSS: "🛑 Stop loss",
+    TRAILING_STOP: "📉 Trailing stop",
+}
+
+# Scheduled portfolio digests and margin, drawdown and funding alerts
+portfolio_monitor = PortfolioMonitor()
+MONITOR_LABELS = {'margin': "margin ratio", 'drawdown': "drawdown", 'funding': "funding paid"}
+
+# Keep account state current from the WebSocket streams unless disabled; the simulator has none
+LIVE_STATE = os.getenv('LIVE_STATE', '1') == '1' and not BYBIT_SIMULATOR
+live_stream = LiveStream(
+    exchange,
+    AccountState(),
+    testnet=BYBIT_TESTNET,
+    record_path=os.getenv('LIVE_STATE_RECORD')
+)
+
+# Webhook mode is used when WEBHOOK_URL is set, long polling otherwise
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+# Telegram echoes this in every webhook request; a random one is fine since
+# the webhook is registered again on every start
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+
+# Messages per second the bot sends across all chats
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '30'))
+
+# Prometheus text metrics on http://METRICS_LISTEN:METRICS_PORT/metrics; port 0 turns them off
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+metrics_server = MetricsServer(METRICS_LISTEN, METRICS_PORT) if METRICS_PORT else None
+
+# The only update types any handler reacts to
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
 
 # Conversation states
-SYMBOL, ORDER_TYPE, SIDE, QUANTITY, PRICE, LEVERAGE = range(6)
+SYMBOL, ORDER_TYPE, SIDE, QUANTITY, PRICE, LEVERAGE, LADDER, LADDER_CONFIRM = range(8)
+
+# Executions and closed PnL are mirrored into this SQLite file for the PnL summaries
+HISTORY_FILE = os.getenv('HISTORY_FILE', 'trade_history.sqlite3')
+HISTORY_SYNC_INTERVAL = float(os.getenv('HISTORY_SYNC_INTERVAL', '300'))
+trade_history = TradeHistory(
+    HistoryStore(HISTORY_FILE),
+    backfill_days=int(os.getenv('HISTORY_BACKFILL_DAYS', '30')),
+    sync_interval=HISTORY_SYNC_INTERVAL
+)
 
-# Store user data
-user_data = {}
+# Conversation state and user data survive restarts in this SQLite file
+PERSISTENCE_FILE = os.getenv('PERSISTENCE_FILE', 'bot_state.sqlite3')
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+
+NO_ACCOUNT_TEXT = (
+    "🔑 No Bybit account is linked to you.\n\n"
+    "Send /setkeys API_KEY API_SECRET in a private chat with me to link one."
+)
+
+def requires_account(handler):
+    """Resolve the caller's Bybit account and pass it to ``handler`` as ``exchange``."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        account = accounts.get(update.effective_user.id, context.user_data)
+        if account is None:
+            keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            if update.callback_query:
+                await update.callback_query.answer()
+                await update.callback_query.edit_message_text(NO_ACCOUNT_TEXT, reply_markup=reply_markup)
+            else:
+                await update.message.reply_text(NO_ACCOUNT_TEXT, reply_markup=reply_markup)
+            return ConversationHandler.END
+        return await handler(update, context, account)
+    return wrapper
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -42,6 +200,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [
             InlineKeyboardButton("❌ Cancel Orders", callback_data='cancel_orders'),
             InlineKeyboardButton("⚙️ Set Leverage", callback_data='set_leverage')
+        ],
+        [
+            InlineKeyboardButton("🪜 Ladder Order", callback_data='ladder_order'),
+            InlineKeyboardButton("⚠️ Risk", callback_data='risk')
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -49,7 +211,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Welcome to Bybit Trading Bot! 🤖\n\n"
         "Commands:\n"
         "/start - Show main menu\n"
-        "/cancel - Cancel current operation\n\n"
+        "/cancel - Cancel current operation\n"
+        "/setkeys - Link your Bybit API keys\n\n"
         "Select an option:"
     )
     
@@ -66,142 +229,131 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return ConversationHandler.END
 
-async def get_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@requires_account
+async def get_balance(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
     try:
-        balance = client.get_wallet_balance(
+        balance = await exchange.get_wallet_balance(
             accountType="UNIFIED"
         )
-        balance_text = "💰 Wallet Balance:\n\n"
+        chunks = render_balance(None)
         
         if 'result' in balance and 'list' in balance['result']:
-            total_usdt = Decimal('0')
-            for account in balance['result']['list']:
-                for coin in account['coin']:
-                    if float(coin['walletBalance']) > 0:
-                        balance_text += f"*{coin['coin']}*:\n"
-                        balance_text += f"Balance: {float(coin['walletBalance']):.8f}\n"
-                        balance_text += f"Available: {float(coin['availableToWithdraw']):.8f}\n"
-                        if coin['coin'] == 'USDT':
-                            total_usdt = Decimal(str(coin['walletBalance']))
-                        else:
-                            # Get latest price for non-USDT assets
-                            try:
-                                ticker = client.get_tickers(
-                                    category="spot",
-                                    symbol=f"{coin['coin']}USDT"
-                                )
-                                if 'result' in ticker and 'list' in ticker['result']:
-                                    price = Decimal(ticker['result']['list'][0]['lastPrice'])
-                                    value = Decimal(str(coin['walletBalance'])) * price
-                                    total_usdt += value
-                                    balance_text += f"Value in USDT: {float(value):.2f}\n"
-                            except Exception:
-                                pass
-                        balance_text += "\n"
+            coins = [
+                coin
+                for account in balance['result']['list']
+                for coin in account['coin']
+                if float(coin['walletBalance']) > 0
+            ]
+            
+            # Price the whole portfolio from a single ticker snapshot
+            prices = {}
+            if any(coin['coin'] != 'USDT' for coin in coins):
+                try:
+                    prices = await exchange.get_spot_prices()
+                except Exception as e:
+                    logging.error(f"Error fetching spot prices: {str(e)}")
             
-            balance_text += f"\n*Total Portfolio Value*: {float(total_usdt):.2f} USDT"
+            chunks = render_balance(coins, *coin_values(coins, prices))
         
         keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.callback_query.edit_message_text(
-            text=balance_text if balance_text != "💰 Wallet Balance:\n\n" else "No balance found",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await show_view(update, chunks, reply_markup)
     except Exception as e:
         logging.error(f"Error in get_balance: {str(e)}")
         await update.callback_query.edit_message_text(f"Error fetching balance: {str(e)}")
 
-async def get_positions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def coin_of(symbol):
+    instrument = instruments.get(symbol)
+    return instrument.base_coin if instrument else base_coin(symbol)
+
+@requires_account
+async def get_risk(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data='risk')],
+        [InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
     try:
-        positions = client.get_positions(
-            category="linear",
-            settleCoin="USDT"
+        wallet, (rows, failed) = await asyncio.gather(
+            exchange.get_wallet_balance(accountType="UNIFIED"),
+            fetch_positions(exchange)
         )
-        position_text = "📊 *Current Positions*\n\n"
+        totals = account_totals(wallet)
+        frame = PositionFrame(rows, coin_of=coin_of)
+        risk = frame.risk(totals['equity'])
         
-        if 'result' in positions and 'list' in positions['result']:
-            total_pnl = Decimal('0')
-            for position in positions['result']['list']:
-                if float(position.get('size', 0)) > 0:
-                    try:
-                        entry_price = Decimal(str(position.get('avgPrice', '0')))
-                        current_price = Decimal(str(position.get('markPrice', '0')))
-                        size = Decimal(str(position.get('size', '0')))
-                        unrealized_pnl = Decimal(str(position.get('unrealisedPnl', '0')))
-                        leverage = position.get('leverage', 'N/A')
-                        margin = position.get('positionIM', 'N/A')
-                        side = position.get('side', 'N/A')
-                        
-                        # Calculate PnL percentage
-                        if entry_price > 0:
-                            if side == 'Buy':
-                                pnl_percentage = ((current_price - entry_price) / entry_price) * 100
-                            else:
-                                pnl_percentage = ((entry_price - current_price) / entry_price) * 100
-                        else:
-                            pnl_percentage = Decimal('0')
-                        
-                        # Calculate ROE manually
-                        if margin and margin != 'N/A' and Decimal(str(margin)) > 0:
-                            roe = (unrealized_pnl / Decimal(str(margin))) * 100
-                        else:
-                            roe = Decimal('0')
-                        
-                        # Determine emojis and indicators based on position state
-                        side_emoji = "🟢 Long" if side == "Buy" else "🔴 Short"
-                        pnl_color = "🟢" if unrealized_pnl >= 0 else "🔴"
-                        roe_color = "🟢" if roe >= 0 else "🔴"
-                        price_trend = "📈" if current_price > entry_price else "📉"
-                        
-                        position_text += f"{'='*30}\n"
-                        position_text += f"*{position['symbol']}* {price_trend}\n"
-                        position_text += f"Side: {side_emoji}\n"
-                        position_text += f"Size: {float(size)} ({leverage}x)\n"
-                        position_text += f"Entry: ${float(entry_price):.4f}\n"
-                        position_text += f"Current: ${float(current_price):.4f}\n\n"
-                        
-                        # PnL Information
-                        position_text += f"*PnL Information:*\n"
-                        pnl_text = f"{pnl_color} PnL: ${float(unrealized_pnl):.2f} ({float(pnl_percentage):.2f}%)\n"
-                        position_text += pnl_text
-                        
-                        # ROE Information
-                        if margin != 'N/A':
-                            position_text += f"Margin: ${float(Decimal(str(margin)))} USDT\n"
-                        position_text += f"{roe_color} ROE: {float(roe):.2f}%\n\n"
-                        
-                        total_pnl += unrealized_pnl
-                    except (ValueError, TypeError, KeyError) as e:
-                        logging.error(f"Error processing position data: {str(e)}")
-                        continue
-            
-            if total_pnl != 0:
-                position_text += f"{'='*30}\n"
-                total_pnl_color = "🟢" if total_pnl >= 0 else "🔴"
-                position_text += f"\n*Portfolio Summary:*\n"
-                position_text += f"{total_pnl_color} *Total PnL: ${float(total_pnl):.2f} USDT*\n"
+        await show_view(update, render_risk(totals, risk, RISK_COINS_SHOWN, scope_labels(failed)), reply_markup)
+    except Exception as e:
+        logging.error(f"Error in get_risk: {str(e)}")
+        await update.callback_query.edit_message_text(
+            text="❌ Error computing risk. Please try again.",
+            reply_markup=reply_markup
+        )
+
+async def show_view(update: Update, chunks, reply_markup, parse_mode=ParseMode.MARKDOWN_V2):
+    """Show a rendered view in place of the menu message; overflow goes out as
+    follow-up messages and the keyboard moves to the last of them."""
+    first, rest = chunks[0], chunks[1:]
+    markup = None if rest else reply_markup
+    if update.callback_query:
+        await update.callback_query.edit_message_text(first, reply_markup=markup, parse_mode=parse_mode)
+    else:
+        await update.message.reply_text(first, reply_markup=markup, parse_mode=parse_mode)
+    for i, chunk in enumerate(rest):
+        await update.effective_chat.send_message(
+            chunk,
+            reply_markup=reply_markup if i == len(rest) - 1 else None,
+            parse_mode=parse_mode
+        )
+
+def requested_page(update: Update):
+    data = update.callback_query.data
+    return int(data.rsplit('_', 1)[1]) if '_page_' in data else 0
+
+def scope_labels(scopes):
+    return [SCOPE_LABELS[scope] for scope in scopes]
+
+async def fetch_view_page(context: ContextTypes.DEFAULT_TYPE, view, fetch_page, scopes, page, page_size):
+    """Fetch only the rows of ``page``, remembering where every page reached so far starts in each scope."""
+    starts = context.user_data.get(f'{view}_starts') if page > 0 else None
+    if not starts or len(starts[0]) != len(scopes):
+        starts = [first_page_starts(scopes)]
+    page = min(page, len(starts) - 1)
+    
+    rows, next_starts, failed = await fetch_page(page_size, starts[page])
+    
+    del starts[page + 1:]
+    if next_starts is not None:
+        starts.append(next_starts)
+    context.user_data[f'{view}_starts'] = starts
+    return rows, page, next_starts is not None, failed
+
+def page_navigation(view, page, has_next):
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f'{view}_page_{page - 1}'))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f'{view}_page_{page + 1}'))
+    return [navigation] if navigation else []
+
+@requires_account
+async def get_positions(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    try:
+        # Every category is read at once, each only as far as the page shown needs
+        rows, page, has_next, failed = await fetch_view_page(
+            context, 'positions', functools.partial(positions_page, exchange), POSITION_SCOPES,
+            requested_page(update), POSITIONS_PAGE_SIZE
+        )
+        frame = PositionFrame(rows, coin_of=coin_of)
         
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data='positions')],
+        keyboard = page_navigation('positions', page, has_next) + [
+            [InlineKeyboardButton("🔄 Refresh", callback_data=f'positions_page_{page}')],
             [InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        no_positions_text = (
-            "📊 *No Open Positions*\n\n"
-            "Start trading by:\n"
-            "1. Set leverage first\n"
-            "2. Place a new order\n"
-            "3. Monitor your positions here"
-        )
-        
-        await update.callback_query.edit_message_text(
-            text=position_text if position_text != "📊 *Current Positions*\n\n" else no_positions_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await show_view(update, render_positions(frame, page, has_next, scope_labels(failed)), reply_markup)
     except Exception as e:
         logging.error(f"Error in get_positions: {str(e)}")
         keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]]
@@ -212,53 +364,85 @@ async def get_positions(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
 
-async def get_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@requires_account
+async def get_orders(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
     try:
-        orders = client.get_open_orders(
-            category="linear",
-            settleCoin="USDT"
+        rows, page, has_next, failed = await fetch_view_page(
+            context, 'orders', functools.partial(orders_page, exchange), ORDER_SCOPES,
+            requested_page(update), ORDERS_PAGE_SIZE
         )
-        orders_text = "📝 Open Orders:\n\n"
         
-        if 'result' in orders and 'list' in orders['result']:
-            for order in orders['result']['list']:
-                orders_text += f"*{order['symbol']}*:\n"
-                orders_text += f"Order ID: {order['orderId']}\n"
-                orders_text += f"Side: {order['side']}\n"
-                orders_text += f"Price: {order['price']}\n"
-                orders_text += f"Quantity: {order['qty']}\n"
-                orders_text += f"Type: {order['orderType']}\n"
-                orders_text += f"Status: {order['orderStatus']}\n\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
+        keyboard = page_navigation('orders', page, has_next) + [
+            [InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.callback_query.edit_message_text(
-            text=orders_text if orders_text != "📝 Open Orders:\n\n" else "No open orders",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await show_view(update, render_orders(rows, page, scope_labels(failed)), reply_markup)
     except Exception as e:
         logging.error(f"Error in get_orders: {str(e)}")
         await update.callback_query.edit_message_text(f"Error fetching orders: {str(e)}")
 
-async def start_place_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [
-            InlineKeyboardButton("BTC/USDT", callback_data='symbol_BTCUSDT'),
-            InlineKeyboardButton("ETH/USDT", callback_data='symbol_ETHUSDT')
-        ],
-        [
-            InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text(
-        "Select trading pair:",
-        reply_markup=reply_markup
-    )
+def symbol_picker_page(context: ContextTypes.DEFAULT_TYPE, page=0):
+    search_text = context.user_data.get('symbol_query', '')
+    all_symbols = symbol_search.symbols or FALLBACK_SYMBOLS
+    
+    pinned = []
+    if search_text:
+        symbols = symbol_search.search(search_text)
+        text = f"Symbols matching \"{search_text}\":" if symbols else f"No symbols match \"{search_text}\". Try again:"
+    else:
+        symbols = all_symbols
+        for symbol in context.user_data.get('favorite_symbols', []) + context.user_data.get('recent_symbols', []):
+            if symbol not in pinned and (symbol in symbol_search or not len(symbol_search)):
+                pinned.append(symbol)
+        text = context.user_data['symbol_title']
+    
+    text += "\n\nType part of a symbol to search."
+    return text, symbol_keyboard(symbols, page, context.user_data['symbol_prefix'], pinned)
+
+async def show_symbol_picker(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix, title):
+    context.user_data['symbol_prefix'] = prefix
+    context.user_data['symbol_title'] = title
+    context.user_data['symbol_query'] = ''
+    text, reply_markup = symbol_picker_page(context)
+    await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
     return SYMBOL
 
+async def search_symbols(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['symbol_query'] = update.message.text.strip()[:20]
+    text, reply_markup = symbol_picker_page(context)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+    return SYMBOL
+
+async def change_symbol_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    text, reply_markup = symbol_picker_page(context, int(query.data.split('_')[1]))
+    await query.edit_message_text(text, reply_markup=reply_markup)
+    return SYMBOL
+
+async def toggle_favorite_symbol(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        favorites = context.user_data.get('favorite_symbols', [])
+        await update.message.reply_text(
+            f"Favorites: {', '.join(favorites)}" if favorites else "No favorites yet. Use /fav SYMBOL to add one."
+        )
+        return
+    
+    symbol = context.args[0].upper()
+    if len(symbol_search) and symbol not in symbol_search:
+        await update.message.reply_text(f"Unknown symbol {symbol}.")
+        return
+    
+    if toggle_favorite(context.user_data, symbol):
+        await update.message.reply_text(f"⭐ {symbol} added to favorites")
+    else:
+        await update.message.reply_text(f"{symbol} removed from favorites")
+
+@requires_account
+async def start_place_order(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    return await show_symbol_picker(update, context, 'symbol_', "Select trading pair:")
+
 async def select_order_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -266,8 +450,9 @@ async def select_order_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.data == 'back_to_menu':
         return await back_to_main_menu(update, context)
     
-    symbol = query.data.split('_')[1]
+    symbol = query.data.split('_', 1)[1]
     context.user_data['symbol'] = symbol
+    remember_symbol(context.user_data, symbol)
     
     keyboard = [
         [
@@ -322,43 +507,63 @@ async def enter_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(
-        f"Enter quantity (in {context.user_data['symbol'][:3]}):",
-        reply_markup=reply_markup
-    )
+    instrument = instruments.get(context.user_data['symbol'])
+    if instrument:
+        prompt = (
+            f"Enter quantity (in {instrument.base_coin}, "
+            f"min {instrument.min_qty}, step {instrument.qty_step}):"
+        )
+    else:
+        prompt = f"Enter quantity (in {context.user_data['symbol'][:3]}):"
+    
+    await query.edit_message_text(prompt, reply_markup=reply_markup)
     return QUANTITY
 
 async def handle_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        quantity = float(update.message.text)
-        context.user_data['quantity'] = quantity
+        quantity = parse_decimal(update.message.text)
+        instrument = instruments.get(context.user_data['symbol'])
+        if instrument:
+            quantity = instrument.check_qty(quantity, context.user_data['order_type'])
+        elif quantity <= 0:
+            raise OrderValidationError("Quantity must be positive.")
+        context.user_data['quantity'] = str(quantity)
         
         if context.user_data['order_type'] == 'limit':
-            await update.message.reply_text(
-                f"Enter limit price (in USDT):"
-            )
+            if instrument:
+                prompt = f"Enter limit price (in {instrument.quote_coin}, tick {instrument.tick_size}):"
+            else:
+                prompt = "Enter limit price (in USDT):"
+            await update.message.reply_text(prompt)
             return PRICE
         else:
             return await place_order(update, context)
             
-    except ValueError:
+    except OrderValidationError as e:
         await update.message.reply_text(
-            "Invalid quantity. Please enter a valid number."
+            f"Invalid quantity. {str(e)}"
         )
         return QUANTITY
 
 async def handle_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        price = float(update.message.text)
-        context.user_data['price'] = price
+        price = parse_decimal(update.message.text)
+        instrument = instruments.get(context.user_data['symbol'])
+        if instrument:
+            price = instrument.check_price(price)
+            instrument.check_qty(Decimal(context.user_data['quantity']), 'limit', price)
+        elif price <= 0:
+            raise OrderValidationError("Price must be positive.")
+        context.user_data['price'] = str(price)
         return await place_order(update, context)
-    except ValueError:
+    except OrderValidationError as e:
         await update.message.reply_text(
-            "Invalid price. Please enter a valid number."
+            f"Invalid price. {str(e)}"
         )
         return PRICE
 
-async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@requires_account
+async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
     try:
         order_data = {
             "category": "linear",
@@ -371,24 +576,21 @@ async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if context.user_data['order_type'] == 'limit':
             order_data["price"] = context.user_data['price']
         
-        result = client.place_order(**order_data)
+        result = await exchange.place_order(**order_data)
         
         if result.get('retCode') == 0:
-            order_text = "✅ Order placed successfully!\n\n"
-            order_text += f"Symbol: {context.user_data['symbol']}\n"
-            order_text += f"Type: {context.user_data['order_type'].upper()}\n"
-            order_text += f"Side: {context.user_data['side'].upper()}\n"
-            order_text += f"Quantity: {context.user_data['quantity']}\n"
-            if context.user_data['order_type'] == 'limit':
-                order_text += f"Price: {context.user_data['price']}\n"
+            chunks = render_order_placed(
+                context.user_data['symbol'],
+                context.user_data['order_type'],
+                context.user_data['side'],
+                context.user_data['quantity'],
+                order_data.get('price')
+            )
             
             keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            if hasattr(update, 'message'):
-                await update.message.reply_text(order_text, reply_markup=reply_markup)
-            else:
-                await update.callback_query.edit_message_text(order_text, reply_markup=reply_markup)
+            await show_view(update, chunks, reply_markup, parse_mode=None)
         else:
             error_msg = f"❌ Order failed: {result.get('retMsg')}"
             if hasattr(update, 'message'):
@@ -404,73 +606,237 @@ async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return ConversationHandler.END
 
-async def cancel_all_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@requires_account
+async def choose_orders_to_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    query = update.callback_query
+    await query.answer()
+    
+    # The newest page of each category is enough to offer choices; counts
+    # of categories listing more than that get a "+"
+    orders, more, failed = await sample_orders(exchange)
+    more_categories = {category for category, _ in more}
+    keyboard = []
+    if orders or failed:
+        keyboard.append([InlineKeyboardButton(
+            f"❌ Cancel all ({len(orders)}{'+' if more else ''})", callback_data='cancel_all'
+        )])
+    
+    categories = {}
+    symbols = {}
+    for order in orders:
+        categories[order['category']] = categories.get(order['category'], 0) + 1
+        key = (order['category'], order['symbol'])
+        symbols[key] = symbols.get(key, 0) + 1
+    if len(categories) > 1:
+        keyboard.append([
+            InlineKeyboardButton(
+                f"{CATEGORY_LABELS[category]} ({count}{'+' if category in more_categories else ''})",
+                callback_data=f'cancel_cat_{category}'
+            )
+            for category, count in categories.items()
+        ])
+    busiest = sorted(symbols.items(), key=lambda item: -item[1])[:CANCEL_SYMBOLS_SHOWN]
+    buttons = [
+        InlineKeyboardButton(f"{symbol} ({count})", callback_data=f'cancel_sym_{category}_{symbol}')
+        for (category, symbol), count in busiest
+    ]
+    keyboard += [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data='start')])
+    
+    message = "❌ Cancel open orders\n\nChoose what to cancel:" if orders else "No open orders to cancel."
+    if failed:
+        message += f"\n\n⚠️ Not loaded: {', '.join(scope_labels(failed))}"
+    await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+@requires_account
+async def cancel_all_orders(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    query = update.callback_query
+    await query.answer()
+    
+    # cancel_all, cancel_cat_<category> or cancel_sym_<category>_<symbol>
+    parts = query.data.split('_', 3)
+    category = parts[2] if len(parts) > 2 else None
+    symbol = parts[3] if len(parts) > 3 else None
+    if symbol:
+        target = f"{symbol} orders"
+    elif category:
+        target = f"{CATEGORY_LABELS.get(category, category)} orders"
+    else:
+        target = "orders"
+    
     try:
-        result = client.cancel_all_orders(
-            category="linear",
-            settleCoin="USDT"
-        )
+        cancelled, failed = await cancel_orders(exchange, category, symbol)
         
-        if result.get('retCode') == 0:
-            message = "✅ All orders cancelled successfully!"
+        if failed:
+            message = (
+                f"⚠️ Cancelled {cancelled} {target}, but cancelling failed for "
+                f"{', '.join(scope_labels(failed))}. Please try again."
+            )
         else:
-            message = f"❌ Failed to cancel orders: {result.get('retMsg')}"
+            message = f"✅ Cancelled {cancelled} {target}"
         
         keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.callback_query.edit_message_text(
+        await query.edit_message_text(
             text=message,
             reply_markup=reply_markup
         )
     except Exception as e:
-        await update.callback_query.edit_message_text(f"Error cancelling orders: {str(e)}")
+        await query.edit_message_text(f"Error cancelling orders: {str(e)}")
+
+@requires_account
+async def start_ladder_order(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    return await show_symbol_picker(update, context, 'laddersym_', "Select trading pair for the ladder:")
 
-async def start_set_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def select_ladder_side(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    symbol = query.data.split('_', 1)[1]
+    context.user_data['symbol'] = symbol
+    remember_symbol(context.user_data, symbol)
+    
     keyboard = [
         [
-            InlineKeyboardButton("BTC/USDT", callback_data='leverage_BTCUSDT'),
-            InlineKeyboardButton("ETH/USDT", callback_data='leverage_ETHUSDT')
+            InlineKeyboardButton("Long", callback_data='side_buy'),
+            InlineKeyboardButton("Short", callback_data='side_sell')
         ],
         [InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text(
-        "Select symbol to set leverage:",
+    
+    await query.edit_message_text(
+        f"Ladder on {symbol}\nChoose side:",
         reply_markup=reply_markup
     )
-    return SYMBOL
+    return SIDE
+
+async def enter_ladder(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    context.user_data['side'] = query.data.split('_')[1]
+    
+    keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await query.edit_message_text(
+        "Enter the ladder as: low price, high price, number of levels, total quantity\n"
+        "Example: 60000 62000 10 0.5",
+        reply_markup=reply_markup
+    )
+    return LADDER
+
+async def handle_ladder(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    symbol = context.user_data['symbol']
+    instrument = instruments.get(symbol)
+    if instrument is None:
+        await update.message.reply_text(f"Trading rules for {symbol} are not loaded yet. Please try again later.")
+        return ConversationHandler.END
+    
+    try:
+        legs = build_ladder(instrument, *parse_ladder(update.message.text))
+    except OrderValidationError as e:
+        await update.message.reply_text(f"Invalid ladder. {str(e)}")
+        return LADDER
+    
+    side = 'Buy' if context.user_data['side'] == 'buy' else 'Sell'
+    context.user_data['ladder'] = batch_requests(symbol, side, legs)
+    
+    preview_text = f"🪜 {side} ladder on {symbol}: {len(legs)} limit orders\n\n"
+    for price, qty in legs:
+        preview_text += f"{price} × {qty}\n"
+    preview_text += f"\nTotal quantity: {sum(qty for _, qty in legs)}"
+    
+    keyboard = [
+        [InlineKeyboardButton("✅ Place orders", callback_data='ladder_confirm')],
+        [InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await update.message.reply_text(preview_text, reply_markup=reply_markup)
+    return LADDER_CONFIRM
+
+@requires_account
+async def submit_ladder(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    query = update.callback_query
+    await query.answer()
+    
+    ladder_orders = context.user_data.pop('ladder', [])
+    batches = chunked(ladder_orders)
+    # All batches go out at once; each one is a single round trip for up to ten orders
+    responses = await asyncio.gather(
+        *(exchange.place_batch_order(category="linear", request=batch) for batch in batches),
+        return_exceptions=True
+    )
+    
+    placed = 0
+    result_text = ""
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            logging.error(f"Error placing ladder batch: {str(response)}")
+            results = [(request, False, str(response)) for request in batch]
+        else:
+            results = batch_results(batch, response)
+        for request, ok, detail in results:
+            if ok:
+                placed += 1
+                result_text += f"✅ {request['price']} × {request['qty']}\n"
+            else:
+                result_text += f"❌ {request['price']} × {request['qty']}: {detail}\n"
+    
+    keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await query.edit_message_text(
+        f"🪜 Ladder placed: {placed}/{len(ladder_orders)} orders\n\n{result_text}",
+        reply_markup=reply_markup
+    )
+    return ConversationHandler.END
+
+@requires_account
+async def start_set_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    return await show_symbol_picker(update, context, 'leverage_', "Select symbol to set leverage:")
 
 async def enter_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    symbol = query.data.split('_')[1]
+    symbol = query.data.split('_', 1)[1]
     context.user_data['symbol'] = symbol
+    remember_symbol(context.user_data, symbol)
     
+    instrument = instruments.get(symbol)
+    if instrument:
+        bounds = f"{instrument.min_leverage.normalize():f}-{instrument.max_leverage.normalize():f}"
+    else:
+        bounds = "1-100"
     await query.edit_message_text(
-        f"Enter leverage (1-100) for {symbol}:"
+        f"Enter leverage ({bounds}) for {symbol}:"
     )
     return LEVERAGE
 
-async def handle_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@requires_account
+async def handle_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
     try:
-        leverage = int(update.message.text)
-        if leverage < 1 or leverage > 100:
-            await update.message.reply_text(
-                "Leverage must be between 1 and 100. Please try again:"
-            )
-            return LEVERAGE
+        leverage = parse_decimal(update.message.text)
+        instrument = instruments.get(context.user_data['symbol'])
+        if instrument:
+            leverage = instrument.check_leverage(leverage)
+        elif leverage < 1 or leverage > 100:
+            raise OrderValidationError("Leverage must be between 1 and 100.")
+        leverage = leverage.normalize()
         
-        result = client.set_leverage(
+        result = await exchange.set_leverage(
             category="linear",
             symbol=context.user_data['symbol'],
-            buyLeverage=str(leverage),
-            sellLeverage=str(leverage)
+            buyLeverage=f"{leverage:f}",
+            sellLeverage=f"{leverage:f}"
         )
         
         if result.get('retCode') == 0:
-            message = f"✅ Leverage set to {leverage}x for {context.user_data['symbol']}"
+            message = f"✅ Leverage set to {leverage:f}x for {context.user_data['symbol']}"
         else:
             message = f"❌ Failed to set leverage: {result.get('retMsg')}"
         
@@ -482,11 +848,460 @@ async def handle_leverage(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=reply_markup
         )
         return ConversationHandler.END
-    except ValueError:
+    except OrderValidationError as e:
         await update.message.reply_text(
-            "Invalid leverage. Please enter a number between 1 and 100:"
+            f"Invalid leverage. {str(e)} Please try again:"
         )
         return LEVERAGE
+    except Exception as e:
+        logging.error(f"Error in handle_leverage: {str(e)}")
+        await update.message.reply_text(f"Error setting leverage: {str(e)}")
+        return ConversationHandler.END
+
+async def stored_user_data(application: Application, user_id):
+    """A user's data for a job; when sharded, another worker may have changed it since."""
+    if SHARD_INDEX is None:
+        return application.user_data.get(user_id)
+    user_data = application.user_data[user_id]
+    await application.persistence.refresh_user_data(user_id, user_data)
+    return user_data
+
+async def execute_trigger(application: Application, rule, price):
+    label = TRIGGER_LABELS[rule.kind]
+    if rule.kind == ALERT:
+        text = f"{label}: {rule.symbol} is {rule.direction} {rule.price:g} (last {price:g})"
+    else:
+        owner = rule.user_id or rule.chat_id
+        account = accounts.get(owner, await stored_user_data(application, owner))
+        close_side = 'Sell' if rule.side == 'Buy' else 'Buy'
+        try:
+            if account is None:
+                raise RuntimeError("no Bybit account is linked")
+            result = await account.place_order(
+                category="linear",
+                symbol=rule.symbol,
+                side=close_side,
+                orderType="Market",
+                qty=rule.qty,
+                reduceOnly=True
+            )
+            if result.get('retCode') == 0:
+                text = f"{label} triggered at {price:g}: closed {rule.qty} {rule.symbol}"
+            else:
+                text = f"{label} triggered at {price:g} but closing failed: {result.get('retMsg')}"
+        except Exception as e:
+            logging.error(f"Error executing trigger #{rule.id}: {str(e)}")
+            text = f"{label} triggered at {price:g} but closing failed: {str(e)}"
+    
+    try:
+        await application.bot.send_message(chat_id=rule.chat_id, text=text)
+    except Exception as e:
+        logging.error(f"Error notifying trigger #{rule.id}: {str(e)}")
+
+def evaluate_triggers(application: Application, symbol, price):
+    for rule in trigger_engine.on_price(symbol, price):
+        application.create_task(execute_trigger(application, rule, price))
+
+async def poll_trigger_prices(context: ContextTypes.DEFAULT_TYPE):
+    symbols = trigger_engine.symbols()
+    if not symbols or live_stream.state.connected:
+        return
+    try:
+        tickers = await exchange.get_tickers(category="linear")
+    except Exception as e:
+        logging.error(f"Error polling trigger prices: {str(e)}")
+        return
+    for ticker in tickers.get('result', {}).get('list', []):
+        if ticker['symbol'] in symbols and ticker.get('lastPrice'):
+            evaluate_triggers(context.application, ticker['symbol'], float(ticker['lastPrice']))
+
+async def save_trigger_rules(context: ContextTypes.DEFAULT_TYPE):
+    context.bot_data['trigger_rules'] = trigger_engine.export()
+
+async def current_price(symbol):
+    book = trigger_engine.books.get(symbol)
+    if book and book.last_price:
+        return book.last_price
+    tickers = await exchange.get_tickers(category="linear", symbol=symbol)
+    return float(tickers['result']['list'][0]['lastPrice'])
+
+async def open_position(exchange, symbol):
+    positions = await exchange.get_positions(category="linear", symbol=symbol)
+    for position in positions.get('result', {}).get('list', []):
+        if position['symbol'] == symbol and float(position.get('size') or 0) > 0:
+            return position
+    return None
+
+async def rules_changed(context: ContextTypes.DEFAULT_TYPE, symbol):
+    await save_trigger_rules(context)
+    try:
+        await live_stream.watch({symbol})
+    except Exception as e:
+        logging.error(f"Error subscribing to {symbol} ticker: {str(e)}")
+
+async def add_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        symbol, direction, price = context.args
+        symbol, direction, price = symbol.upper(), direction.lower(), float(price)
+        if direction not in ('above', 'below') or price <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Usage: /alert SYMBOL above|below PRICE")
+        return
+    # Prices come from linear tickers only; anything else could never fire
+    if len(instruments) and symbol not in instruments:
+        await update.message.reply_text(f"Unknown symbol {symbol}. Alerts work on linear contracts such as BTCUSDT.")
+        return
+    
+    rule = trigger_engine.add_alert(update.effective_chat.id, symbol, direction, price)
+    await rules_changed(context, symbol)
+    await update.message.reply_text(f"✅ Added {rule.describe()}")
+
+@requires_account
+async def add_bracket(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    try:
+        symbol, take_profit, stop_loss = context.args
+        symbol = symbol.upper()
+        take_profit = float(take_profit) if take_profit != '-' else None
+        stop_loss = float(stop_loss) if stop_loss != '-' else None
+        if take_profit is None and stop_loss is None:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Usage: /bracket SYMBOL TAKE_PROFIT STOP_LOSS (use - to skip one)")
+        return
+    
+    try:
+        position = await open_position(exchange, symbol)
+    except Exception as e:
+        await update.message.reply_text(f"Error fetching position: {str(e)}")
+        return
+    if position is None:
+        await update.message.reply_text(f"No open position on {symbol}.")
+        return
+    
+    long = position['side'] == 'Buy'
+    if (take_profit is not None and stop_loss is not None
+            and (take_profit <= stop_loss if long else take_profit >= stop_loss)):
+        await update.message.reply_text("Take profit must be on the profitable side of the stop loss.")
+        return
+    
+    legs = trigger_engine.add_bracket(
+        update.effective_chat.id, symbol, position['side'], position['size'], take_profit, stop_loss,
+        user_id=update.effective_user.id
+    )
+    await rules_changed(context, symbol)
+    await update.message.reply_text("✅ Added\n" + "\n".join(leg.describe() for leg in legs))
+
+@requires_account
+async def add_trailing_stop(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    try:
+        symbol, pct = context.args
+        symbol, pct = symbol.upper(), float(pct.rstrip('%')) / 100
+        if not 0 < pct < 1:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("Usage: /trail SYMBOL PERCENT")
+        return
+    
+    try:
+        position = await open_position(exchange, symbol)
+        price = await current_price(symbol) if position else None
+    except Exception as e:
+        await update.message.reply_text(f"Error fetching position: {str(e)}")
+        return
+    if position is None:
+        await update.message.reply_text(f"No open position on {symbol}.")
+        return
+    
+    rule = trigger_engine.add_trailing_stop(
+        update.effective_chat.id, symbol, position['side'], position['size'], pct, price,
+        user_id=update.effective_user.id
+    )
+    await rules_changed(context, symbol)
+    await update.message.reply_text(f"✅ Added {rule.describe()} from {price:g}")
+
+async def list_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    rules = trigger_engine.rules_for(update.effective_chat.id)
+    if not rules:
+        await update.message.reply_text(
+            "No active rules.\n\n"
+            "/alert SYMBOL above|below PRICE\n"
+            "/bracket SYMBOL TAKE_PROFIT STOP_LOSS\n"
+            "/trail SYMBOL PERCENT"
+        )
+        return
+    rules_text = "⚡ Active rules:\n\n" + "\n".join(rule.describe() for rule in rules)
+    await update.message.reply_text(rules_text + "\n\nRemove one with /unrule ID")
+
+async def remove_rule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        rule_id = int(context.args[0].lstrip('#'))
+    except (IndexError, ValueError):
+        await update.message.reply_text("Usage: /unrule ID")
+        return
+    
+    rule = trigger_engine.rules.get(rule_id)
+    if rule is None or rule.chat_id != update.effective_chat.id:
+        await update.message.reply_text(f"No rule #{rule_id}.")
+        return
+    trigger_engine.cancel(rule_id)
+    await save_trigger_rules(context)
+    await update.message.reply_text(f"Removed {rule.describe()}")
+
+async def save_monitor_subscriptions(context: ContextTypes.DEFAULT_TYPE):
+    context.bot_data['monitor_subscriptions'] = portfolio_monitor.export()
+
+def parse_percent(text):
+    value = float(text.rstrip('%')) / 100
+    if value <= 0:
+        raise ValueError
+    return value
+
+@requires_account
+async def set_digest(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    user_id = update.effective_user.id
+    subscription = portfolio_monitor.subscriptions.get(user_id)
+    if not context.args:
+        if subscription is not None and subscription.digest_hours is not None:
+            await update.message.reply_text(
+                f"🗞 Portfolio digest every {subscription.digest_hours:g} hours, sent only when something changed.\n\n"
+                "/digest off stops it."
+            )
+        else:
+            await update.message.reply_text(
+                "No digest scheduled.\n\n/digest HOURS sends equity, margin and position changes every HOURS hours."
+            )
+        return
+    
+    if context.args[0].lower() == 'off':
+        hours = None
+    else:
+        try:
+            hours = float(context.args[0])
+            if not DIGEST_HOURS[0] <= hours <= DIGEST_HOURS[1]:
+                raise ValueError
+        except ValueError:
+            await update.message.reply_text(
+                f"Usage: /digest HOURS ({DIGEST_HOURS[0]:g}-{DIGEST_HOURS[1]:g}) or /digest off"
+            )
+            return
+    
+    portfolio_monitor.set_digest(user_id, update.effective_chat.id, hours)
+    await save_monitor_subscriptions(context)
+    if hours is None:
+        await update.message.reply_text("🗞 Portfolio digest stopped.")
+    else:
+        await update.message.reply_text(f"🗞 Portfolio digest every {hours:g} hours, the first one shortly.")
+
+def describe_thresholds(thresholds):
+    return "\n".join(
+        f"{MONITOR_LABELS[kind]}: {thresholds[kind] * 100:g}%" for kind in MONITOR_LABELS if kind in thresholds
+    )
+
+@requires_account
+async def set_monitor(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    user_id = update.effective_user.id
+    subscription = portfolio_monitor.subscriptions.get(user_id)
+    thresholds = dict(subscription.thresholds) if subscription is not None else {}
+    usage = (
+        "Usage: /monitor on | off | [margin PCT] [drawdown PCT] [funding PCT]\n\n"
+        "margin: maintenance margin as a share of equity\n"
+        "drawdown: equity below its peak since monitoring started\n"
+        "funding: funding rate an open position pays per interval\n"
+        "Use off instead of PCT to stop one alert."
+    )
+    if not context.args:
+        if thresholds:
+            await update.message.reply_text(f"👀 Alerting on\n{describe_thresholds(thresholds)}\n\n/monitor off stops it.")
+        else:
+            await update.message.reply_text(usage)
+        return
+    
+    args = [arg.lower() for arg in context.args]
+    if args == ['on']:
+        thresholds = dict(DEFAULT_THRESHOLDS)
+    elif args == ['off']:
+        thresholds = {}
+    else:
+        try:
+            if len(args) % 2:
+                raise ValueError
+            for kind, value in zip(args[::2], args[1::2]):
+                if kind not in MONITOR_LABELS:
+                    raise ValueError
+                thresholds[kind] = None if value == 'off' else parse_percent(value)
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+    
+    subscription = portfolio_monitor.set_thresholds(user_id, update.effective_chat.id, thresholds)
+    await save_monitor_subscriptions(context)
+    if subscription.thresholds:
+        await update.message.reply_text(
+            f"👀 Alerting on\n{describe_thresholds(subscription.thresholds)}\n\n"
+            f"Checked every {MONITOR_INTERVAL:g}s; you hear when a level is crossed and when it clears."
+        )
+    else:
+        await update.message.reply_text("👀 Alerts stopped.")
+
+async def send_monitor_messages(application: Application, subscription, notices, digest):
+    try:
+        if notices:
+            await application.bot.send_message(subscription.chat_id, "\n\n".join(notice.text for notice in notices))
+            for notice in notices:
+                MONITOR_MESSAGES.inc('cleared' if notice.cleared else notice.kind)
+        if digest is not None:
+            for chunk in render_digest(digest):
+                await application.bot.send_message(subscription.chat_id, chunk, parse_mode=ParseMode.MARKDOWN_V2)
+            MONITOR_MESSAGES.inc('digest')
+    except Exception as e:
+        logging.error(f"Error sending monitor messages to {subscription.chat_id}: {str(e)}")
+
+async def run_portfolio_monitor(context: ContextTypes.DEFAULT_TYPE):
+    if not portfolio_monitor.subscriptions:
+        return
+    start = time.perf_counter()
+    application = context.application
+    # Subscribers sharing an account share one snapshot of it
+    subscribers = {}
+    for subscription in list(portfolio_monitor.subscriptions.values()):
+        account = accounts.get(subscription.user_id, await stored_user_data(application, subscription.user_id))
+        if account is not None:
+            subscribers.setdefault(account, []).append(subscription)
+    
+    # Funding rates are market data: one ticker request serves every account
+    jobs = [snapshot_accounts(list(subscribers))]
+    if portfolio_monitor.needs_funding():
+        jobs.append(funding_rates(exchange))
+    snapshots, *rates = await asyncio.gather(*jobs)
+    rates = rates[0] if rates else {}
+    
+    sends = []
+    for account, snapshot in snapshots.items():
+        for subscription in subscribers[account]:
+            notices, digest = portfolio_monitor.evaluate(subscription, snapshot, rates)
+            if notices or digest is not None:
+                sends.append(send_monitor_messages(application, subscription, notices, digest))
+    await asyncio.gather(*sends)
+    await save_monitor_subscriptions(context)
+    MONITOR_SECONDS.observe(time.perf_counter() - start)
+
+@requires_account
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    stats_text = "📈 Cache statistics:\n\n"
+    for kind, counts in exchange.cache.stats().items():
+        total = counts['hits'] + counts['misses']
+        ratio = counts['hits'] / total * 100 if total else 0
+        stats_text += f"{kind}: {counts['hits']} hits / {counts['misses']} misses ({ratio:.1f}%)\n"
+    if exchange.scheduler.rate_limited:
+        stats_text += f"\nRate limited requests retried: {exchange.scheduler.rate_limited}\n"
+    if exchange.breaker.trips:
+        stats_text += f"\nBybit circuit breaker opened {exchange.breaker.trips} times"
+        stats_text += " (open now)\n" if exchange.breaker.is_open else "\n"
+    throttler = context.bot.rate_limiter
+    if throttler.coalesced or throttler.skipped or throttler.retried:
+        stats_text += (
+            f"\nTelegram: {throttler.coalesced} edits merged, {throttler.skipped} unchanged edits skipped, "
+            f"{throttler.retried} flood waits\n"
+        )
+    
+    await update.message.reply_text(
+        stats_text if stats_text != "📈 Cache statistics:\n\n" else "No cache activity yet"
+    )
+
+async def sync_history(context: ContextTypes.DEFAULT_TYPE):
+    for account in accounts.active():
+        try:
+            await trade_history.sync(account)
+        except Exception as e:
+            logging.error(f"Error syncing trade history: {str(e)}")
+
+async def show_pnl(update: Update, exchange: Exchange, period, count):
+    try:
+        await trade_history.ensure_fresh(exchange)
+    except Exception as e:
+        # Still answer from what is stored
+        logging.error(f"Error syncing trade history: {str(e)}")
+    periods = await trade_history.summary(exchange, period, count)
+    
+    unit = "days" if period == 'day' else "weeks"
+    if not periods:
+        await update.message.reply_text(f"No trades in the last {count} {unit}.")
+        return
+    
+    title = "📅 Daily PnL" if period == 'day' else "📅 Weekly PnL"
+    pnl_text = f"{title} (last {count} {unit}, UTC)\n\n"
+    total = 0.0
+    for label, totals in periods:
+        color = "🟢" if totals['pnl'] >= 0 else "🔴"
+        pnl_text += f"{'Week of ' if period == 'week' else ''}{label}: {color} {totals['pnl']:+.2f} USDT\n"
+        pnl_text += f"   {totals['closed']} closed, {totals['won']} won"
+        pnl_text += f" | fees {totals['fees']:.2f} | funding {totals['funding']:.2f}\n"
+        total += totals['pnl']
+    pnl_text += f"\nTotal closed PnL: {total:+.2f} USDT"
+    await update.message.reply_text(pnl_text)
+
+def period_count(context: ContextTypes.DEFAULT_TYPE, default, maximum):
+    try:
+        return min(max(int(context.args[0]), 1), maximum) if context.args else default
+    except ValueError:
+        return default
+
+@requires_account
+async def daily_pnl(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    await show_pnl(update, exchange, 'day', period_count(context, 7, 90))
+
+@requires_account
+async def weekly_pnl(update: Update, context: ContextTypes.DEFAULT_TYPE, exchange: Exchange):
+    await show_pnl(update, exchange, 'week', period_count(context, 4, 52))
+
+async def set_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    # The keys should not linger in the chat history
+    try:
+        await update.message.delete()
+    except Exception as e:
+        logging.warning(f"Could not delete a /setkeys message: {str(e)}")
+    
+    if update.effective_chat.type != 'private':
+        await context.bot.send_message(
+            chat_id,
+            "Send /setkeys only in a private chat with me. If those keys were real, replace them on Bybit."
+        )
+        return
+    if accounts.cipher is None:
+        await context.bot.send_message(chat_id, "Linking personal API keys is not enabled on this bot.")
+        return
+    if len(context.args) != 2:
+        await context.bot.send_message(chat_id, "Usage: /setkeys API_KEY API_SECRET")
+        return
+    
+    api_key, api_secret = context.args
+    account = accounts.client(api_key, api_secret)
+    try:
+        await account.get_wallet_balance(accountType="UNIFIED")
+    except Exception as e:
+        accounts.discard(api_key)
+        await context.bot.send_message(chat_id, f"❌ Bybit rejected these keys: {str(e)}")
+        return
+    
+    previous = accounts.credentials(context.user_data)
+    if previous is not None and previous[0] != api_key:
+        accounts.discard(previous[0])
+    accounts.store(context.user_data, api_key, api_secret)
+    await context.bot.send_message(
+        chat_id,
+        f"✅ Bybit account linked (key ending {api_key[-4:]}). Your message with the keys was deleted."
+    )
+
+async def delete_keys(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if accounts.forget(context.user_data):
+        await update.message.reply_text("🔑 Your Bybit keys were removed.")
+    else:
+        await update.message.reply_text("You have no Bybit keys linked.")
+
+async def evict_idle_accounts(context: ContextTypes.DEFAULT_TYPE):
+    accounts.evict_idle()
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data='start')]]
@@ -513,6 +1328,10 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [
             InlineKeyboardButton("❌ Cancel Orders", callback_data='cancel_orders'),
             InlineKeyboardButton("⚙️ Set Leverage", callback_data='set_leverage')
+        ],
+        [
+            InlineKeyboardButton("🪜 Ladder Order", callback_data='ladder_order'),
+            InlineKeyboardButton("⚠️ Risk", callback_data='risk')
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -520,26 +1339,146 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Welcome to Bybit Trading Bot! 🤖\n\n"
         "Commands:\n"
         "/start - Show main menu\n"
-        "/cancel - Cancel current operation\n\n"
+        "/cancel - Cancel current operation\n"
+        "/setkeys - Link your Bybit API keys\n\n"
         "Select an option:"
     )
     
     await query.edit_message_text(message_text, reply_markup=reply_markup)
     return ConversationHandler.END
 
-def main():
-    application = Application.builder().token(os.getenv('TELEGRAM_BOT_TOKEN')).build()
+async def refresh_instruments(context: ContextTypes.DEFAULT_TYPE):
+    global symbol_search
+    try:
+        await instruments.load(exchange)
+        symbol_search = SymbolSearch(instruments.instruments.values())
+    except Exception as e:
+        logging.error(f"Error loading instruments: {str(e)}")
+
+def cache_hit_ratios():
+    totals = {}
+    for account in accounts.active():
+        for kind, counts in account.cache.stats().items():
+            hits, misses = totals.get(kind, (0, 0))
+            totals[kind] = (hits + counts['hits'], misses + counts['misses'])
+    return {(kind,): hits / (hits + misses) for kind, (hits, misses) in totals.items() if hits + misses}
+
+Gauge('bybit_cache_hit_ratio', 'Share of cached Bybit reads served from cache, by kind', cache_hit_ratios, ('kind',))
+Gauge('bybit_accounts_open', 'Bybit accounts with an open client', lambda: {(): len(accounts.active())})
+Gauge(
+    'bybit_circuit_open', 'Bybit accounts whose circuit breaker is open',
+    lambda: {(): sum(account.breaker.is_open for account in accounts.active())}
+)
+# The persistence of the application last built, which tracks conversation states
+served_persistence = None
+Gauge(
+    'bot_conversations_in_flight', 'Chats part way through a conversation, as of the last persistence round',
+    lambda: {
+        (name,): count for name, count in served_persistence.conversations_in_flight().items()
+    } if served_persistence is not None else {},
+    ('conversation',)
+)
+
+async def post_init(application: Application):
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logging.error(f"Error starting metrics endpoint on port {METRICS_PORT}: {str(e)}")
+    
+    await refresh_instruments(application)
+    application.job_queue.run_repeating(
+        refresh_instruments,
+        interval=INSTRUMENTS_REFRESH_INTERVAL,
+        first=INSTRUMENTS_REFRESH_INTERVAL
+    )
+    
+    application.job_queue.run_repeating(evict_idle_accounts, interval=ACCOUNT_EVICTION_INTERVAL)
+    # Everything below is bot-wide and runs in one worker only
+    if not PRIMARY:
+        return
+    
+    trigger_engine.load(application.bot_data.get('trigger_rules', []))
+    loop = asyncio.get_running_loop()
+    
+    def on_ticker(symbol, ticker):
+        # Runs on the socket thread; the engine itself lives on the event loop
+        if ticker.get('lastPrice'):
+            loop.call_soon_threadsafe(evaluate_triggers, application, symbol, float(ticker['lastPrice']))
+    
+    live_stream.price_listeners.append(on_ticker)
+    application.job_queue.run_repeating(poll_trigger_prices, interval=TRIGGER_POLL_INTERVAL)
+    application.job_queue.run_repeating(save_trigger_rules, interval=PERSISTENCE_INTERVAL)
+    application.job_queue.run_repeating(sync_history, interval=HISTORY_SYNC_INTERVAL, first=10)
+    
+    portfolio_monitor.load(application.bot_data.get('monitor_subscriptions', []))
+    application.job_queue.run_repeating(run_portfolio_monitor, interval=MONITOR_INTERVAL, first=MONITOR_INTERVAL)
+    
+    if LIVE_STATE and os.getenv('BYBIT_API_KEY') and os.getenv('BYBIT_SECRET_KEY'):
+        exchange.state = live_stream.state
+        try:
+            await live_stream.start(os.getenv('BYBIT_API_KEY'), os.getenv('BYBIT_SECRET_KEY'))
+            await live_stream.watch(trigger_engine.symbols())
+        except Exception as e:
+            logging.error(f"Error starting live state stream, falling back to REST: {str(e)}")
+
+async def post_shutdown(application: Application):
+    live_stream.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await trade_history.store.close()
+    accounts.close()
+    exchange.shutdown()
+    if cache_store is not None:
+        cache_store.close()
+
+def build_application(token=None, request=None, rate_limiter=None):
+    """The Application with every handler registered; ``request`` replaces the
+    HTTP layer to the Bot API, e.g. with simulator.SimulatedTelegram."""
+    builder = (
+        Application.builder()
+        .token(token or os.getenv('TELEGRAM_BOT_TOKEN'))
+        .persistence(
+            SharedPersistence(PERSISTENCE_FILE, update_interval=PERSISTENCE_INTERVAL, store_bot_data=PRIMARY)
+            if SHARD_INDEX is not None
+            else SQLitePersistence(PERSISTENCE_FILE, update_interval=PERSISTENCE_INTERVAL)
+        )
+        .concurrent_updates(ChatUpdateProcessor(int(os.getenv('MAX_CONCURRENT_UPDATES', '256'))))
+        .rate_limiter(rate_limiter or OutboundThrottler(overall_rate=TELEGRAM_RATE_LIMIT))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
 
     # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CommandHandler("fav", toggle_favorite_symbol))
+    application.add_handler(CommandHandler("alert", add_alert))
+    application.add_handler(CommandHandler("bracket", add_bracket))
+    application.add_handler(CommandHandler("trail", add_trailing_stop))
+    application.add_handler(CommandHandler("rules", list_rules))
+    application.add_handler(CommandHandler("unrule", remove_rule))
+    application.add_handler(CommandHandler("setkeys", set_keys))
+    application.add_handler(CommandHandler("delkeys", delete_keys))
+    application.add_handler(CommandHandler("daily", daily_pnl))
+    application.add_handler(CommandHandler("weekly", weekly_pnl))
+    application.add_handler(CommandHandler("digest", set_digest))
+    application.add_handler(CommandHandler("monitor", set_monitor))
     
     # Conversation handler for placing orders
     order_conv_handler = ConversationHandler(
+        name='order_conversation',
+        persistent=True,
         entry_points=[CallbackQueryHandler(start_place_order, pattern='^place_order$')],
         states={
             SYMBOL: [
                 CallbackQueryHandler(select_order_type, pattern='^symbol_'),
+                CallbackQueryHandler(change_symbol_page, pattern='^sympage_'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_symbols),
                 CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
             ],
             ORDER_TYPE: [
@@ -568,10 +1507,14 @@ def main():
     
     # Conversation handler for setting leverage
     leverage_conv_handler = ConversationHandler(
+        name='leverage_conversation',
+        persistent=True,
         entry_points=[CallbackQueryHandler(start_set_leverage, pattern='^set_leverage$')],
         states={
             SYMBOL: [
                 CallbackQueryHandler(enter_leverage, pattern='^leverage_'),
+                CallbackQueryHandler(change_symbol_page, pattern='^sympage_'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_symbols),
                 CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
             ],
             LEVERAGE: [
@@ -586,14 +1529,67 @@ def main():
     )
     application.add_handler(leverage_conv_handler)
     
+    # Conversation handler for ladder orders
+    ladder_conv_handler = ConversationHandler(
+        name='ladder_conversation',
+        persistent=True,
+        entry_points=[CallbackQueryHandler(start_ladder_order, pattern='^ladder_order$')],
+        states={
+            SYMBOL: [
+                CallbackQueryHandler(select_ladder_side, pattern='^laddersym_'),
+                CallbackQueryHandler(change_symbol_page, pattern='^sympage_'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_symbols),
+                CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
+            ],
+            SIDE: [
+                CallbackQueryHandler(enter_ladder, pattern='^side_'),
+                CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
+            ],
+            LADDER: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_ladder),
+                CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
+            ],
+            LADDER_CONFIRM: [
+                CallbackQueryHandler(submit_ladder, pattern='^ladder_confirm$'),
+                CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
+            ]
+        },
+        fallbacks=[
+            CommandHandler('cancel', cancel),
+            CallbackQueryHandler(back_to_main_menu, pattern='^back_to_menu$')
+        ]
+    )
+    application.add_handler(ladder_conv_handler)
+    
     # Other callback handlers
     application.add_handler(CallbackQueryHandler(get_balance, pattern='^balance$'))
-    application.add_handler(CallbackQueryHandler(get_positions, pattern='^positions$'))
-    application.add_handler(CallbackQueryHandler(get_orders, pattern='^orders$'))
-    application.add_handler(CallbackQueryHandler(cancel_all_orders, pattern='^cancel_orders$'))
+    application.add_handler(CallbackQueryHandler(get_positions, pattern=r'^positions(_page_\d+)?$'))
+    application.add_handler(CallbackQueryHandler(get_orders, pattern=r'^orders(_page_\d+)?$'))
+    application.add_handler(CallbackQueryHandler(choose_orders_to_cancel, pattern='^cancel_orders$'))
+    application.add_handler(CallbackQueryHandler(cancel_all_orders, pattern='^cancel_(all|cat_[a-z]+|sym_[a-z]+_.+)$'))
+    application.add_handler(CallbackQueryHandler(get_risk, pattern='^risk$'))
     application.add_handler(CallbackQueryHandler(start, pattern='^start$'))
+    
+    for handlers in application.handlers.values():
+        instrument_handlers(handlers)
+    global served_persistence
+    served_persistence = application.persistence
+    return application
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+def main():
+    application = build_application()
+
+    if WEBHOOK_URL:
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     main()
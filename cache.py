@@ -0,0 +1,279 @@
+import os
+import time
+import pickle
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds each kind of snapshot stays fresh
+DEFAULT_TTLS = {
+    'wallet': float(os.getenv('CACHE_TTL_WALLET', '5')),
+    'positions': float(os.getenv('CACHE_TTL_POSITIONS', '2')),
+    'orders': float(os.getenv('CACHE_TTL_ORDERS', '2')),
+    'tickers': float(os.getenv('CACHE_TTL_TICKERS', '1')),
+}
+# Expired snapshots younger than this may still be served while Bybit is unreachable
+STALE_MAX_AGE = float(os.getenv('CACHE_STALE_MAX_AGE', '300'))
+# Seconds a fresh local snapshot is served before asking the shared store whether another process wrote since
+GENERATION_CHECK_INTERVAL = float(os.getenv('CACHE_GENERATION_CHECK_INTERVAL', '0.25'))
+
+
+class TTLCache:
+    """Read-through cache for exchange snapshots, grouped by kind.
+
+    Concurrent misses for the same key share a single in-flight load, so a
+    burst of identical requests costs one round trip.
+    """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._entries = {}
+        self._loading = {}
+        self._generation = {}
+        self.hits = {}
+        self.misses = {}
+
+    @staticmethod
+    def _key(kind, params):
+        return kind, tuple(sorted(params.items()))
+
+    async def get_or_load(self, kind, params, loader):
+        key = self._key(kind, params)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return entry[1]
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return await asyncio.shield(pending)
+
+        self.misses[kind] = self.misses.get(kind, 0) + 1
+        generation = self._generation.get(kind, 0)
+        pending = self._loading[key] = asyncio.ensure_future(loader())
+        try:
+            value = await asyncio.shield(pending)
+        finally:
+            if self._loading.get(key) is pending:
+                del self._loading[key]
+        ttl = self.ttls.get(kind, 0)
+        if ttl > 0 and self._generation.get(kind, 0) == generation:
+            self._entries[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def stale(self, kind, params, max_age=STALE_MAX_AGE):
+        """The last value loaded for ``params``, expired or not, unless older than ``max_age``."""
+        entry = self._entries.get(self._key(kind, params))
+        if entry is None:
+            return None
+        loaded_at = entry[0] - self.ttls.get(kind, 0)
+        return entry[1] if time.monotonic() - loaded_at <= max_age else None
+
+    def invalidate(self, *kinds):
+        for kind in kinds:
+            self._generation[kind] = self._generation.get(kind, 0) + 1
+        for key in [key for key in self._entries if key[0] in kinds]:
+            del self._entries[key]
+        # Loads already in flight may predate the write, so don't hand them out
+        for key in [key for key in self._loading if key[0] in kinds]:
+            del self._loading[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {
+            kind: {'hits': self.hits.get(kind, 0), 'misses': self.misses.get(kind, 0)}
+            for kind in kinds
+        }
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    namespace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, kind, key)
+);
+CREATE TABLE IF NOT EXISTS generations (
+    namespace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (namespace, kind)
+);
+"""
+# Writes between sweeps of rows too old to serve even as stale data
+PRUNE_EVERY = 1000
+
+
+class SQLiteCacheStore:
+    """Exchange snapshots in one SQLite file that every worker process shares.
+
+    All access goes through one thread per process, in submission order,
+    so a delete queued by an invalidation always lands before any read
+    queued after it. Every invalidation also bumps the kind's generation,
+    which tells other processes their own copies predate a write. Expiry
+    times are wall-clock, as processes share no monotonic clock.
+    """
+
+    def __init__(self, filepath, stale_max_age=STALE_MAX_AGE):
+        self.filepath = filepath
+        self.stale_max_age = stale_max_age
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-store')
+        self._connection = None
+        self._writes = 0
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=OFF')
+            self._connection.executescript(CACHE_SCHEMA)
+        return self._connection
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _get(self, namespace, kind, key):
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM snapshots WHERE namespace = ? AND kind = ? AND key = ?',
+            (namespace, kind, key)
+        ).fetchone()
+        return (pickle.loads(row[0]), row[1]) if row else None
+
+    def _generation(self, namespace, kind):
+        row = self._connect().execute(
+            'SELECT generation FROM generations WHERE namespace = ? AND kind = ?', (namespace, kind)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _put(self, namespace, kind, key, value, expires_at, generation):
+        connection = self._connect()
+        with connection:
+            # Skipped when some process invalidated the kind while the value was loading
+            connection.execute(
+                'INSERT OR REPLACE INTO snapshots (namespace, kind, key, value, expires_at) '
+                'SELECT ?, ?, ?, ?, ? WHERE COALESCE('
+                '(SELECT generation FROM generations WHERE namespace = ? AND kind = ?), 0) = ?',
+                (namespace, kind, key, pickle.dumps(value), expires_at, namespace, kind, generation)
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM snapshots WHERE expires_at < ?', (time.time() - self.stale_max_age,))
+
+    def _delete(self, namespace, kinds):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                'DELETE FROM snapshots WHERE namespace = ? AND kind = ?', [(namespace, kind) for kind in kinds]
+            )
+            connection.executemany(
+                'INSERT INTO generations (namespace, kind, generation) VALUES (?, ?, 1) '
+                'ON CONFLICT (namespace, kind) DO UPDATE SET generation = generation + 1',
+                [(namespace, kind) for kind in kinds]
+            )
+
+    async def get(self, namespace, kind, key):
+        """(value, expires_at) of the stored snapshot, or None."""
+        return await self._run(self._get, namespace, kind, key)
+
+    async def generation(self, namespace, kind):
+        """How many times ``kind`` of ``namespace`` was invalidated, by any process."""
+        return await self._run(self._generation, namespace, kind)
+
+    async def put(self, namespace, kind, key, value, expires_at, generation=0):
+        """Store a snapshot loaded at ``generation``, unless an invalidation has happened since."""
+        await self._run(self._put, namespace, kind, key, value, expires_at, generation)
+
+    def delete(self, namespace, kinds):
+        # Not awaited: the single store thread runs it before any later read
+        self._executor.submit(self._delete, namespace, kinds)
+
+    def close(self):
+        def close():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._executor.submit(close)
+        self._executor.shutdown(wait=True)
+
+
+class SharedTTLCache(TTLCache):
+    """A TTLCache whose snapshots are also shared with other processes through ``store``.
+
+    A local miss looks in the store before calling Bybit, and a load is
+    written back for the other processes, so workers serving users of the
+    same account share one request per TTL. ``namespace`` identifies the
+    account. Invalidations drop the account's shared snapshots and bump
+    its generation in the store. A local miss checks that generation
+    before going to the store, and a local hit at most every
+    ``generation_check_interval`` seconds, so copies a process holds from
+    before another process's write are dropped within that interval
+    instead of served until they expire. This process's own writes drop
+    its copies at once.
+    """
+
+    def __init__(self, store, namespace, ttls=None, generation_check_interval=GENERATION_CHECK_INTERVAL):
+        super().__init__(ttls)
+        self.store = store
+        self.namespace = namespace
+        self.generation_check_interval = generation_check_interval
+        self.shared_hits = {}
+        # kind -> store generation the local entries were loaded at
+        self._shared_generation = {}
+        # kind -> monotonic time that generation was last read from the store
+        self._generation_checked = {}
+
+    async def get_or_load(self, kind, params, loader):
+        ttl = self.ttls.get(kind, 0)
+        if ttl <= 0:
+            return await super().get_or_load(kind, params, loader)
+        local_key = self._key(kind, params)
+        key = repr(local_key[1])
+        now = time.monotonic()
+        entry = self._entries.get(local_key)
+        if (entry is None or entry[0] <= now or kind not in self._shared_generation
+                or now - self._generation_checked[kind] >= self.generation_check_interval):
+            shared_generation = await self.store.generation(self.namespace, kind)
+            if self._shared_generation.get(kind, shared_generation) != shared_generation:
+                # Some process wrote since; only the local copies need dropping
+                TTLCache.invalidate(self, kind)
+            self._shared_generation[kind] = shared_generation
+            self._generation_checked[kind] = now
+        shared_generation = self._shared_generation[kind]
+        generation = self._generation.get(kind, 0)
+        remaining = None
+
+        async def shared_loader():
+            nonlocal remaining
+            stored = await self.store.get(self.namespace, kind, key)
+            if stored is not None and stored[1] > time.time():
+                self.shared_hits[kind] = self.shared_hits.get(kind, 0) + 1
+                remaining = stored[1] - time.time()
+                return stored[0]
+            value = await loader()
+            # A write since the load started may have made it outdated
+            if self._generation.get(kind, 0) == generation:
+                await self.store.put(self.namespace, kind, key, value, time.time() + ttl, shared_generation)
+            return value
+
+        value = await super().get_or_load(kind, params, shared_loader)
+        if remaining is not None:
+            # Expire with the shared copy, not a full TTL after we happened to read it
+            if local_key in self._entries:
+                self._entries[local_key] = (time.monotonic() + remaining, value)
+        return value
+
+    def invalidate(self, *kinds):
+        super().invalidate(*kinds)
+        self.store.delete(self.namespace, kinds)
+        for kind in kinds:
+            # Our own bump; the next read picks it up without dropping what it loads
+            self._shared_generation.pop(kind, None)
+            self._generation_checked.pop(kind, None)
@@ -0,0 +1,222 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import functools
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from cache import TTLCache
+from ratelimit import RequestScheduler, RATE_LIMIT_ERROR, endpoint_class
+from resilience import (
+    CircuitBreaker, CircuitOpenError, REQUEST_TIMEOUTS, CALL_DEADLINES, MAX_ATTEMPTS,
+    DUPLICATE_ORDER_LINK_ID, LEVERAGE_NOT_MODIFIED, is_transient, backoff
+)
+from metrics import BYBIT_SECONDS, BYBIT_REQUEST_SECONDS, BYBIT_CALLS, BYBIT_RETRIES, BYBIT_STALE
+
+# Number of Bybit requests that may be in flight at the same time
+EXCHANGE_WORKERS = int(os.getenv('EXCHANGE_WORKERS', '16'))
+
+
+def new_order_link_id():
+    # Bybit allows up to 36 characters
+    return uuid.uuid4().hex
+
+
+class Exchange:
+    """Async facade over the blocking pybit HTTP client.
+
+    Every call is pushed onto a bounded thread pool, so a slow Bybit response
+    only occupies one worker instead of the whole Telegram event loop.
+    Each request has a deadline; timeouts and server errors are retried
+    with jittered backoff, which is safe for writes too because every order
+    carries an orderLinkId that Bybit refuses to fill twice. A circuit
+    breaker fails calls fast while Bybit is down, and cached reads fall
+    back to their last snapshot meanwhile.
+    """
+
+    def __init__(self, client, max_workers=EXCHANGE_WORKERS, cache=None, scheduler=None, breaker=None,
+                 timeouts=None, max_attempts=MAX_ATTEMPTS):
+        self.client = client
+        self.cache = cache if cache is not None else TTLCache()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler(max_workers)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.timeouts = dict(REQUEST_TIMEOUTS if timeouts is None else timeouts)
+        self.max_attempts = max_attempts
+        # Optional livestate.AccountState; reads are served from it while it is live
+        self.state = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='bybit'
+        )
+        # Let every worker keep its own keep-alive connection instead of
+        # fighting over requests' default pool of 10.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        client.client.mount('https://', adapter)
+        # pybit would sleep through rate limit errors inside a worker thread;
+        # the scheduler queues and retries them without holding a worker.
+        client.retry_codes.discard(RATE_LIMIT_ERROR)
+        # A request we have given up on should not hold its worker much longer
+        client.timeout = max(self.timeouts.values())
+
+    async def call(self, method, **params):
+        endpoint = endpoint_class(method)
+        func = functools.partial(getattr(self.client, method), **params)
+        timeout = self.timeouts.get(endpoint, max(self.timeouts.values()))
+        deadline = CALL_DEADLINES.get(endpoint, timeout * 2)
+
+        async def request():
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                # The worker thread cannot be interrupted; pybit's own timeout frees it
+                return await asyncio.wait_for(loop.run_in_executor(self._executor, func), timeout)
+            finally:
+                BYBIT_REQUEST_SECONDS.observe(time.perf_counter() - start, method)
+
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                self.breaker.check()
+                try:
+                    result = await self.scheduler.submit(endpoint, request)
+                except asyncio.CancelledError:
+                    self.breaker.record_cancelled()
+                    raise
+                except Exception as e:
+                    BYBIT_CALLS.inc(method, getattr(e, 'status_code', None) or type(e).__name__)
+                    if not is_transient(e):
+                        # Bybit answered, so it is up; the request itself was wrong
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    attempt += 1
+                    delay = backoff(attempt)
+                    # Never retry past the deadline, so a handler waits a bounded time
+                    if attempt >= self.max_attempts or time.perf_counter() - start + delay + timeout > deadline:
+                        raise
+                    BYBIT_RETRIES.inc(method)
+                    logging.warning(f"Bybit {method} failed ({str(e) or type(e).__name__}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                break
+        finally:
+            BYBIT_SECONDS.observe(time.perf_counter() - start, method)
+        # Clients built with return_response_headers=True also hand back timing and headers
+        if isinstance(result, tuple):
+            result, _, headers = result
+            self.scheduler.observe_headers(endpoint, headers)
+        BYBIT_CALLS.inc(method, result.get('retCode'))
+        return result
+
+    async def cached_call(self, kind, method, **params):
+        try:
+            return await self.cache.get_or_load(
+                kind, params, lambda: self.call(method, **params)
+            )
+        except Exception as e:
+            if not (isinstance(e, CircuitOpenError) or is_transient(e)):
+                raise
+            stale = self.cache.stale(kind, params)
+            if stale is None:
+                raise
+            BYBIT_STALE.inc(kind)
+            logging.warning(f"Serving a stale {kind} snapshot: {str(e) or type(e).__name__}")
+            return stale
+
+    async def write_call(self, method, invalidates, **params):
+        result = await self.call(method, **params)
+        if result.get('retCode') == 0:
+            self.cache.invalidate(*invalidates)
+        return result
+
+    async def iter_pages(self, method, limit, **params):
+        """Yield one page of rows at a time straight from REST, following
+        nextPageCursor only as far as the caller consumes."""
+        cursor = None
+        while True:
+            page_params = dict(params, limit=limit)
+            if cursor:
+                page_params['cursor'] = cursor
+            response = await self.call(method, **page_params)
+            result = response.get('result', {})
+            rows = result.get('list', [])
+            yield rows
+            cursor = result.get('nextPageCursor')
+            if not cursor or len(rows) < limit:
+                return
+
+    def _live(self):
+        return self.state is not None and self.state.is_live()
+
+    async def get_wallet_balance(self, **params):
+        if self._live():
+            return self.state.wallet_response(**params)
+        return await self.cached_call('wallet', 'get_wallet_balance', **params)
+
+    async def get_tickers(self, **params):
+        return await self.cached_call('tickers', 'get_tickers', **params)
+
+    async def get_spot_prices(self):
+        """Return the last price of every spot pair, keyed by symbol, from one request."""
+        tickers = await self.get_tickers(category="spot")
+        prices = {}
+        for ticker in tickers.get('result', {}).get('list', []):
+            if ticker.get('lastPrice'):
+                prices[ticker['symbol']] = Decimal(ticker['lastPrice'])
+        return prices
+
+    async def get_positions(self, **params):
+        if self._live():
+            return self.state.positions_response(**params)
+        return await self.cached_call('positions', 'get_positions', **params)
+
+    async def get_open_orders(self, **params):
+        if self._live():
+            return self.state.orders_response(**params)
+        return await self.cached_call('orders', 'get_open_orders', **params)
+
+    async def place_order(self, **params):
+        params.setdefault('orderLinkId', new_order_link_id())
+        try:
+            return await self.write_call(
+                'place_order', ('orders', 'positions', 'wallet'), **params
+            )
+        except Exception as e:
+            if getattr(e, 'status_code', None) != DUPLICATE_ORDER_LINK_ID:
+                raise
+            # An attempt that timed out reached Bybit after all; the order exists once
+            self.cache.invalidate('orders', 'positions', 'wallet')
+            return {'retCode': 0, 'retMsg': 'OK', 'result': {'orderId': '', 'orderLinkId': params['orderLinkId']}}
+
+    async def place_batch_order(self, **params):
+        # Orders of a retried batch that already went through come back as
+        # duplicates, which ladder.batch_results counts as placed
+        params['request'] = [
+            request if request.get('orderLinkId') else dict(request, orderLinkId=new_order_link_id())
+            for request in params.get('request', [])
+        ]
+        return await self.write_call(
+            'place_batch_order', ('orders', 'positions', 'wallet'), **params
+        )
+
+    async def cancel_all_orders(self, **params):
+        return await self.write_call(
+            'cancel_all_orders', ('orders', 'wallet'), **params
+        )
+
+    async def set_leverage(self, **params):
+        try:
+            return await self.write_call('set_leverage', ('positions', 'wallet'), **params)
+        except Exception as e:
+            if getattr(e, 'status_code', None) != LEVERAGE_NOT_MODIFIED:
+                raise
+            # Already at that leverage, possibly set by an earlier attempt of this call
+            return {'retCode': 0, 'retMsg': 'OK', 'result': {}}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.client.client.close()
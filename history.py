@@ -0,0 +1,235 @@
+import time
+import asyncio
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# Bybit serves executions and closed PnL in windows of at most seven days
+WINDOW_MS = 7 * 24 * 3600 * 1000
+PAGE_SIZE = 100
+# Each sync re-reads this much before the watermark, for rows Bybit publishes late
+OVERLAP_MS = 5 * 60 * 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    account TEXT NOT NULL,
+    exec_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    exec_type TEXT NOT NULL,
+    exec_price REAL NOT NULL,
+    exec_qty REAL NOT NULL,
+    exec_value REAL NOT NULL,
+    exec_fee REAL NOT NULL,
+    exec_time INTEGER NOT NULL,
+    PRIMARY KEY (account, exec_id)
+);
+CREATE INDEX IF NOT EXISTS executions_by_time ON executions (account, exec_time);
+CREATE TABLE IF NOT EXISTS closed_pnl (
+    account TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    qty REAL NOT NULL,
+    avg_entry_price REAL NOT NULL,
+    avg_exit_price REAL NOT NULL,
+    closed_pnl REAL NOT NULL,
+    updated_time INTEGER NOT NULL,
+    PRIMARY KEY (account, order_id)
+);
+CREATE INDEX IF NOT EXISTS closed_pnl_by_time ON closed_pnl (account, updated_time);
+CREATE TABLE IF NOT EXISTS watermarks (
+    account TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    synced_until INTEGER NOT NULL,
+    PRIMARY KEY (account, stream)
+);
+"""
+
+# SQLite expressions turning a millisecond timestamp column into a UTC period label
+PERIODS = {
+    'day': "date({column} / 1000, 'unixepoch')",
+    'week': "date({column} / 1000, 'unixepoch', '-6 days', 'weekday 1')",
+}
+
+
+def account_key(exchange):
+    """Stable id for an exchange's account that does not reveal its API key."""
+    api_key = exchange.client.api_key
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+
+
+def _float(value):
+    return float(value or 0)
+
+
+def _execution_row(account, row):
+    return (
+        account, row['execId'], row['symbol'], row.get('side', ''), row.get('execType', 'Trade'),
+        _float(row.get('execPrice')), _float(row.get('execQty')), _float(row.get('execValue')),
+        _float(row.get('execFee')), int(row['execTime']),
+    )
+
+
+def _closed_pnl_row(account, row):
+    return (
+        account, row['orderId'], row['symbol'], row.get('side', ''), _float(row.get('qty')),
+        _float(row.get('avgEntryPrice')), _float(row.get('avgExitPrice')), _float(row.get('closedPnl')),
+        int(row['updatedTime']),
+    )
+
+
+STREAMS = {
+    'executions': (
+        'get_executions', _execution_row,
+        'INSERT OR IGNORE INTO executions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    ),
+    'closed_pnl': (
+        'get_closed_pnl', _closed_pnl_row,
+        'INSERT OR REPLACE INTO closed_pnl VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    ),
+}
+
+
+class HistoryStore:
+    """Executions and closed PnL per account in an indexed SQLite file.
+
+    Like the persistence backend, all SQLite work runs on one dedicated
+    thread so the event loop never waits on disk.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history')
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _watermark(self, account, stream):
+        row = self._connect().execute(
+            'SELECT synced_until FROM watermarks WHERE account = ? AND stream = ?', (account, stream)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _save_window(self, account, stream, rows, synced_until):
+        # Rows and watermark move together, so an interrupted sync resumes cleanly
+        _, to_row, insert = STREAMS[stream]
+        connection = self._connect()
+        with connection:
+            connection.executemany(insert, [to_row(account, row) for row in rows])
+            connection.execute(
+                'INSERT OR REPLACE INTO watermarks (account, stream, synced_until) VALUES (?, ?, ?)',
+                (account, stream, synced_until)
+            )
+
+    def _summary(self, account, period, since_ms):
+        connection = self._connect()
+        pnl_period = PERIODS[period].format(column='updated_time')
+        exec_period = PERIODS[period].format(column='exec_time')
+        periods = {}
+        for label, pnl, closed, won in connection.execute(
+            f'SELECT {pnl_period}, SUM(closed_pnl), COUNT(*), SUM(closed_pnl > 0) FROM closed_pnl '
+            f'WHERE account = ? AND updated_time >= ? GROUP BY 1',
+            (account, since_ms)
+        ):
+            periods[label] = {'pnl': pnl, 'closed': closed, 'won': won, 'fees': 0.0, 'funding': 0.0}
+        for label, exec_type, fees in connection.execute(
+            f"SELECT {exec_period}, exec_type = 'Funding', SUM(exec_fee) FROM executions "
+            f'WHERE account = ? AND exec_time >= ? GROUP BY 1, 2',
+            (account, since_ms)
+        ):
+            entry = periods.setdefault(label, {'pnl': 0.0, 'closed': 0, 'won': 0, 'fees': 0.0, 'funding': 0.0})
+            entry['funding' if exec_type else 'fees'] += fees
+        return sorted(periods.items(), reverse=True)
+
+    async def watermark(self, account, stream):
+        return await self._run(self._watermark, account, stream)
+
+    async def save_window(self, account, stream, rows, synced_until):
+        await self._run(self._save_window, account, stream, rows, synced_until)
+
+    async def summary(self, account, period, since_ms):
+        """[(period label, totals)] newest first; fees and funding are what the account paid."""
+        return await self._run(self._summary, account, period, since_ms)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=False)
+
+
+class TradeHistory:
+    """Incrementally mirrors each account's trade history into a HistoryStore.
+
+    A sync only asks Bybit for what happened since the stored watermark, one
+    seven day window at a time; a fresh account is backfilled
+    ``backfill_days`` deep. Summaries are answered from the store alone.
+    """
+
+    def __init__(self, store, backfill_days=30, sync_interval=300):
+        self.store = store
+        self.backfill_days = backfill_days
+        self.sync_interval = sync_interval
+        self._locks = {}
+        self._synced_at = {}
+
+    async def _sync_stream(self, exchange, account, stream, now):
+        method = STREAMS[stream][0]
+        watermark = await self.store.watermark(account, stream)
+        start = now - self.backfill_days * 24 * 3600 * 1000
+        if watermark is not None:
+            start = max(start, watermark - OVERLAP_MS)
+        fetched = 0
+        while start < now:
+            end = min(start + WINDOW_MS, now)
+            rows = []
+            async for page in exchange.iter_pages(
+                method, PAGE_SIZE, category="linear", startTime=start, endTime=end
+            ):
+                rows += page
+            await self.store.save_window(account, stream, rows, end)
+            fetched += len(rows)
+            start = end
+        return fetched
+
+    async def sync(self, exchange):
+        """Bring one account up to date; returns the number of rows fetched."""
+        account = account_key(exchange)
+        if account is None:
+            return 0
+        lock = self._locks.setdefault(account, asyncio.Lock())
+        async with lock:
+            now = int(time.time() * 1000)
+            fetched = 0
+            for stream in STREAMS:
+                fetched += await self._sync_stream(exchange, account, stream, now)
+            self._synced_at[account] = time.monotonic()
+            return fetched
+
+    async def ensure_fresh(self, exchange):
+        account = account_key(exchange)
+        synced_at = self._synced_at.get(account)
+        if synced_at is None or time.monotonic() - synced_at > self.sync_interval:
+            await self.sync(exchange)
+
+    async def summary(self, exchange, period, count):
+        """Totals for the last ``count`` days or weeks, newest first."""
+        days = count if period == 'day' else count * 7
+        # Periods are calendar days or Monday-based weeks in UTC, so start at a boundary
+        now = time.gmtime()
+        midnight = int(time.time()) - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+        if period == 'week':
+            midnight -= now.tm_wday * 24 * 3600
+        since = (midnight - (days - (1 if period == 'day' else 7)) * 24 * 3600) * 1000
+        return await self.store.summary(account_key(exchange), period, since)
@@ -0,0 +1,141 @@
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_HALF_UP
+
+
+class OrderValidationError(ValueError):
+    """Raised when user input breaks an instrument's trading rules."""
+
+
+def _decimal(value, default='0'):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else Decimal(default)
+    except InvalidOperation:
+        return Decimal(default)
+
+
+def _round_to_step(value, step, rounding):
+    if step <= 0:
+        return value
+    try:
+        return ((value / step).to_integral_value(rounding=rounding) * step).quantize(step)
+    except InvalidOperation:
+        # More digits than the decimal context holds, e.g. 1e30 at a 0.001 step
+        raise OrderValidationError(f"{value} is out of range.")
+
+
+class Instrument:
+    """Trading rules for one contract, parsed once from get_instruments_info."""
+
+    __slots__ = (
+        'symbol', 'base_coin', 'quote_coin', 'status',
+        'tick_size', 'min_price', 'max_price',
+        'qty_step', 'min_qty', 'max_qty', 'max_market_qty', 'min_notional',
+        'min_leverage', 'max_leverage', 'leverage_step',
+    )
+
+    def __init__(self, info):
+        price_filter = info.get('priceFilter', {})
+        lot_filter = info.get('lotSizeFilter', {})
+        leverage_filter = info.get('leverageFilter', {})
+        self.symbol = info['symbol']
+        self.base_coin = info.get('baseCoin', '')
+        self.quote_coin = info.get('quoteCoin', '')
+        self.status = info.get('status', '')
+        self.tick_size = _decimal(price_filter.get('tickSize'))
+        self.min_price = _decimal(price_filter.get('minPrice'))
+        self.max_price = _decimal(price_filter.get('maxPrice'))
+        self.qty_step = _decimal(lot_filter.get('qtyStep'))
+        self.min_qty = _decimal(lot_filter.get('minOrderQty'))
+        self.max_qty = _decimal(lot_filter.get('maxOrderQty'))
+        self.max_market_qty = _decimal(lot_filter.get('maxMktOrderQty'), lot_filter.get('maxOrderQty') or '0')
+        self.min_notional = _decimal(lot_filter.get('minNotionalValue'))
+        self.min_leverage = _decimal(leverage_filter.get('minLeverage'), '1')
+        self.max_leverage = _decimal(leverage_filter.get('maxLeverage'), '100')
+        self.leverage_step = _decimal(leverage_filter.get('leverageStep'), '0.01')
+
+    def round_qty(self, qty):
+        return _round_to_step(qty, self.qty_step, ROUND_DOWN)
+
+    def round_price(self, price):
+        return _round_to_step(price, self.tick_size, ROUND_HALF_UP)
+
+    def check_qty(self, qty, order_type='limit', price=None):
+        """Round ``qty`` down to the lot step and check it against the lot limits."""
+        rounded = self.round_qty(qty)
+        if rounded <= 0 or rounded < self.min_qty:
+            raise OrderValidationError(
+                f"Minimum quantity for {self.symbol} is {self.min_qty} (step {self.qty_step})."
+            )
+        max_qty = self.max_market_qty if order_type == 'market' else self.max_qty
+        if max_qty and rounded > max_qty:
+            raise OrderValidationError(f"Maximum {order_type} quantity for {self.symbol} is {max_qty}.")
+        if price is not None and self.min_notional and rounded * price < self.min_notional:
+            raise OrderValidationError(
+                f"Order value must be at least {self.min_notional} {self.quote_coin}."
+            )
+        return rounded
+
+    def check_price(self, price):
+        """Round ``price`` to the nearest tick and check it against the price band."""
+        rounded = self.round_price(price)
+        if rounded <= 0 or rounded < self.min_price:
+            raise OrderValidationError(f"Minimum price for {self.symbol} is {self.min_price}.")
+        if self.max_price and rounded > self.max_price:
+            raise OrderValidationError(f"Maximum price for {self.symbol} is {self.max_price}.")
+        return rounded
+
+    def check_leverage(self, leverage):
+        rounded = _round_to_step(leverage, self.leverage_step, ROUND_DOWN)
+        if rounded < self.min_leverage or rounded > self.max_leverage:
+            raise OrderValidationError(
+                f"Leverage for {self.symbol} must be between "
+                f"{self.min_leverage.normalize():f} and {self.max_leverage.normalize():f}."
+            )
+        return rounded
+
+
+class InstrumentIndex:
+    """Symbol -> Instrument lookup for one category, reloaded in the background."""
+
+    def __init__(self, category='linear'):
+        self.category = category
+        self.instruments = {}
+
+    def get(self, symbol):
+        return self.instruments.get(symbol)
+
+    def __contains__(self, symbol):
+        return symbol in self.instruments
+
+    def __len__(self):
+        return len(self.instruments)
+
+    async def load(self, exchange):
+        instruments = {}
+        cursor = None
+        while True:
+            params = {'category': self.category, 'limit': 1000}
+            if cursor:
+                params['cursor'] = cursor
+            response = await exchange.call('get_instruments_info', **params)
+            result = response.get('result', {})
+            for info in result.get('list', []):
+                if info.get('status', 'Trading') == 'Trading':
+                    instruments[info['symbol']] = Instrument(info)
+            cursor = result.get('nextPageCursor')
+            if not cursor:
+                break
+        # Swap in one step so readers never see a half-built index
+        self.instruments = instruments
+        logging.info(f"Loaded {len(instruments)} {self.category} instruments")
+        return self
+
+
+def parse_decimal(text):
+    try:
+        value = Decimal(text.strip().replace(',', '.'))
+    except (InvalidOperation, AttributeError):
+        raise OrderValidationError("Please enter a valid number.")
+    if not value.is_finite():
+        raise OrderValidationError("Please enter a valid number.")
+    return value
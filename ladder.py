@@ -0,0 +1,93 @@
+import uuid
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from instruments import OrderValidationError, parse_decimal
+from resilience import DUPLICATE_ORDER_LINK_ID
+
+# Orders per place_batch_order request for linear contracts
+BATCH_SIZE = 10
+MAX_LEVELS = 50
+
+
+def parse_ladder(text):
+    """Parse "<low> <high> <levels> <total qty>" into Decimals and an int."""
+    parts = text.replace(',', ' ').split()
+    if len(parts) != 4:
+        raise OrderValidationError("Send four values: low price, high price, levels and total quantity.")
+    low, high, levels, total_qty = (parse_decimal(part) for part in parts)
+    if levels != levels.to_integral_value() or not 1 <= levels <= MAX_LEVELS:
+        raise OrderValidationError(f"Levels must be a whole number between 1 and {MAX_LEVELS}.")
+    if low <= 0 or high <= 0 or total_qty <= 0:
+        raise OrderValidationError("Prices and quantity must be positive.")
+    if low > high:
+        low, high = high, low
+    return low, high, int(levels), total_qty
+
+
+def build_ladder(instrument, low, high, levels, total_qty):
+    """Split ``total_qty`` evenly over ``levels`` prices from ``low`` to ``high``.
+
+    Prices are rounded to the tick and quantities down to the lot step; the
+    steps lost to rounding go to the first levels so the ladder adds up to
+    as much of the requested size as the lot step allows.
+    """
+    if levels == 1:
+        prices = [low]
+    else:
+        gap = (high - low) / (levels - 1)
+        prices = [low + gap * i for i in range(levels)]
+    prices = [instrument.check_price(price) for price in prices]
+    if len(set(prices)) != len(prices):
+        raise OrderValidationError(
+            f"The range is too narrow for {levels} levels at tick size {instrument.tick_size}."
+        )
+
+    step = instrument.qty_step if instrument.qty_step > 0 else Decimal('1')
+    total_steps = int((total_qty / step).to_integral_value(rounding=ROUND_DOWN))
+    base_steps, extra_steps = divmod(total_steps, levels)
+    legs = []
+    for i, price in enumerate(prices):
+        try:
+            qty = (step * (base_steps + (1 if i < extra_steps else 0))).quantize(step)
+        except InvalidOperation:
+            raise OrderValidationError(f"Total quantity {total_qty} is out of range.")
+        legs.append((price, instrument.check_qty(qty, 'limit', price)))
+    return legs
+
+
+def batch_requests(symbol, side, legs):
+    """place_batch_order request entries; each carries its own orderLinkId for reporting."""
+    ladder_id = uuid.uuid4().hex[:12]
+    return [
+        {
+            'symbol': symbol,
+            'side': side,
+            'orderType': 'Limit',
+            'qty': str(qty),
+            'price': str(price),
+            'timeInForce': 'GTC',
+            'orderLinkId': f'ladder-{ladder_id}-{i}',
+        }
+        for i, (price, qty) in enumerate(legs)
+    ]
+
+
+def chunked(items, size=BATCH_SIZE):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def batch_results(requests, response):
+    """Pair each submitted order with Bybit's per-order outcome: (request, ok, detail)."""
+    orders = response.get('result', {}).get('list', [])
+    statuses = response.get('retExtInfo', {}).get('list', [])
+    results = []
+    for i, request in enumerate(requests):
+        status = statuses[i] if i < len(statuses) else {}
+        order = orders[i] if i < len(orders) else {}
+        if status.get('code', 0) == 0 and order.get('orderId'):
+            results.append((request, True, order['orderId']))
+        elif status.get('code') == DUPLICATE_ORDER_LINK_ID:
+            # Placed by an earlier attempt of a retried batch
+            results.append((request, True, request.get('orderLinkId', '')))
+        else:
+            results.append((request, False, status.get('msg') or response.get('retMsg', 'Unknown error')))
+    return results
@@ -0,0 +1,345 @@
+import json
+import asyncio
+import logging
+import threading
+import time
+from decimal import Decimal
+from pybit.unified_trading import WebSocket
+from portfolio import POSITION_SCOPES, ORDER_SCOPES, PAGE_LIMITS, scope_params, linear_settle_coin
+
+# Order states that still rest on the book
+OPEN_ORDER_STATUSES = {'New', 'PartiallyFilled', 'Untriggered'}
+
+
+class AccountState:
+    """In-memory account view kept current by the Bybit WebSocket streams.
+
+    Stream callbacks run on pybit's socket threads while handlers read from
+    the event loop, so every access goes through one lock. Readers get
+    responses shaped like the REST endpoints they replace.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.positions = {}
+        self.orders = {}
+        self.wallet = {}
+        self.tickers = {}
+        # symbol -> settle coin, as the REST snapshots reported it
+        self.settle_coins = {}
+        self.ready = False
+        self.connected = False
+        self.updated_at = 0.0
+
+    def is_live(self):
+        return self.ready and self.connected
+
+    def apply(self, message):
+        topic = message.get('topic', '')
+        data = message.get('data')
+        if data is None:
+            return
+        with self._lock:
+            if topic == 'position':
+                for row in data:
+                    self._apply_position(row)
+            elif topic == 'order':
+                for row in data:
+                    self._apply_order(row)
+            elif topic == 'wallet':
+                for row in data:
+                    self.wallet[row.get('accountType', 'UNIFIED')] = row
+            elif topic.startswith('tickers.'):
+                symbol = topic.split('.', 1)[1]
+                self.tickers.setdefault(symbol, {}).update(data)
+            self.updated_at = time.time()
+
+    def _tagged(self, row):
+        # Stream rows name their category but not their settle coin
+        row = dict(row)
+        category = row.setdefault('category', 'linear')
+        if category == 'linear' and not row.get('settleCoin'):
+            row['settleCoin'] = self.settle_coins.get(row['symbol']) or linear_settle_coin(row['symbol'])
+        return row
+
+    def _apply_position(self, row):
+        row = self._tagged(row)
+        key = (row['category'], row['symbol'], str(row.get('positionIdx', 0)))
+        if Decimal(str(row.get('size') or '0')) == 0:
+            self.positions.pop(key, None)
+            return
+        previous = self.positions.get(key)
+        if previous is not None and not row.get('markPrice') and previous.get('markPrice'):
+            # Only linear marks stream in; others keep the last one REST reported
+            row['markPrice'] = previous['markPrice']
+        self.positions[key] = row
+
+    def _apply_order(self, row):
+        row = self._tagged(row)
+        if row.get('orderStatus') in OPEN_ORDER_STATUSES:
+            self.orders[row['orderId']] = row
+        else:
+            self.orders.pop(row['orderId'], None)
+
+    def load_snapshot(self, positions=(), orders=(), wallet=()):
+        """Replace the whole state with REST snapshots, e.g. after a reconnect."""
+        with self._lock:
+            self.positions.clear()
+            self.orders.clear()
+            self.wallet.clear()
+            self.settle_coins = {
+                row['symbol']: row['settleCoin'] for row in (*positions, *orders) if row.get('settleCoin')
+            }
+            for row in positions:
+                self._apply_position(row)
+            for row in orders:
+                self._apply_order(row)
+            for row in wallet:
+                self.wallet[row.get('accountType', 'UNIFIED')] = row
+            self.ready = True
+            self.updated_at = time.time()
+
+    def position_symbols(self, category=None):
+        with self._lock:
+            return {symbol for row_category, symbol, _ in self.positions if category in (None, row_category)}
+
+    @staticmethod
+    def _matches(row, category, settle_coin):
+        if category and row['category'] != category:
+            return False
+        return not settle_coin or row.get('settleCoin') == settle_coin
+
+    def _with_mark_price(self, row):
+        ticker = self.tickers.get(row['symbol']) if row['category'] == 'linear' else None
+        if not ticker or not ticker.get('markPrice'):
+            return row
+        row = dict(row)
+        mark_price = Decimal(ticker['markPrice'])
+        entry_price = Decimal(str(row.get('avgPrice') or '0'))
+        size = Decimal(str(row.get('size') or '0'))
+        direction = 1 if row.get('side') == 'Buy' else -1
+        row['markPrice'] = ticker['markPrice']
+        row['unrealisedPnl'] = str((mark_price - entry_price) * size * direction)
+        return row
+
+    @staticmethod
+    def _page(rows, limit, cursor):
+        # Cursors are plain offsets into the (stably sorted) local rows
+        start = int(cursor) if cursor else 0
+        if not limit:
+            return {'list': rows[start:], 'nextPageCursor': ''}
+        end = start + int(limit)
+        return {
+            'list': rows[start:end],
+            'nextPageCursor': str(end) if end < len(rows) else '',
+        }
+
+    def positions_response(self, category=None, settleCoin=None, limit=None, cursor=None, **_):
+        with self._lock:
+            rows = sorted(
+                (
+                    self._with_mark_price(row)
+                    for row in self.positions.values()
+                    if self._matches(row, category, settleCoin)
+                ),
+                key=lambda row: (row['symbol'], str(row.get('positionIdx', 0)))
+            )
+        return {'retCode': 0, 'retMsg': 'OK', 'result': self._page(rows, limit, cursor)}
+
+    def orders_response(self, category=None, settleCoin=None, limit=None, cursor=None, **_):
+        with self._lock:
+            rows = sorted(
+                (row for row in self.orders.values() if self._matches(row, category, settleCoin)),
+                key=lambda row: int(row.get('createdTime') or 0),
+                reverse=True
+            )
+        return {'retCode': 0, 'retMsg': 'OK', 'result': self._page(rows, limit, cursor)}
+
+    def wallet_response(self, accountType='UNIFIED', **_):
+        with self._lock:
+            rows = [self.wallet[accountType]] if accountType in self.wallet else []
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'list': rows}}
+
+
+class _ObservedWebSocket(WebSocket):
+    """pybit WebSocket that reports (re)connects and disconnects."""
+
+    on_connect = None
+    on_disconnect = None
+
+    def _on_open(self):
+        super()._on_open()
+        if self.on_connect:
+            self.on_connect()
+
+    def _on_close(self):
+        super()._on_close()
+        if self.on_disconnect:
+            self.on_disconnect()
+
+    def _on_error(self, error):
+        if self.on_disconnect:
+            self.on_disconnect()
+        super()._on_error(error)
+
+
+class LiveStream:
+    """Subscribes to Bybit's private and public streams and feeds an AccountState.
+
+    Every (re)connect of the private stream triggers a REST resync, since any
+    pushes missed while disconnected are gone for good.
+    """
+
+    def __init__(self, exchange, state, testnet=False, record_path=None):
+        self.exchange = exchange
+        self.state = state
+        self.testnet = testnet
+        self.record_path = record_path
+        self._record_lock = threading.Lock()
+        self._subscribe_lock = threading.Lock()
+        self._loop = None
+        self._private = None
+        self._public = None
+        self._ticker_symbols = set()
+        # Called with (symbol, ticker data) on every ticker push, on the socket thread
+        self.price_listeners = []
+
+    def _record(self, message):
+        if not self.record_path:
+            return
+        with self._record_lock, open(self.record_path, 'a') as f:
+            f.write(json.dumps(message) + '\n')
+
+    def _handle(self, message):
+        self._record(message)
+        self.state.apply(message)
+        topic = message.get('topic', '')
+        if topic == 'position':
+            self._subscribe_tickers(self.state.position_symbols('linear'))
+        elif topic.startswith('tickers.'):
+            for listener in self.price_listeners:
+                listener(topic.split('.', 1)[1], message.get('data', {}))
+
+    def _subscribe_tickers(self, symbols):
+        with self._subscribe_lock:
+            new_symbols = sorted(set(symbols) - self._ticker_symbols)
+            if not new_symbols or self._public is None:
+                return
+            self._ticker_symbols.update(new_symbols)
+        self._public.ticker_stream(symbol=new_symbols, callback=self._handle)
+
+    async def watch(self, symbols):
+        """Make sure ticker pushes arrive for ``symbols``."""
+        if self._public is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._subscribe_tickers, symbols)
+
+    def _connected(self):
+        self.state.connected = True
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.resync(), self._loop)
+
+    def _disconnected(self):
+        # Serve REST until the next resync has rebuilt the snapshot
+        self.state.connected = False
+        self.state.ready = False
+
+    async def _fetch_all(self, method, limit, **params):
+        rows = []
+        async for page in self.exchange.iter_pages(method, limit, **params):
+            rows.extend(page)
+        return rows
+
+    async def _fetch_scopes(self, method, limit, scopes):
+        """Every row of every scope, tagged with the category and settle coin it was listed under."""
+        results = await asyncio.gather(
+            *(self._fetch_all(method, limit, **scope_params(scope)) for scope in scopes)
+        )
+        rows = []
+        for (category, settle_coin), scope_rows in zip(scopes, results):
+            for row in scope_rows:
+                row['category'] = category
+                if settle_coin:
+                    row['settleCoin'] = settle_coin
+            rows += scope_rows
+        return rows
+
+    async def resync(self):
+        # Views list every category, so the snapshot covers every one of them;
+        # any scope failing leaves reads on REST until the next resync
+        try:
+            positions, orders, wallet = await asyncio.gather(
+                self._fetch_scopes('get_positions', PAGE_LIMITS['positions'], POSITION_SCOPES),
+                self._fetch_scopes('get_open_orders', PAGE_LIMITS['orders'], ORDER_SCOPES),
+                self.exchange.call('get_wallet_balance', accountType="UNIFIED"),
+            )
+        except Exception as e:
+            logging.error(f"Error resyncing live state: {str(e)}")
+            return
+        self.state.load_snapshot(
+            positions=positions,
+            orders=orders,
+            wallet=wallet['result']['list'],
+        )
+        # The public socket is the linear channel; other categories keep their REST marks
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._subscribe_tickers, self.state.position_symbols('linear')
+        )
+        logging.info("Live account state resynced")
+
+    def _connect(self, api_key, api_secret):
+        self._public = _ObservedWebSocket(channel_type="linear", testnet=self.testnet)
+        private = _ObservedWebSocket(
+            channel_type="private",
+            testnet=self.testnet,
+            api_key=api_key,
+            api_secret=api_secret
+        )
+        private.on_connect = self._connected
+        private.on_disconnect = self._disconnected
+        private.position_stream(self._handle)
+        private.order_stream(self._handle)
+        private.wallet_stream(self._handle)
+        self._private = private
+        # The first open happened inside the constructor, before the hooks existed
+        self._connected()
+
+    async def start(self, api_key, api_secret):
+        self._loop = asyncio.get_running_loop()
+        await self._loop.run_in_executor(None, self._connect, api_key, api_secret)
+
+    def stop(self):
+        for ws in (self._private, self._public):
+            if ws is not None:
+                ws.on_connect = ws.on_disconnect = None
+                ws.exit()
+        self.state.connected = False
+
+
+class ReplayStream:
+    """Feeds recorded stream messages (one JSON object per line) into an AccountState.
+
+    Files written by LiveStream with LIVE_STATE_RECORD can be replayed offline.
+    """
+
+    def __init__(self, state, messages):
+        self.state = state
+        self.messages = messages
+
+    @classmethod
+    def from_file(cls, state, path):
+        with open(path) as f:
+            return cls(state, [json.loads(line) for line in f if line.strip()])
+
+    def replay(self, speed=None, on_message=None):
+        """Apply every message in order; with ``speed`` honour their timestamps scaled by it."""
+        previous_ts = None
+        self.state.ready = self.state.connected = True
+        for message in self.messages:
+            ts = message.get('creationTime') or message.get('ts')
+            if speed and ts and previous_ts:
+                time.sleep(max(0, (ts - previous_ts) / 1000 / speed))
+            previous_ts = ts or previous_ts
+            self.state.apply(message)
+            if on_message:
+                on_message(message)
+        return len(self.messages)
@@ -0,0 +1,198 @@
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from aiohttp import web
+from telegram.ext import ConversationHandler
+
+# Upper bounds in seconds; wide enough for fast renders and slow exchange calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_INTERVAL = 0.5
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_values, value in self.values.items():
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; an observation is one bisect and two additions."""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(self.labels + ('le',), label_values + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from ``collect()``, which returns {label values: value}."""
+
+    def __init__(self, name, help, collect, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.collect()
+        except Exception as e:
+            logging.error(f"Error collecting {self.name}: {str(e)}")
+            values = {}
+        for label_values, value in values.items():
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds', 'Time spent handling an update, by handler callback', ('handler',)
+)
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Handler callbacks that raised', ('handler',))
+BYBIT_SECONDS = Histogram(
+    'bybit_call_seconds', 'Bybit call latency including queueing for rate limit budget', ('method',)
+)
+BYBIT_REQUEST_SECONDS = Histogram(
+    'bybit_request_seconds', 'Bybit HTTP round trip alone, on a worker thread', ('method',)
+)
+BYBIT_CALLS = Counter('bybit_calls_total', 'Bybit calls by method and retCode', ('method', 'ret_code'))
+BYBIT_RETRIES = Counter('bybit_retries_total', 'Bybit calls retried after a transient failure', ('method',))
+BYBIT_STALE = Counter('bybit_stale_reads_total', 'Reads answered from an expired snapshot while Bybit failed', ('kind',))
+MONITOR_MESSAGES = Counter('bot_monitor_messages_total', 'Digests and alerts sent by the portfolio monitor', ('kind',))
+MONITOR_SECONDS = Histogram(
+    'bot_monitor_run_seconds', 'Time one portfolio monitor run took, snapshots included',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+TELEGRAM_SECONDS = Histogram(
+    'telegram_request_seconds', 'Telegram Bot API round trip, excluding time waiting for send budget', ('endpoint',)
+)
+TELEGRAM_WAIT_SECONDS = Histogram(
+    'telegram_wait_seconds', 'Time a Telegram request waited for send budget', ('endpoint',)
+)
+LOOP_LAG_SECONDS = Histogram(
+    'event_loop_lag_seconds', 'How late the event loop woke a sleeping task',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+
+def instrument(callback):
+    """Wrap a handler callback so its latency and failures are recorded."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_handlers(handlers):
+    """Instrument every callback of ``handlers``, descending into ConversationHandlers."""
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            instrument_handlers(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+        elif not getattr(handler.callback, 'instrumented', False):
+            # Safe to call again, e.g. after adding more handlers
+            handler.callback = instrument(handler.callback)
+
+
+async def watch_loop_lag(interval=LOOP_LAG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+class MetricsServer:
+    """Serves the metrics in Prometheus text format on ``/metrics``."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._runner = None
+        self._lag_task = None
+
+    async def _metrics(self, request):
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.get_running_loop().create_task(watch_loop_lag())
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
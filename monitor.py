@@ -0,0 +1,294 @@
+import os
+import time
+import asyncio
+import logging
+from analytics import account_totals
+from portfolio import fetch_positions, SCOPE_LABELS
+
+# Seconds between monitor runs; every run takes one snapshot per account
+MONITOR_INTERVAL = float(os.getenv('MONITOR_INTERVAL', '60'))
+# Accounts snapshotted at once; each one still queues behind its own rate limits
+MONITOR_CONCURRENCY = int(os.getenv('MONITOR_CONCURRENCY', '16'))
+
+# Thresholds /monitor starts with, as fractions: maintenance margin over
+# equity, equity below its peak, and funding paid per funding interval
+DEFAULT_THRESHOLDS = {'margin': 0.5, 'drawdown': 0.1, 'funding': 0.001}
+DIGEST_HOURS = (0.25, 168)
+# Equity moves smaller than this do not make a digest worth sending on their own
+DIGEST_MIN_EQUITY_CHANGE = 0.001
+# Categories whose tickers carry funding rates
+FUNDING_CATEGORIES = ('linear', 'inverse')
+
+
+def position_key(row):
+    return (row['category'], row['symbol'], row.get('side') or '')
+
+
+class Snapshot:
+    """What the monitor knows about one account at one point in time."""
+
+    __slots__ = ('equity', 'maintenance_margin', 'unrealised_pnl', 'positions', 'failed', 'taken_at')
+
+    def __init__(self, wallet, rows, failed=(), taken_at=None):
+        totals = account_totals(wallet)
+        self.equity = totals['equity']
+        self.maintenance_margin = totals['maintenance_margin']
+        self.unrealised_pnl = sum(float(row.get('unrealisedPnl') or 0) for row in rows)
+        self.positions = {position_key(row): row for row in rows}
+        self.failed = list(failed)
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+    @property
+    def margin_ratio(self):
+        return self.maintenance_margin / self.equity if self.equity > 0 else 0.0
+
+    def sizes(self):
+        return {key: row.get('sizeText') or row.get('size') for key, row in self.positions.items()}
+
+
+class Subscription:
+    """One user's digest schedule, alert thresholds and what they were last told.
+
+    ``alerts`` holds the conditions currently reported as breached, so a
+    condition is announced when it starts and when it clears, never on
+    every run in between. ``digest`` holds the figures of the last digest
+    sent, the baseline the next one reports changes against.
+    """
+
+    __slots__ = (
+        'user_id', 'chat_id', 'digest_hours', 'next_digest', 'thresholds',
+        'peak_equity', 'alerts', 'digest',
+    )
+
+    def __init__(self, user_id, chat_id, digest_hours=None, next_digest=None, thresholds=None,
+                 peak_equity=None, alerts=(), digest=None):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.digest_hours = digest_hours
+        self.next_digest = next_digest
+        self.thresholds = dict(thresholds or {})
+        self.peak_equity = peak_equity
+        self.alerts = {tuple(key) for key in alerts}
+        self.digest = digest
+
+    @property
+    def active(self):
+        return self.digest_hours is not None or bool(self.thresholds)
+
+    def to_record(self):
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record['alerts'] = sorted(self.alerts)
+        return record
+
+
+class Notice:
+    """An alert raised or cleared; ``cleared`` notices tell the user a condition is over."""
+
+    __slots__ = ('kind', 'text', 'cleared')
+
+    def __init__(self, kind, text, cleared=False):
+        self.kind = kind
+        self.text = text
+        self.cleared = cleared
+
+
+def _pct(value):
+    return f"{value * 100:.2f}".rstrip('0').rstrip('.') + '%'
+
+
+class PortfolioMonitor:
+    """Decides which digests and threshold alerts are due for a snapshot.
+
+    The monitor holds no exchange or Telegram handles: ``evaluate`` takes
+    a snapshot and funding rates and returns what to send, so one snapshot
+    serves every subscriber sharing an account. Only changes against what
+    each subscriber was last told come back.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscription(self, user_id, chat_id):
+        subscription = self.subscriptions.get(user_id)
+        if subscription is None:
+            subscription = self.subscriptions[user_id] = Subscription(user_id, chat_id)
+        subscription.chat_id = chat_id
+        return subscription
+
+    def set_digest(self, user_id, chat_id, hours, now=None):
+        """Send a digest every ``hours``, starting with the next run; None turns digests off."""
+        subscription = self.subscription(user_id, chat_id)
+        subscription.digest_hours = hours
+        subscription.next_digest = (now if now is not None else time.time()) if hours is not None else None
+        subscription.digest = None
+        self._drop_inactive(user_id)
+        return subscription
+
+    def set_thresholds(self, user_id, chat_id, thresholds):
+        """Replace the alert thresholds; a new peak and alert state start from the next run."""
+        subscription = self.subscription(user_id, chat_id)
+        subscription.thresholds = {kind: value for kind, value in thresholds.items() if value is not None}
+        subscription.peak_equity = None
+        subscription.alerts = set()
+        self._drop_inactive(user_id)
+        return subscription
+
+    def _drop_inactive(self, user_id):
+        if not self.subscriptions[user_id].active:
+            del self.subscriptions[user_id]
+
+    def needs_funding(self):
+        return any('funding' in subscription.thresholds for subscription in self.subscriptions.values())
+
+    def evaluate(self, subscription, snapshot, funding_rates=None, now=None):
+        """(notices, digest) for ``subscription``; digest is None unless one is due and something changed."""
+        now = now if now is not None else time.time()
+        notices = self._check_thresholds(subscription, snapshot, funding_rates or {})
+        digest = None
+        if subscription.next_digest is not None and now >= subscription.next_digest:
+            subscription.next_digest = max(subscription.next_digest + subscription.digest_hours * 3600, now)
+            digest = self._digest(subscription, snapshot)
+        return notices, digest
+
+    def _breaches(self, subscription, snapshot, funding_rates):
+        """Conditions breached now, as {key: (kind, text)}."""
+        thresholds = subscription.thresholds
+        breaches = {}
+        if 'margin' in thresholds and snapshot.equity > 0 and snapshot.margin_ratio >= thresholds['margin']:
+            breaches[('margin',)] = (
+                'margin',
+                f"⚠️ Margin ratio at {_pct(snapshot.margin_ratio)} "
+                f"(alert at {_pct(thresholds['margin'])}); liquidation starts at 100%"
+            )
+        if 'drawdown' in thresholds and subscription.peak_equity:
+            drawdown = 1 - snapshot.equity / subscription.peak_equity
+            if drawdown >= thresholds['drawdown']:
+                breaches[('drawdown',)] = (
+                    'drawdown',
+                    f"📉 Equity {snapshot.equity:,.2f} is {_pct(drawdown)} below its peak "
+                    f"of {subscription.peak_equity:,.2f} (alert at {_pct(thresholds['drawdown'])})"
+                )
+        if 'funding' in thresholds:
+            for key, row in snapshot.positions.items():
+                rate = funding_rates.get((row['category'], row['symbol']))
+                if rate is None:
+                    continue
+                # Longs pay positive funding, shorts pay negative funding
+                paid = rate if row.get('side') == 'Buy' else -rate
+                if paid >= thresholds['funding']:
+                    breaches[('funding',) + key] = (
+                        'funding',
+                        f"💸 {row['symbol']} {'long' if row.get('side') == 'Buy' else 'short'} "
+                        f"pays {_pct(paid)} funding per interval (alert at {_pct(thresholds['funding'])})"
+                    )
+        return breaches
+
+    def _check_thresholds(self, subscription, snapshot, funding_rates):
+        if not subscription.thresholds:
+            return []
+        if snapshot.equity > (subscription.peak_equity or 0):
+            subscription.peak_equity = snapshot.equity
+        breaches = self._breaches(subscription, snapshot, funding_rates)
+        notices = [Notice(kind, text) for key, (kind, text) in breaches.items() if key not in subscription.alerts]
+        for key in sorted(subscription.alerts - set(breaches)):
+            if key[0] == 'funding' and key[1:] not in snapshot.positions:
+                # The position is gone; that is news for the digest, not an all-clear
+                continue
+            notices.append(Notice(key[0], self._cleared_text(key, snapshot), cleared=True))
+        subscription.alerts = set(breaches)
+        return notices
+
+    @staticmethod
+    def _cleared_text(key, snapshot):
+        if key[0] == 'margin':
+            return f"✅ Margin ratio back to {_pct(snapshot.margin_ratio)}"
+        if key[0] == 'drawdown':
+            return f"✅ Equity recovered to {snapshot.equity:,.2f}"
+        return f"✅ {key[2]} funding is back under the alert level"
+
+    def _digest(self, subscription, snapshot):
+        """Changes since the last digest, or None when there are none worth a message."""
+        previous = subscription.digest
+        sizes = snapshot.sizes()
+        subscription.digest = {
+            'equity': snapshot.equity,
+            'sizes': [[list(key), size] for key, size in sizes.items()],
+            'sent_at': snapshot.taken_at,
+        }
+        if previous is None:
+            return {'snapshot': snapshot, 'previous_equity': None, 'opened': [], 'closed': [], 'resized': [],
+                    'since': None}
+
+        before = {tuple(key): size for key, size in previous['sizes']}
+        opened = [key for key in sizes if key not in before]
+        closed = [key for key in before if key not in sizes]
+        resized = [(key, before[key], sizes[key]) for key in sizes if key in before and before[key] != sizes[key]]
+        equity_change = abs(snapshot.equity - previous['equity']) / previous['equity'] if previous['equity'] else 1
+        if not (opened or closed or resized) and equity_change < DIGEST_MIN_EQUITY_CHANGE:
+            # Keep the old baseline so slow drift still shows up eventually
+            subscription.digest = previous
+            return None
+        return {
+            'snapshot': snapshot,
+            'previous_equity': previous['equity'],
+            'opened': opened,
+            'closed': closed,
+            'resized': resized,
+            'since': previous['sent_at'],
+        }
+
+    def export(self):
+        return [subscription.to_record() for subscription in self.subscriptions.values()]
+
+    def load(self, records):
+        for record in records:
+            subscription = Subscription(**record)
+            if subscription.active:
+                self.subscriptions[subscription.user_id] = subscription
+
+
+async def take_snapshot(exchange):
+    wallet, (rows, failed) = await asyncio.gather(
+        exchange.get_wallet_balance(accountType="UNIFIED"),
+        fetch_positions(exchange)
+    )
+    return Snapshot(wallet, rows, [SCOPE_LABELS[scope] for scope in failed])
+
+
+async def funding_rates(exchange, categories=FUNDING_CATEGORIES):
+    """{(category, symbol): funding rate} from one ticker request per category."""
+    responses = await asyncio.gather(
+        *(exchange.get_tickers(category=category) for category in categories),
+        return_exceptions=True
+    )
+    rates = {}
+    for category, response in zip(categories, responses):
+        if isinstance(response, Exception):
+            logging.error(f"Error fetching {category} funding rates: {str(response)}")
+            continue
+        for ticker in response.get('result', {}).get('list', []):
+            if ticker.get('fundingRate'):
+                rates[(category, ticker['symbol'])] = float(ticker['fundingRate'])
+    return rates
+
+
+async def snapshot_accounts(accounts, concurrency=MONITOR_CONCURRENCY):
+    """{account: Snapshot} for every account in ``accounts``, ``concurrency`` at a time.
+
+    An account whose snapshot fails is left out and logged; its
+    subscribers hear nothing until the next run succeeds.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def snapshot(account):
+        async with semaphore:
+            return await take_snapshot(account)
+
+    results = await asyncio.gather(*(snapshot(account) for account in accounts), return_exceptions=True)
+    snapshots = {}
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error taking a monitor snapshot: {str(result)}")
+            continue
+        snapshots[account] = result
+    return snapshots
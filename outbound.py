@@ -0,0 +1,217 @@
+import time
+import json
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+from ratelimit import TokenBucket
+from metrics import TELEGRAM_SECONDS, TELEGRAM_WAIT_SECONDS
+
+# Telegram's documented flood limits: ~30 messages a second overall, about
+# one a second in a private chat and 20 a minute in a group
+OVERALL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+# Short bursts a chat may send at once, e.g. a view split over several messages
+CHAT_BURST = 3
+
+EDIT_ENDPOINTS = {'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'}
+# Remember the last content of this many edited messages
+MAX_TRACKED_MESSAGES = 10000
+MAX_IDLE_CHAT_BUCKETS = 1000
+
+
+class _PendingEdit:
+    """An edit waiting for budget; newer edits of the same message replace its content."""
+
+    __slots__ = ('args', 'kwargs', 'data', 'future', 'shared')
+
+    def __init__(self, args, kwargs, data):
+        self.args = args
+        self.kwargs = kwargs
+        self.data = data
+        self.future = asyncio.get_running_loop().create_future()
+        self.shared = False
+
+
+class OutboundThrottler(BaseRateLimiter):
+    """Paces every Bot API request through an overall and a per-chat token bucket.
+
+    Edits get extra treatment: while an edit of a message waits for budget,
+    later edits of the same message only replace its content, so a burst of
+    Refresh taps turns into one request. An edit identical to the last
+    content sent for that message is answered locally, and Telegram's
+    "message is not modified" error is treated as success. RetryAfter
+    blocks the affected bucket for the requested time and the request is
+    retried, up to ``max_retries`` times.
+    """
+
+    def __init__(self, overall_rate=OVERALL_RATE, private_rate=PRIVATE_CHAT_RATE,
+                 group_rate=GROUP_CHAT_RATE, chat_burst=CHAT_BURST, max_retries=3):
+        self.overall_rate = overall_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._overall = None
+        self._chats = {}
+        self._pending_edits = {}
+        self._edit_locks = {}
+        # message -> edits holding or waiting for the message's lock
+        self._edit_users = {}
+        self._sent = OrderedDict()
+        self.coalesced = 0
+        self.skipped = 0
+        self.retried = 0
+
+    async def initialize(self):
+        # Same split as the Bybit scheduler: no one-second window sees more than the rate
+        burst = max(1, int(self.overall_rate) // 5)
+        self._overall = TokenBucket(max(self.overall_rate - burst, 1), burst)
+
+    async def shutdown(self):
+        self._chats.clear()
+        self._pending_edits.clear()
+        self._edit_locks.clear()
+        self._edit_users.clear()
+        self._sent.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_CHAT_BUCKETS:
+                self._drop_idle_buckets()
+            # Negative ids and @usernames are groups and channels
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = TokenBucket(
+                self.group_rate if group else self.private_rate, self.chat_burst
+            )
+        return bucket
+
+    def _drop_idle_buckets(self):
+        # A bucket that has refilled completely carries no state worth keeping
+        now = time.monotonic()
+        for chat_id, bucket in list(self._chats.items()):
+            if now - bucket.updated >= bucket.capacity / bucket.rate and not bucket._lock.locked():
+                del self._chats[chat_id]
+
+    @staticmethod
+    def _chat_id(data):
+        chat_id = data.get('chat_id')
+        try:
+            return int(chat_id)
+        except (TypeError, ValueError):
+            return chat_id
+
+    @staticmethod
+    def _content_hash(endpoint, data):
+        content = {key: value for key, value in data.items() if key not in ('chat_id', 'message_id')}
+        encoded = json.dumps(
+            [endpoint, content],
+            sort_keys=True,
+            default=lambda value: value.to_dict() if hasattr(value, 'to_dict') else str(value)
+        )
+        return hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+
+    def _remember(self, message_key, content_hash):
+        self._sent[message_key] = content_hash
+        self._sent.move_to_end(message_key)
+        if len(self._sent) > MAX_TRACKED_MESSAGES:
+            self._sent.popitem(last=False)
+
+    async def _send(self, callback, args, kwargs, endpoint, chat_id, max_retries, before_send=None):
+        for attempt in range(max_retries + 1):
+            start = time.perf_counter()
+            bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+            if bucket is not None:
+                await bucket.take()
+            await self._overall.take()
+            sent = time.perf_counter()
+            TELEGRAM_WAIT_SECONDS.observe(sent - start, endpoint)
+            if before_send is not None:
+                args, kwargs, done, result = before_send()
+                if done:
+                    return result
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    raise
+                self.retried += 1
+                blocked = bucket if bucket is not None else self._overall
+                blocked.blocked_until = max(blocked.blocked_until, time.monotonic() + float(e.retry_after) + 0.1)
+                logging.warning(f"Telegram flood limit hit for chat {chat_id}, retrying in {e.retry_after}s")
+            finally:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - sent, endpoint)
+
+    async def _send_edit(self, callback, args, kwargs, endpoint, data, max_retries):
+        chat_id = self._chat_id(data)
+        message_key = (chat_id, data.get('message_id'), data.get('inline_message_id'))
+        edit_key = (endpoint,) + message_key
+
+        pending = self._pending_edits.get(edit_key)
+        if pending is not None:
+            # Still waiting for budget: let that request carry this newer content
+            pending.args, pending.kwargs, pending.data = args, kwargs, data
+            pending.shared = True
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+
+        pending = self._pending_edits[edit_key] = _PendingEdit(args, kwargs, data)
+        content_hash = None
+
+        def before_send():
+            nonlocal content_hash
+            # From here on a newer edit queues behind this one instead of merging
+            if self._pending_edits.get(edit_key) is pending:
+                del self._pending_edits[edit_key]
+            content_hash = self._content_hash(endpoint, pending.data)
+            if self._sent.get(message_key) == content_hash:
+                self.skipped += 1
+                return pending.args, pending.kwargs, True, True
+            return pending.args, pending.kwargs, False, None
+
+        # Edits of one message go out in order, so an older one can never land last
+        lock = self._edit_locks.get(message_key)
+        if lock is None:
+            lock = self._edit_locks[message_key] = asyncio.Lock()
+        self._edit_users[message_key] = self._edit_users.get(message_key, 0) + 1
+        try:
+            async with lock:
+                try:
+                    result = await self._send(callback, args, kwargs, endpoint, chat_id, max_retries, before_send)
+                except BadRequest as e:
+                    if 'not modified' not in str(e).lower():
+                        raise
+                    result = True
+                self._remember(message_key, content_hash)
+            pending.future.set_result(result)
+            return result
+        except BaseException as e:
+            if self._pending_edits.get(edit_key) is pending:
+                del self._pending_edits[edit_key]
+            if pending.shared:
+                pending.future.set_exception(e)
+            else:
+                pending.future.cancel()
+            raise
+        finally:
+            self._edit_users[message_key] -= 1
+            if not self._edit_users[message_key]:
+                del self._edit_users[message_key]
+                self._edit_locks.pop(message_key, None)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args if rate_limit_args is not None else self.max_retries
+        if endpoint in EDIT_ENDPOINTS:
+            return await self._send_edit(callback, args, kwargs, endpoint, data, max_retries)
+        if endpoint == 'answerCallbackQuery':
+            # Not a message; holding it back would only leave the button spinning
+            start = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            finally:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - start, endpoint)
+        return await self._send(callback, args, kwargs, endpoint, self._chat_id(data), max_retries)
@@ -0,0 +1,265 @@
+import json
+import pickle
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from telegram.ext import BasePersistence, PersistenceInput
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+class SQLitePersistence(BasePersistence):
+    """Stores user, chat and bot data and conversation states in one SQLite file.
+
+    The Application already collects changes and hands them over once every
+    ``update_interval`` seconds; all writes of such a round are buffered and
+    committed in a single transaction on a dedicated thread, so persistence
+    never adds a disk write to the handling of an update.
+    """
+
+    def __init__(self, filepath, store_data=None, update_interval=5):
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval
+        )
+        self.filepath = filepath
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistence')
+        self._connection = None
+        self._pending = {}
+        self._write_task = None
+        # Conversation name -> keys of the chats part way through it
+        self._in_flight = {}
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # Reads happen once at startup
+
+    def _load_kind(self, kind):
+        rows = self._connect().execute('SELECT key, value FROM data WHERE kind = ?', (kind,))
+        return {int(key): pickle.loads(value) for key, value in rows}
+
+    def _load_one(self, kind, key):
+        row = self._connect().execute(
+            'SELECT value FROM data WHERE kind = ? AND key = ?', (kind, key)
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _load_conversations(self, name):
+        rows = self._connect().execute('SELECT key, state FROM conversations WHERE name = ?', (name,))
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def get_user_data(self):
+        return await self._run(self._load_kind, 'user')
+
+    async def get_chat_data(self):
+        return await self._run(self._load_kind, 'chat')
+
+    async def get_bot_data(self):
+        return await self._run(self._load_one, 'bot', '') or {}
+
+    async def get_callback_data(self):
+        return await self._run(self._load_one, 'callback', '')
+
+    async def get_conversations(self, name):
+        conversations = await self._run(self._load_conversations, name)
+        self._in_flight[name] = set(conversations)
+        return conversations
+
+    def conversations_in_flight(self):
+        """Chats part way through each conversation, as of the last persistence round."""
+        return {name: len(keys) for name, keys in self._in_flight.items()}
+
+    # Writes are buffered per key and committed together
+
+    def _queue(self, table, kind, key, value):
+        self._pending[(table, kind, key)] = value
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self):
+        # Let the rest of this persistence round queue its writes first
+        await asyncio.sleep(0)
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            await self._run(self._commit, pending)
+
+    def _commit(self, pending):
+        connection = self._connect()
+        with connection:
+            for (table, kind, key), value in pending.items():
+                if table == 'data' and value is None:
+                    connection.execute('DELETE FROM data WHERE kind = ? AND key = ?', (kind, key))
+                elif table == 'data':
+                    connection.execute(
+                        'INSERT OR REPLACE INTO data (kind, key, value) VALUES (?, ?, ?)',
+                        (kind, key, pickle.dumps(value))
+                    )
+                elif value is None:
+                    connection.execute('DELETE FROM conversations WHERE name = ? AND key = ?', (kind, key))
+                else:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                        (kind, key, pickle.dumps(value))
+                    )
+
+    async def update_user_data(self, user_id, data):
+        self._queue('data', 'user', str(user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._queue('data', 'chat', str(chat_id), data)
+
+    async def update_bot_data(self, data):
+        self._queue('data', 'bot', '', data)
+
+    async def update_callback_data(self, data):
+        self._queue('data', 'callback', '', data)
+
+    async def update_conversation(self, name, key, new_state):
+        keys = self._in_flight.setdefault(name, set())
+        if new_state is None:
+            keys.discard(key)
+        else:
+            keys.add(key)
+        self._queue('conversations', name, json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id):
+        self._queue('data', 'user', str(user_id), None)
+
+    async def drop_chat_data(self, chat_id):
+        self._queue('data', 'chat', str(chat_id), None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        if self._pending:
+            await self._run(self._commit, self._pending)
+            self._pending = {}
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=False)
+
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+
+class SharedPersistence(SQLitePersistence):
+    """SQLitePersistence for several worker processes sharing one file.
+
+    Each chat is handled by exactly one worker, so conversation states
+    need nothing extra. User data is different: a user's private chat and
+    a group they write in may live on different workers. Every user data
+    write bumps a version, and before an update is handled its user's data
+    is reloaded if another worker wrote a newer version. User data that
+    did not change is never written, so a worker that merely read it
+    cannot overwrite a newer copy. Bot data is stored only by the worker
+    that owns the bot-wide jobs; the others run with ``store_bot_data``
+    off.
+    """
+
+    def __init__(self, filepath, update_interval=5, store_bot_data=True):
+        super().__init__(
+            filepath,
+            store_data=PersistenceInput(bot_data=store_bot_data, callback_data=False),
+            update_interval=update_interval
+        )
+        # (kind, key) -> (version, pickled value) as this process last saw it
+        self._seen = {}
+
+    def _connect(self):
+        if self._connection is None:
+            super()._connect().executescript(SHARED_SCHEMA)
+        return self._connection
+
+    def _load_kind(self, kind):
+        rows = self._connect().execute(
+            'SELECT d.key, d.value, v.version FROM data d LEFT JOIN versions v ON v.kind = d.kind AND v.key = d.key '
+            'WHERE d.kind = ?',
+            (kind,)
+        )
+        loaded = {}
+        for key, value, version in rows:
+            self._seen[(kind, key)] = (version or 0, value)
+            loaded[int(key)] = pickle.loads(value)
+        return loaded
+
+    def _load_newer(self, kind, key):
+        version, _ = self._seen.get((kind, key), (0, None))
+        row = self._connect().execute(
+            'SELECT v.version, d.value FROM versions v JOIN data d ON d.kind = v.kind AND d.key = v.key '
+            'WHERE v.kind = ? AND v.key = ? AND v.version > ?',
+            (kind, key, version)
+        ).fetchone()
+        if row is None:
+            return None
+        self._seen[(kind, key)] = row
+        return pickle.loads(row[1])
+
+    def _queue(self, table, kind, key, value):
+        if table == 'data' and kind == 'user' and value is not None:
+            pickled = pickle.dumps(value)
+            if self._seen.get((kind, key), (None, None))[1] == pickled:
+                return
+        super()._queue(table, kind, key, value)
+
+    def _commit(self, pending):
+        super()._commit(pending)
+        connection = self._connect()
+        with connection:
+            for (table, kind, key), value in pending.items():
+                if table != 'data' or kind != 'user':
+                    continue
+                connection.execute(
+                    'INSERT INTO versions (kind, key, version) VALUES (?, ?, 1) '
+                    'ON CONFLICT (kind, key) DO UPDATE SET version = version + 1',
+                    (kind, key)
+                )
+                version = connection.execute(
+                    'SELECT version FROM versions WHERE kind = ? AND key = ?', (kind, key)
+                ).fetchone()[0]
+                self._seen[(kind, key)] = (version, pickle.dumps(value) if value is not None else None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        newer = await self._run(self._load_newer, 'user', str(user_id))
+        if newer is not None:
+            user_data.clear()
+            user_data.update(newer)
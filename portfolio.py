@@ -0,0 +1,271 @@
+import heapq
+import asyncio
+import logging
+from analytics import base_coin
+
+# (category, settleCoin) pairs that together cover a unified account; linear
+# endpoints need a settle coin, the others list everything without one
+POSITION_SCOPES = (('linear', 'USDT'), ('linear', 'USDC'), ('inverse', None), ('option', None))
+ORDER_SCOPES = (('linear', 'USDT'), ('linear', 'USDC'), ('inverse', None), ('spot', None), ('option', None))
+SCOPE_LABELS = {
+    ('linear', 'USDT'): 'USDT Perp',
+    ('linear', 'USDC'): 'USDC Perp',
+    ('inverse', None): 'Inverse',
+    ('spot', None): 'Spot',
+    ('option', None): 'Option',
+}
+CATEGORY_LABELS = {
+    'linear': 'Perpetuals',
+    'inverse': 'Inverse',
+    'spot': 'Spot',
+    'option': 'Options',
+}
+# Largest page each list endpoint serves
+PAGE_LIMITS = {'positions': 200, 'orders': 50}
+
+
+def scope_params(scope, **params):
+    category, settle_coin = scope
+    params['category'] = category
+    if settle_coin:
+        params['settleCoin'] = settle_coin
+    return params
+
+
+def linear_settle_coin(symbol):
+    """Settle coin of a linear contract from its symbol: USDT contracts name
+    their quote, USDC perpetuals end in PERP and USDC futures name neither."""
+    return 'USDT' if 'USDT' in symbol else 'USDC'
+
+
+def normalize_position(row, scope):
+    """One position in the shape every view uses, whatever its category.
+
+    Inverse contracts are sized in USD and settle PnL and margin in the
+    base coin; they are restated in coin size and USD so numbers add up
+    across categories. The original size is kept in ``sizeText``.
+    """
+    category, settle_coin = scope
+    row = dict(row, category=category, market=SCOPE_LABELS[scope])
+    row['settleCoin'] = row.get('settleCoin') or settle_coin or base_coin(row['symbol'])
+    row['sizeText'] = row.get('size') or '0'
+    if category == 'inverse':
+        # Without a mark, e.g. from a stream push, the entry price is the closest rate at hand
+        mark_price = float(row.get('markPrice') or row.get('avgPrice') or 0)
+        if mark_price > 0:
+            row['size'] = str(float(row.get('size') or 0) / mark_price)
+            row['unrealisedPnl'] = str(float(row.get('unrealisedPnl') or 0) * mark_price)
+            if row.get('positionIM') not in (None, '', 'N/A'):
+                row['positionIM'] = str(float(row['positionIM']) * mark_price)
+        row['sizeText'] += ' USD'
+    return row
+
+
+def normalize_order(row, scope):
+    return dict(row, category=scope[0], market=SCOPE_LABELS[scope])
+
+
+async def fetch_scope(fetch, scope, limit, **params):
+    """Every row of one category, following nextPageCursor."""
+    rows = []
+    cursor = None
+    while True:
+        page_params = scope_params(scope, limit=limit, **params)
+        if cursor:
+            page_params['cursor'] = cursor
+        response = await fetch(**page_params)
+        result = response.get('result', {})
+        page = result.get('list', [])
+        rows += page
+        cursor = result.get('nextPageCursor')
+        if not cursor or len(page) < limit:
+            return rows
+
+
+async def fan_out(fetch, scopes, limit, normalize, **params):
+    """Fetch all ``scopes`` at once, so the slowest one sets the latency.
+
+    Returns the merged, normalized rows and the scopes that failed; one
+    category being unavailable never hides the others.
+    """
+    results = await asyncio.gather(
+        *(fetch_scope(fetch, scope, limit, **params) for scope in scopes),
+        return_exceptions=True
+    )
+    rows = []
+    failed = []
+    for scope, result in zip(scopes, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error fetching {SCOPE_LABELS[scope]} rows: {str(result)}")
+            failed.append(scope)
+            continue
+        rows += [normalize(row, scope) for row in result]
+    return rows, failed
+
+
+def is_open(row):
+    return float(row.get('size') or 0) > 0
+
+
+def newest_first(row):
+    return -int(row.get('createdTime') or 0)
+
+
+async def fetch_positions(exchange, scopes=POSITION_SCOPES):
+    """Every open position of every scope, for views that need the whole book."""
+    rows, failed = await fan_out(exchange.get_positions, scopes, PAGE_LIMITS['positions'], normalize_position)
+    rows = [row for row in rows if is_open(row)]
+    order = {scope[0]: i for i, scope in enumerate(scopes)}
+    rows.sort(key=lambda row: (order.get(row['category'], len(order)), row['settleCoin'], row['symbol']))
+    return rows, failed
+
+
+async def sample_orders(exchange, scopes=ORDER_SCOPES):
+    """The newest page of open orders of every scope.
+
+    Returns the rows, the scopes that list more orders than that and the
+    scopes that failed.
+    """
+    limit = PAGE_LIMITS['orders']
+    results = await asyncio.gather(
+        *(read_scope(exchange.get_open_orders, scope, limit, ['', 0]) for scope in scopes),
+        return_exceptions=True
+    )
+    rows = []
+    more = []
+    failed = []
+    for scope, result in zip(scopes, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error fetching {SCOPE_LABELS[scope]} rows: {str(result)}")
+            failed.append(scope)
+            continue
+        pages, next_cursor = result
+        rows += [normalize_order(row, scope) for _, page in pages for row in page]
+        if next_cursor:
+            more.append(scope)
+    rows.sort(key=newest_first)
+    return rows, more, failed
+
+
+async def cancel_orders(exchange, category=None, symbol=None):
+    """Cancel open orders of one symbol, one category or everywhere.
+
+    Returns the number of orders cancelled and the scopes that failed.
+    """
+    if symbol is not None:
+        # Reported by the scope the symbol settles in, e.g. USDC Perp for BTCPERP
+        scopes = [(category, linear_settle_coin(symbol) if category == 'linear' else None)]
+        requests = [dict(category=category, symbol=symbol)]
+    else:
+        scopes = [scope for scope in ORDER_SCOPES if category is None or scope[0] == category]
+        requests = [scope_params(scope) for scope in scopes]
+    results = await asyncio.gather(
+        *(exchange.cancel_all_orders(**params) for params in requests),
+        return_exceptions=True
+    )
+    cancelled = 0
+    failed = []
+    for scope, result in zip(scopes, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error cancelling {SCOPE_LABELS[scope]} orders: {str(result)}")
+            failed.append(scope)
+        elif result.get('retCode') != 0:
+            logging.error(f"Error cancelling {SCOPE_LABELS[scope]} orders: {result.get('retMsg')}")
+            failed.append(scope)
+        else:
+            cancelled += len(result.get('result', {}).get('list', []))
+    return cancelled, failed
+
+
+def first_page_starts(scopes):
+    """Where the first page begins in each scope: [cursor, rows of that cursor's page already shown]."""
+    return [['', 0] for _ in scopes]
+
+
+async def read_scope(fetch, scope, page_size, start):
+    """Enough pages of one scope, from ``start``, to fill a page on its own.
+
+    Returns [(cursor, rows)] for every page read and the cursor of the
+    page after them, None when the scope has no more rows.
+    """
+    cursor, skip = start
+    pages = []
+    available = -skip
+    while available < page_size:
+        params = scope_params(scope, limit=page_size)
+        if cursor:
+            params['cursor'] = cursor
+        response = await fetch(**params)
+        result = response.get('result', {})
+        rows = result.get('list', [])
+        pages.append((cursor, rows))
+        available += len(rows)
+        cursor = result.get('nextPageCursor')
+        if not cursor or len(rows) < page_size:
+            return pages, None
+    return pages, cursor
+
+
+async def fetch_page(fetch, scopes, page_size, normalize, starts, key=None, keep=None):
+    """One page of rows merged across ``scopes``, reading each only as far as the page needs.
+
+    Every endpoint lists its rows in the view's order, so the page is the
+    first ``page_size`` rows of merging each scope from where the page
+    starts in it (see first_page_starts); ``key`` orders rows across
+    scopes, which are otherwise taken in turn. A tap costs at most two
+    requests per scope however deep the page or long the list. Rows
+    failing ``keep`` are passed over.
+
+    Returns the rows, where the next page starts (None once every scope
+    is exhausted) and the scopes that failed.
+    """
+    live = [i for i, start in enumerate(starts) if start is not None]
+    results = await asyncio.gather(
+        *(read_scope(fetch, scopes[i], page_size, starts[i]) for i in live),
+        return_exceptions=True
+    )
+    ends = list(starts)
+    failed = []
+    streams = []
+    read = {}
+    for i, result in zip(live, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error fetching {SCOPE_LABELS[scopes[i]]} rows: {str(result)}")
+            # Retried from the same place on the next page
+            failed.append(scopes[i])
+            continue
+        pages, next_cursor = result
+        read[i] = (pages, next_cursor)
+        rows = [row for _, page in pages for row in page][starts[i][1]:]
+        streams.append([(key(row) if key else 0, i, row) for row in rows])
+
+    consumed = dict.fromkeys(read, 0)
+    shown = []
+    for _, i, row in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+        if len(shown) == page_size:
+            break
+        consumed[i] += 1
+        if keep is None or keep(row):
+            shown.append(normalize(row, scopes[i]))
+
+    for i, (pages, next_cursor) in read.items():
+        offset = starts[i][1] + consumed[i]
+        if offset < sum(len(page) for _, page in pages):
+            # Every page read but the last is full, so the offset names its page
+            ends[i] = [pages[offset // page_size][0], offset % page_size]
+        else:
+            ends[i] = [next_cursor, 0] if next_cursor else None
+    has_next = any(ends[i] is not None for i in read)
+    return shown, ends if has_next else None, failed
+
+
+async def positions_page(exchange, page_size, starts):
+    return await fetch_page(
+        exchange.get_positions, POSITION_SCOPES, page_size, normalize_position, starts, keep=is_open
+    )
+
+
+async def orders_page(exchange, page_size, starts):
+    return await fetch_page(
+        exchange.get_open_orders, ORDER_SCOPES, page_size, normalize_order, starts, key=newest_first
+    )
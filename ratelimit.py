@@ -0,0 +1,177 @@
+import os
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+RATE_LIMIT_ERROR = 10006
+
+# Requests per second Bybit allows per UID (market data is per IP), by endpoint class
+ENDPOINT_LIMITS = {
+    'order': 10,
+    'cancel': 10,
+    'account': 10,
+    'read': 50,
+    'market': 100,
+}
+
+ENDPOINT_CLASSES = {
+    'place_order': 'order',
+    'place_batch_order': 'order',
+    'amend_order': 'order',
+    'cancel_order': 'cancel',
+    'cancel_all_orders': 'cancel',
+    'cancel_batch_order': 'cancel',
+    'set_leverage': 'account',
+    'get_wallet_balance': 'read',
+    'get_positions': 'read',
+    'get_open_orders': 'read',
+    'get_executions': 'read',
+    'get_closed_pnl': 'read',
+    'get_tickers': 'market',
+    'get_instruments_info': 'market',
+}
+
+# Share of those limits this process may spend; worker processes of a sharded
+# bot split the budget of every account between them
+RATE_SHARE = float(os.getenv('BYBIT_RATE_SHARE', '1'))
+
+# Lower runs first when requests queue for a free worker
+PRIORITIES = {
+    'order': 0,
+    'cancel': 0,
+    'account': 1,
+    'read': 2,
+    'market': 2,
+}
+
+
+def endpoint_class(method):
+    return ENDPOINT_CLASSES.get(method, 'read')
+
+
+class TokenBucket:
+    """Token bucket that waiters drain in FIFO order, resynced from Bybit's limit headers."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observe(self, limit=None, remaining=None, reset_ms=None):
+        now = time.monotonic()
+        self._refill(now)
+        if limit:
+            self.capacity = min(self.capacity, limit)
+        if remaining is not None:
+            # Other clients on the same UID may have spent tokens we never saw
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset_ms:
+                self.blocked_until = max(self.blocked_until, now + max(0, reset_ms / 1000 - time.time()))
+
+
+class PriorityGate:
+    """Caps in-flight requests, letting higher-priority waiters through first."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class RequestScheduler:
+    """Throttles exchange requests per endpoint class and queues bursts instead of failing them.
+
+    A request that still hits Bybit's rate limit (10006) blocks its bucket
+    until the reset time from the response headers and is retried.
+    """
+
+    def __init__(self, max_in_flight, limits=None, max_rate_limit_retries=5, share=RATE_SHARE):
+        self.buckets = {}
+        for name, limit in (limits or ENDPOINT_LIMITS).items():
+            limit = max(1, int(limit * share))
+            # Any one-second window sees at most burst + refill = limit requests
+            burst = max(1, limit // 5)
+            self.buckets[name] = TokenBucket(max(limit - burst, 1), burst)
+        self.gate = PriorityGate(max_in_flight)
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.rate_limited = 0
+
+    def observe_headers(self, endpoint, headers):
+        if not headers:
+            return
+        headers = {key.lower(): value for key, value in headers.items()}
+        if 'x-bapi-limit-status' not in headers:
+            return
+        try:
+            self.buckets[endpoint].observe(
+                limit=int(headers.get('x-bapi-limit') or 0),
+                remaining=int(headers['x-bapi-limit-status']),
+                reset_ms=int(headers.get('x-bapi-limit-reset-timestamp') or 0),
+            )
+        except (TypeError, ValueError):
+            pass
+
+    async def submit(self, endpoint, request):
+        """Run ``request()`` (a coroutine factory) once ``endpoint`` has budget."""
+        bucket = self.buckets[endpoint]
+        attempt = 0
+        while True:
+            await bucket.take()
+            await self.gate.acquire(PRIORITIES.get(endpoint, 2))
+            try:
+                return await request()
+            except Exception as e:
+                if getattr(e, 'status_code', None) != RATE_LIMIT_ERROR or attempt >= self.max_rate_limit_retries:
+                    raise
+                attempt += 1
+                self.rate_limited += 1
+                headers = getattr(e, 'resp_headers', None) or {}
+                self.observe_headers(endpoint, {**headers, 'X-Bapi-Limit-Status': '0'})
+                logging.warning(f"Rate limited on {endpoint} requests, retrying (attempt {attempt})")
+            finally:
+                self.gate.release()
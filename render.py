@@ -0,0 +1,385 @@
+import keyword
+from string import Formatter
+
+# Telegram's limit on the text of one message
+MESSAGE_LIMIT = 4096
+
+MARKDOWN_SPECIALS = '_*[]()~`>#+-=|{}.!\\'
+# Backslashes first, so the ones added for the other characters are left alone
+_ESCAPE_ORDER = '\\' + MARKDOWN_SPECIALS.replace('\\', '')
+# Stands in for the template's own *bold* markers while a rendered block is escaped
+_BOLD = '\x00'
+
+
+def escape(text):
+    """Escape ``text`` for MarkdownV2."""
+    # str.replace per character present beats str.translate, which maps one character at a time
+    text = str(text)
+    for char in _ESCAPE_ORDER:
+        if char in text:
+            text = text.replace(char, '\\' + char)
+    return text
+
+
+class Template:
+    """A str.format template compiled once into an f-string function.
+
+    str.format parses its template on every call; the compiled f-string
+    runs as fast as one written out by hand. With ``markdown`` set, the
+    rendered text is escaped for MarkdownV2 in one pass, keeping the
+    template's own ``*bold*`` markers, so symbols, order ids or error
+    messages can never break the markup.
+    """
+
+    __slots__ = ('_render', '_bold', '_markdown')
+
+    def __init__(self, source, markdown=True):
+        self._markdown = markdown
+        fields = []
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if conversion:
+                raise ValueError(f"Conversions are not supported in templates: !{conversion}")
+            if literal:
+                literal = literal.replace('{', '{{').replace('}', '}}')
+                parts.append('f' + repr(literal.replace('*', _BOLD) if markdown else literal))
+            if field is not None:
+                if not field.isidentifier() or keyword.iskeyword(field) or '{' in spec:
+                    raise ValueError(f"Template fields must be plain names: {{{field}:{spec}}}")
+                fields.append(field)
+                parts.append('f' + repr(f"{{{field}:{spec}}}" if spec else f"{{{field}}}"))
+        # Field names were checked above, so nothing but the template's own text is compiled;
+        # values a template doesn't use are ignored, as str.format does
+        arguments = ''.join(f"{field}, " for field in dict.fromkeys(fields))
+        self._render = eval(f"lambda {arguments}**unused: {' '.join(parts) or repr('')}")
+        self._bold = sum(literal.count('*') for literal, *_ in Formatter().parse(source)) if markdown else 0
+
+    def render(self, **values):
+        text = self._render(**values)
+        if not self._markdown:
+            return text
+        if text.count(_BOLD) != self._bold:
+            # A value carries the marker's stand-in; drop it rather than let it turn into markup
+            text = self._render(**{
+                name: value.replace(_BOLD, '') if isinstance(value, str) else value
+                for name, value in values.items()
+            })
+        return escape(text).replace(_BOLD, '*')
+
+
+def _length(text):
+    # Telegram counts the limit in UTF-16 code units, so most emoji count twice
+    return len(text.encode('utf-16-le')) // 2
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Split one long text at line breaks into chunks Telegram accepts."""
+    return pack(text.splitlines(keepends=True), limit)
+
+
+def _hard_split(block, limit):
+    # Only for single lines over the limit; half the limit in characters is safe
+    # for any mix of UTF-16 widths. Never cut an escape sequence in two
+    chunks = []
+    limit //= 2
+    while len(block) > limit:
+        cut = limit
+        while cut > 1 and block[cut - 1] == '\\':
+            cut -= 1
+        chunks.append(block[:cut])
+        block = block[cut:]
+    chunks.append(block)
+    return chunks
+
+
+def pack(blocks, limit=MESSAGE_LIMIT):
+    """Join rendered blocks into as few messages as fit, never splitting a block unless it alone is too long."""
+    chunks = []
+    current = []
+    size = 0
+    for block in blocks:
+        length = _length(block)
+        if length > limit:
+            if current:
+                chunks.append(''.join(current))
+                current, size = [], 0
+            chunks.extend(split_message(block, limit) if '\n' in block.rstrip('\n') else _hard_split(block, limit))
+            continue
+        if size + length > limit:
+            chunks.append(''.join(current))
+            current, size = [], 0
+        current.append(block)
+        size += length
+    if current:
+        chunks.append(''.join(current))
+    return chunks or ['']
+
+
+# Balance view
+
+BALANCE_HEADER = Template("💰 Wallet Balance:\n\n")
+BALANCE_COIN = Template("*{coin}*:\nBalance: {balance:.8f}\nAvailable: {available:.8f}\n")
+BALANCE_VALUE = Template("Value in USDT: {value:.2f}\n")
+BALANCE_TOTAL = Template("\n*Total Portfolio Value*: {total:.2f} USDT")
+BALANCE_UNPRICED = Template("\nNo USDT price for: {coins}")
+BALANCE_EMPTY = Template("No balance found")
+
+
+def render_balance(coins, values=(), total=0.0, unpriced=()):
+    if coins is None:
+        return [BALANCE_EMPTY.render()]
+    blocks = [BALANCE_HEADER.render()]
+    for coin, value in zip(coins, values):
+        block = BALANCE_COIN.render(
+            coin=coin['coin'],
+            balance=float(coin['walletBalance'] or 0),
+            available=float(coin.get('availableToWithdraw') or 0)
+        )
+        if coin['coin'] != 'USDT' and coin['coin'] not in unpriced:
+            block += BALANCE_VALUE.render(value=float(value))
+        blocks.append(block + "\n")
+    blocks.append(BALANCE_TOTAL.render(total=total))
+    if unpriced:
+        blocks.append(BALANCE_UNPRICED.render(coins=', '.join(unpriced)))
+    return pack(blocks)
+
+
+# Positions view
+
+POSITIONS_HEADER = Template("📊 *Current Positions*\n\n")
+_POSITION = (
+    "==============================\n"
+    "*{symbol}* {market}{trend}\n"
+    "Side: {side}\n"
+    "Size: {size} ({leverage}x)\n"
+    "Entry: ${entry:.4f}\n"
+    "Current: ${mark:.4f}\n\n"
+    "*PnL Information:*\n"
+    "{pnl_color} PnL: ${pnl:.2f} ({pnl_pct:.2f}%)\n"
+)
+_POSITION_ROE = "{roe_color} ROE: {roe:.2f}%\n\n"
+# One template per row, with or without the margin line, so each row is escaped once
+POSITION = Template(_POSITION + _POSITION_ROE)
+POSITION_WITH_MARGIN = Template(_POSITION + "Margin: ${margin} USDT\n" + _POSITION_ROE)
+POSITIONS_SUMMARY = Template(
+    "==============================\n"
+    "\n*Portfolio Summary:*\n"
+    "{color} *{label} PnL: ${total:.2f} USDT*\n"
+)
+POSITIONS_EMPTY = Template(
+    "📊 *No Open Positions*\n\n"
+    "Start trading by:\n"
+    "1. Set leverage first\n"
+    "2. Place a new order\n"
+    "3. Monitor your positions here"
+)
+# Categories Bybit did not answer for; their rows are missing from the view
+VIEW_PARTIAL = Template("\n⚠️ Not loaded, please refresh: {scopes}\n")
+
+
+def render_positions(frame, page, has_next, failed=()):
+    """Render one page of a PositionFrame; ``failed`` names categories that could not be loaded."""
+    if not len(frame):
+        blocks = [POSITIONS_EMPTY.render()]
+        if failed:
+            blocks.append(VIEW_PARTIAL.render(scopes=', '.join(failed)))
+        return pack(blocks)
+    blocks = [POSITIONS_HEADER.render()]
+    # Python floats up front; indexing numpy arrays element by element is slow
+    columns = zip(
+        frame.rows, frame.size.tolist(), frame.entry_price.tolist(), frame.mark_price.tolist(),
+        frame.unrealised_pnl.tolist(), frame.pnl_pct.tolist(), frame.margin.tolist(), frame.roe.tolist()
+    )
+    for position, size, entry, mark, pnl, pnl_pct, margin, roe in columns:
+        has_margin = position.get('positionIM') not in (None, 'N/A')
+        blocks.append((POSITION_WITH_MARGIN if has_margin else POSITION).render(
+            symbol=position['symbol'],
+            market=f"({position['market']}) " if position.get('market') else "",
+            trend="📈" if mark > entry else "📉",
+            side="🟢 Long" if position.get('side') == "Buy" else "🔴 Short",
+            size=position.get('sizeText') or size,
+            leverage=position.get('leverage', 'N/A'),
+            entry=entry,
+            mark=mark,
+            pnl_color="🟢" if pnl >= 0 else "🔴",
+            pnl=pnl,
+            pnl_pct=pnl_pct,
+            margin=margin,
+            roe_color="🟢" if roe >= 0 else "🔴",
+            roe=roe
+        ))
+
+    total = float(frame.unrealised_pnl.sum())
+    if total != 0:
+        blocks.append(POSITIONS_SUMMARY.render(
+            color="🟢" if total >= 0 else "🔴",
+            label=f"Page {page + 1}" if page > 0 or has_next else "Total",
+            total=total
+        ))
+    if failed:
+        blocks.append(VIEW_PARTIAL.render(scopes=', '.join(failed)))
+    return pack(blocks)
+
+
+# Open orders view
+
+ORDERS_HEADER = Template("📝 Open Orders:\n\n")
+ORDERS_PAGE_HEADER = Template("📝 Open Orders (page {page}):\n\n")
+ORDER = Template(
+    "*{symbol}*{market}:\n"
+    "Order ID: {order_id}\n"
+    "Side: {side}\n"
+    "Price: {price}\n"
+    "Quantity: {qty}\n"
+    "Type: {order_type}\n"
+    "Status: {status}\n\n"
+)
+ORDERS_EMPTY = Template("No open orders")
+
+
+def render_orders(orders, page, failed=()):
+    if not orders:
+        blocks = [ORDERS_EMPTY.render()]
+        if failed:
+            blocks.append(VIEW_PARTIAL.render(scopes=', '.join(failed)))
+        return pack(blocks)
+    blocks = [ORDERS_HEADER.render() if page == 0 else ORDERS_PAGE_HEADER.render(page=page + 1)]
+    for order in orders:
+        blocks.append(ORDER.render(
+            symbol=order['symbol'],
+            market=f" ({order['market']})" if order.get('market') else "",
+            order_id=order['orderId'],
+            side=order['side'],
+            price=order['price'],
+            qty=order['qty'],
+            order_type=order['orderType'],
+            status=order['orderStatus']
+        ))
+    if failed:
+        blocks.append(VIEW_PARTIAL.render(scopes=', '.join(failed)))
+    return pack(blocks)
+
+
+# Order confirmation, sent as plain text
+
+ORDER_PLACED = Template(
+    "✅ Order placed successfully!\n\n"
+    "Symbol: {symbol}\n"
+    "Type: {order_type}\n"
+    "Side: {side}\n"
+    "Quantity: {qty}\n",
+    markdown=False
+)
+ORDER_PRICE = Template("Price: {price}\n", markdown=False)
+
+
+def render_order_placed(symbol, order_type, side, qty, price=None):
+    text = ORDER_PLACED.render(symbol=symbol, order_type=order_type.upper(), side=side.upper(), qty=qty)
+    if price is not None:
+        text += ORDER_PRICE.render(price=price)
+    return [text]
+
+
+# Risk view
+
+RISK_HEADER = Template("⚠️ *Risk Overview*\n\nEquity: ${equity:,.2f}\n")
+RISK_EMPTY = Template("\nNo open positions.")
+RISK_BODY = Template(
+    "Open positions: {positions}\n"
+    "Unrealised PnL: ${pnl:,.2f}\n\n"
+    "*Exposure:*\n"
+    "Gross: ${gross:,.2f}{leverage}\n"
+    "Net: ${net:,.2f}\n\n"
+    "*Margin:*\n"
+    "In use: ${margin:,.2f}{usage}\n"
+)
+RISK_MAINTENANCE = Template("Maintenance: {pct:.1f}% of equity\n")
+RISK_COINS_HEADER = Template("\n*By coin (net / gross):*\n")
+RISK_COIN = Template("{coin}: ${net:,.0f} / ${gross:,.0f} ({share:.0f}%)\n")
+RISK_MORE_COINS = Template("...and {count} more\n")
+RISK_CONCENTRATION = Template("\nLargest coin share: {share:.0f}% (concentration index {index:.2f})\n")
+RISK_LIQUIDATION = Template("{warning} Nearest liquidation: {symbol}, {distance:.1f}% away\n")
+
+
+def render_risk(totals, risk, coins_shown, failed=()):
+    blocks = [RISK_HEADER.render(equity=totals['equity'])]
+    if failed:
+        blocks.append(VIEW_PARTIAL.render(scopes=', '.join(failed)))
+    if not risk['positions']:
+        blocks.append(RISK_EMPTY.render())
+        return pack(blocks)
+
+    blocks.append(RISK_BODY.render(
+        positions=risk['positions'],
+        pnl=risk['unrealised_pnl'],
+        gross=risk['gross_exposure'],
+        leverage=f" ({risk['effective_leverage']:.2f}x equity)" if 'effective_leverage' in risk else "",
+        net=risk['net_exposure'],
+        margin=risk['margin_used'],
+        usage=f" ({risk['margin_usage'] * 100:.1f}% of equity)" if 'margin_usage' in risk else ""
+    ))
+    if totals['equity'] > 0 and totals['maintenance_margin'] > 0:
+        blocks.append(RISK_MAINTENANCE.render(pct=totals['maintenance_margin'] / totals['equity'] * 100))
+
+    blocks.append(RISK_COINS_HEADER.render())
+    for coin, net, gross in risk['exposure'][:coins_shown]:
+        share = gross / risk['gross_exposure'] * 100 if risk['gross_exposure'] else 0
+        blocks.append(RISK_COIN.render(coin=coin, net=net, gross=gross, share=share))
+    if len(risk['exposure']) > coins_shown:
+        blocks.append(RISK_MORE_COINS.render(count=len(risk['exposure']) - coins_shown))
+
+    blocks.append(RISK_CONCENTRATION.render(share=risk['largest_share'] * 100, index=risk['concentration']))
+    if risk['nearest_liquidation']:
+        symbol, distance = risk['nearest_liquidation']
+        blocks.append(RISK_LIQUIDATION.render(
+            warning="🔴" if distance < 10 else "🟢", symbol=symbol, distance=distance
+        ))
+    return pack(blocks)
+
+
+# Portfolio digest
+
+DIGEST_HEADER = Template("🗞 *Portfolio Digest*\n\nEquity: ${equity:,.2f}{change}\n")
+DIGEST_BODY = Template(
+    "Unrealised PnL: ${pnl:,.2f}\n"
+    "Margin ratio: {margin_ratio:.2f}%\n"
+    "Open positions: {positions}\n"
+)
+DIGEST_CHANGES_HEADER = Template("\n*Since the last digest:*\n")
+DIGEST_OPENED = Template("🟢 Opened {symbol} {side} {size}{market}\n")
+DIGEST_CLOSED = Template("⚪ Closed {symbol} {side}{market}\n")
+DIGEST_RESIZED = Template("🔄 {symbol} {side} {before} → {after}{market}\n")
+
+
+def _digest_line(template, key, **values):
+    category, symbol, side = key
+    return template.render(
+        symbol=symbol, side='long' if side == 'Buy' else 'short',
+        market=f" ({category})" if category != 'linear' else "", **values
+    )
+
+
+def render_digest(digest):
+    snapshot = digest['snapshot']
+    change = ""
+    if digest['previous_equity']:
+        delta = snapshot.equity - digest['previous_equity']
+        change = f" ({delta:+,.2f}, {delta / digest['previous_equity'] * 100:+.2f}%)"
+    blocks = [DIGEST_HEADER.render(equity=snapshot.equity, change=change)]
+    if snapshot.failed:
+        blocks.append(VIEW_PARTIAL.render(scopes=', '.join(snapshot.failed)))
+    blocks.append(DIGEST_BODY.render(
+        pnl=snapshot.unrealised_pnl,
+        margin_ratio=snapshot.margin_ratio * 100,
+        positions=len(snapshot.positions)
+    ))
+    if digest['opened'] or digest['closed'] or digest['resized']:
+        blocks.append(DIGEST_CHANGES_HEADER.render())
+        sizes = snapshot.sizes()
+        for key in digest['opened']:
+            blocks.append(_digest_line(DIGEST_OPENED, key, size=sizes[key]))
+        for key in digest['closed']:
+            blocks.append(_digest_line(DIGEST_CLOSED, key))
+        for key, before, after in digest['resized']:
+            blocks.append(_digest_line(DIGEST_RESIZED, key, before=before, after=after))
+    return pack(blocks)
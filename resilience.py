@@ -0,0 +1,108 @@
+import os
+import time
+import random
+import asyncio
+import requests
+
+# Seconds one Bybit request may take before it is abandoned, and the budget
+# for all attempts of one call, by endpoint class
+READ_TIMEOUT = float(os.getenv('BYBIT_READ_TIMEOUT', '5'))
+WRITE_TIMEOUT = float(os.getenv('BYBIT_WRITE_TIMEOUT', '10'))
+REQUEST_TIMEOUTS = {
+    'market': READ_TIMEOUT,
+    'read': READ_TIMEOUT,
+    'order': WRITE_TIMEOUT,
+    'cancel': WRITE_TIMEOUT,
+    'account': WRITE_TIMEOUT,
+}
+MAX_ATTEMPTS = int(os.getenv('BYBIT_MAX_ATTEMPTS', '3'))
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+# Room for one more attempt after a request that timed out
+CALL_DEADLINES = {endpoint: timeout * 2 + BACKOFF_CAP for endpoint, timeout in REQUEST_TIMEOUTS.items()}
+
+# Consecutive transient failures that open the breaker, and seconds it stays open
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('BREAKER_RESET', '30'))
+
+# Bybit retCodes that mean "our side had a problem", not "your request is wrong"
+TRANSIENT_RET_CODES = {
+    10000,  # server timeout
+    10016,  # internal server error
+    10429,  # system-level frequency protection
+}
+DUPLICATE_ORDER_LINK_ID = 110072
+LEVERAGE_NOT_MODIFIED = 110043
+
+
+def is_transient(error):
+    """Whether ``error`` says nothing about the request itself, so trying again may succeed."""
+    if isinstance(error, (asyncio.TimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    if type(error).__name__ == 'FailedRequestError':
+        # HTTP status: 5xx, or a body that was not JSON (pybit reports 409)
+        return status_code is None or status_code >= 500 or status_code == 409
+    return status_code in TRANSIENT_RET_CODES
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Bybit while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Bybit is not responding; trying again in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an exchange that keeps failing.
+
+    ``failures`` transient failures in a row open the breaker: every call
+    then fails at once with CircuitOpenError for ``reset_timeout`` seconds.
+    After that a single probe call is let through; its success closes the
+    breaker again, its failure keeps it open for another period. Answers
+    that prove Bybit is up, errors included, count as success.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        if self.opened_at is None:
+            return
+        waited = time.monotonic() - self.opened_at
+        if waited < self.reset_timeout or self._probing:
+            raise CircuitOpenError(max(0.0, self.reset_timeout - waited))
+        self._probing = True
+
+    def record_success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_cancelled(self):
+        # A cancelled probe proved nothing either way; let the next call probe
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive += 1
+        if self._probing or (self.opened_at is None and self.consecutive >= self.failures):
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+        self._probing = False
@@ -0,0 +1,203 @@
+"""Run the bot as a front process feeding a pool of worker processes.
+
+The front receives updates (long polling or webhook) and hands each one
+to the worker that owns its chat, so updates of one chat are always
+handled in order by one process while different chats spread over all
+cores. Workers share conversation state and user data through
+persistence.SharedPersistence and Bybit snapshots through
+cache.SharedTTLCache, both SQLite files.
+
+    SHARD_WORKERS=4 python sharding.py
+"""
+import os
+import json
+import signal
+import asyncio
+import logging
+import multiprocessing
+from telegram import Update
+
+# Worker processes started by the front
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+# Updates that may wait for one worker before the front holds back
+SHARD_QUEUE_SIZE = int(os.getenv('SHARD_QUEUE_SIZE', '10000'))
+# Commands that read or change bot-wide state: trigger rules and monitor
+# subscriptions live in the first worker, which also runs their jobs
+PRIMARY_COMMANDS = {'alert', 'bracket', 'trail', 'rules', 'unrule', 'digest', 'monitor'}
+
+
+def update_chat_id(data):
+    """Chat id of a raw update, or None for updates that belong to no chat."""
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if field in data:
+            return data[field]['chat']['id']
+    query = data.get('callback_query')
+    if query is not None:
+        message = query.get('message')
+        return message['chat']['id'] if message else query['from']['id']
+    return None
+
+
+def update_command(data):
+    text = (data.get('message') or {}).get('text') or ''
+    if not text.startswith('/'):
+        return None
+    return text[1:].split(maxsplit=1)[0].split('@', 1)[0].lower() if len(text) > 1 else None
+
+
+def shard_of(data, count):
+    """Index of the worker that handles raw update ``data``."""
+    if count <= 1 or update_command(data) in PRIMARY_COMMANDS:
+        return 0
+    chat_id = update_chat_id(data)
+    return chat_id % count if chat_id is not None else 0
+
+
+def worker_environ(index, count):
+    """Settings that make a worker take its share of the bot-wide limits."""
+    metrics_port = int(os.getenv('METRICS_PORT', '9100'))
+    return {
+        'SHARD_INDEX': str(index),
+        'SHARD_WORKERS': str(count),
+        'BYBIT_RATE_SHARE': str(float(os.getenv('BYBIT_RATE_SHARE', '1')) / count),
+        'TELEGRAM_RATE_LIMIT': str(float(os.getenv('TELEGRAM_RATE_LIMIT', '30')) / count),
+        'METRICS_PORT': str(metrics_port + index if metrics_port else 0),
+    }
+
+
+async def serve(application, updates, done=None):
+    """Handle the updates arriving on ``updates`` until a None arrives.
+
+    Updates go through the application's update processor exactly as
+    Application.start would feed them. With ``done`` set, every handled
+    update id is put on it, for callers that wait for their updates.
+    """
+    loop = asyncio.get_running_loop()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    async def process(update):
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        finally:
+            if done is not None:
+                done.put(update.update_id)
+
+    tasks = set()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            task = loop.create_task(process(Update.de_json(json.loads(data), application.bot)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_worker(index, count, updates, done=None, build=None, environ=None):
+    """Entry point of a worker process; ``build`` returns the Application, bot.build_application by default."""
+    # Ctrl+C reaches the whole process group; the front stops workers in order instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.update(environ or {})
+    os.environ.update(worker_environ(index, count))
+    # The bot reads its settings at import time, so only import it now
+    import bot
+    application = build() if build is not None else bot.build_application()
+    logging.info(f"Worker {index + 1}/{count} started")
+    asyncio.run(serve(application, updates, done))
+    if done is not None:
+        from metrics import HANDLER_ERRORS
+        done.put(('errors', index, sum(HANDLER_ERRORS.values.values())))
+
+
+def start_workers(count, done=None, build=None, environ=None):
+    """Start ``count`` workers; returns their processes and update queues."""
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(SHARD_QUEUE_SIZE) for _ in range(count)]
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(index, count, queues[index], done, build, environ),
+            name=f'shard-{index}'
+        )
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes, queues
+
+
+def stop_workers(processes, queues):
+    for update_queue in queues:
+        update_queue.put(None)
+    for process in processes:
+        process.join()
+
+
+async def dispatch(update_queue, queues):
+    """Route every update from ``update_queue`` to its worker until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        update = await update_queue.get()
+        data = update.to_dict()
+        worker_queue = queues[shard_of(data, len(queues))]
+        # Only blocks once a worker has fallen SHARD_QUEUE_SIZE updates behind
+        await loop.run_in_executor(None, worker_queue.put, json.dumps(data))
+
+
+async def run_front(count):
+    import bot
+    from telegram import Bot
+    from telegram.ext import Updater
+
+    processes, queues = start_workers(count)
+    update_queue = asyncio.Queue()
+    updater = Updater(Bot(os.getenv('TELEGRAM_BOT_TOKEN')), update_queue)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await updater.initialize()
+    try:
+        if bot.WEBHOOK_URL:
+            await updater.start_webhook(
+                listen=bot.WEBHOOK_LISTEN,
+                port=bot.WEBHOOK_PORT,
+                url_path=bot.WEBHOOK_PATH,
+                secret_token=bot.WEBHOOK_SECRET,
+                webhook_url=f"{bot.WEBHOOK_URL.rstrip('/')}/{bot.WEBHOOK_PATH}",
+                allowed_updates=bot.ALLOWED_UPDATES
+            )
+        else:
+            await updater.start_polling(allowed_updates=bot.ALLOWED_UPDATES)
+        logging.info(f"Dispatching updates to {count} workers")
+        dispatcher = loop.create_task(dispatch(update_queue, queues))
+        await stopping.wait()
+        await updater.stop()
+        # Hand over what was already received before the workers stop
+        while not update_queue.empty():
+            await asyncio.sleep(0.1)
+        dispatcher.cancel()
+    finally:
+        await updater.shutdown()
+        await loop.run_in_executor(None, stop_workers, processes, queues)
+
+
+def main():
+    if SHARD_WORKERS < 1:
+        raise SystemExit("Set SHARD_WORKERS to the number of worker processes, or run bot.py for a single process.")
+    asyncio.run(run_front(SHARD_WORKERS))
+
+
+if __name__ == '__main__':
+    main()
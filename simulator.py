@@ -0,0 +1,734 @@
+import os
+import json
+import math
+import time
+import zlib
+import random
+import asyncio
+import itertools
+import threading
+from datetime import timedelta
+from decimal import Decimal
+import requests
+from pybit.exceptions import InvalidRequestError, FailedRequestError
+from telegram import Update
+from telegram.request import BaseRequest
+from ratelimit import ENDPOINT_LIMITS, RATE_LIMIT_ERROR, endpoint_class
+
+# Seconds a simulated Bybit request takes, give or take the jitter
+SIMULATOR_LATENCY = float(os.getenv('SIMULATOR_LATENCY', '0.05'))
+SIMULATOR_JITTER = float(os.getenv('SIMULATOR_JITTER', '0.02'))
+# Share of requests that fail, and of requests that hang for SIMULATOR_SLOW_LATENCY
+SIMULATOR_ERROR_RATE = float(os.getenv('SIMULATOR_ERROR_RATE', '0'))
+SIMULATOR_SLOW_RATE = float(os.getenv('SIMULATOR_SLOW_RATE', '0'))
+SIMULATOR_SLOW_LATENCY = float(os.getenv('SIMULATOR_SLOW_LATENCY', '5'))
+# Instruments listed beyond REFERENCE_PRICES, and the open book a fresh account starts with
+SIMULATOR_SYMBOLS = int(os.getenv('SIMULATOR_SYMBOLS', '0'))
+SIMULATOR_POSITIONS = int(os.getenv('SIMULATOR_POSITIONS', '0'))
+SIMULATOR_ORDERS = int(os.getenv('SIMULATOR_ORDERS', '0'))
+# Round trips a fresh account has already traded, spread over the last SIMULATOR_HISTORY_DAYS
+SIMULATOR_TRADES = int(os.getenv('SIMULATOR_TRADES', '0'))
+SIMULATOR_HISTORY_DAYS = float(os.getenv('SIMULATOR_HISTORY_DAYS', '90'))
+# Seconds a simulated Bot API request takes
+SIMULATOR_TELEGRAM_LATENCY = float(os.getenv('SIMULATOR_TELEGRAM_LATENCY', '0.03'))
+
+# Prices the simulated market drifts around
+REFERENCE_PRICES = {
+    'BTCUSDT': 65000.0,
+    'ETHUSDT': 3200.0,
+    'SOLUSDT': 150.0,
+    'XRPUSDT': 0.55,
+    'DOGEUSDT': 0.15,
+}
+STARTING_BALANCE = {'USDT': 10000.0, 'BTC': 0.05}
+DEFAULT_LEVERAGE = 10
+TAKER_FEE = 0.00055
+MAINTENANCE_RATE = 0.005
+
+# What an injected failure looks like: a Bybit retCode or an HTTP status
+INJECTED_ERRORS = (
+    (InvalidRequestError, 10016, "Internal server error (simulated)"),
+    (FailedRequestError, 503, "Service Unavailable (simulated)"),
+)
+
+# Same codes pybit retries by itself
+RETRY_CODES = {10002, 10006, 30034, 30035, 130035, 130150}
+
+
+def _fmt(value):
+    if isinstance(value, Decimal):
+        return f"{value.normalize():f}"
+    return f"{value:.8f}".rstrip('0').rstrip('.') or '0'
+
+
+def _power_of_ten(exponent):
+    return Decimal(1).scaleb(exponent)
+
+
+class _Rejected(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class SimulatedBybit:
+    """Local stand-in for pybit's unified_trading.HTTP.
+
+    Serves the v5 REST calls the bot makes from an in-memory account:
+    market orders fill at once against a drifting price, limit orders
+    rest until cancelled, and fills update positions, the wallet,
+    executions and closed PnL. Responses, errors and rate limit headers
+    have Bybit's shape, so everything above the client runs unchanged.
+    Each request sleeps for ``latency`` seconds (plus jitter) on the
+    calling thread, and ``error_rate``/``slow_rate`` inject failures and
+    stalls. Functions in ``stream_listeners`` receive the position, order
+    and wallet messages Bybit's private stream would push for each change,
+    on the calling thread once the request completes.
+    """
+
+    def __init__(self, testnet=False, api_key=None, api_secret=None, return_response_headers=False,
+                 latency=SIMULATOR_LATENCY, jitter=SIMULATOR_JITTER, error_rate=SIMULATOR_ERROR_RATE,
+                 slow_rate=SIMULATOR_SLOW_RATE, slow_latency=SIMULATOR_SLOW_LATENCY,
+                 rate_limits=True, extra_symbols=SIMULATOR_SYMBOLS, seed_positions=SIMULATOR_POSITIONS,
+                 seed_orders=SIMULATOR_ORDERS, seed_trades=SIMULATOR_TRADES, history_days=SIMULATOR_HISTORY_DAYS,
+                 seed=None, **_):
+        self.testnet = testnet
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.return_response_headers = return_response_headers
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.rate_limits = rate_limits
+        # Exchange mounts its connection pool on this and closes it on shutdown
+        self.client = requests.Session()
+        self.retry_codes = set(RETRY_CODES)
+        self.calls = {}
+        # Called with every private stream message (position, order, wallet) a change pushes
+        self.stream_listeners = []
+        self._pushes = []
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._windows = {}
+        self._coins = dict(STARTING_BALANCE)
+        self._positions = {}
+        self._orders = {}
+        self._leverage = {}
+        self._order_link_ids = set()
+        self._executions = []
+        self._closed_pnl = []
+
+        self.reference = dict(REFERENCE_PRICES)
+        for i in range(extra_symbols):
+            self.reference[f'SIM{i:04d}USDT'] = round(10 ** self._random.uniform(-3, 3), 6)
+        self.instruments = {symbol: self._instrument(symbol, price) for symbol, price in self.reference.items()}
+        self._seed(seed_positions, seed_orders, seed_trades, history_days)
+
+    # Market
+
+    def price(self, symbol, now=None):
+        """The current price of ``symbol``; a slow wave, different for every symbol."""
+        now = time.time() if now is None else now
+        phase = zlib.crc32(symbol.encode()) % 628 / 100
+        return self.reference[symbol] * (1 + 0.02 * math.sin(now / 60 + phase))
+
+    @staticmethod
+    def _instrument(symbol, price):
+        tick = _power_of_ten(math.floor(math.log10(price)) - 5)
+        step = min(Decimal(1), _power_of_ten(math.floor(math.log10(100 / price))))
+        return {
+            'symbol': symbol,
+            'contractType': 'LinearPerpetual',
+            'status': 'Trading',
+            'baseCoin': symbol[:-4],
+            'quoteCoin': 'USDT',
+            'settleCoin': 'USDT',
+            'priceFilter': {'tickSize': _fmt(tick), 'minPrice': _fmt(tick), 'maxPrice': _fmt(tick * 10 ** 7)},
+            'lotSizeFilter': {
+                'qtyStep': _fmt(step),
+                'minOrderQty': _fmt(step),
+                'maxOrderQty': _fmt(step * 10 ** 6),
+                'maxMktOrderQty': _fmt(step * 10 ** 5),
+                'minNotionalValue': '5',
+            },
+            'leverageFilter': {'minLeverage': '1', 'maxLeverage': '100', 'leverageStep': '0.01'},
+        }
+
+    def _seed(self, positions, orders, trades=0, history_days=0):
+        symbols = list(self.reference)
+        now = time.time()
+        # Past round trips first, so they close out before the open book is built
+        for _ in range(trades):
+            symbol = self._random.choice(symbols)
+            opened = now - self._random.uniform(1, history_days) * 24 * 3600
+            closed = min(now, opened + self._random.uniform(60, 24 * 3600))
+            step = float(self.instruments[symbol]['lotSizeFilter']['qtyStep'])
+            qty = max(step, round(1000 / self.price(symbol, opened) / step) * step)
+            side = self._random.choice(['Buy', 'Sell'])
+            self._fill(
+                symbol, side, qty, self.price(symbol, opened), False, f'sim-{next(self._ids)}', int(opened * 1000)
+            )
+            # Closed PnL rows are keyed by the closing order
+            self._fill(
+                symbol, 'Sell' if side == 'Buy' else 'Buy', qty, self.price(symbol, closed), True,
+                f'sim-{next(self._ids)}', int(closed * 1000)
+            )
+        for i in range(positions):
+            symbol = symbols[i % len(symbols)]
+            if symbol in self._positions:
+                continue
+            price = self.price(symbol, now)
+            step = float(self.instruments[symbol]['lotSizeFilter']['qtyStep'])
+            qty = max(step, round(1000 / price / step) * step)
+            self._fill(symbol, 'Buy' if i % 2 == 0 else 'Sell', qty, price * (1 + (i % 7 - 3) / 100), False, '')
+        for i in range(orders):
+            symbol = symbols[i % len(symbols)]
+            price = self.price(symbol, now) * (0.9 if i % 2 == 0 else 1.1)
+            qty = self.instruments[symbol]['lotSizeFilter']['minOrderQty']
+            self._rest_order(symbol, 'Buy' if i % 2 == 0 else 'Sell', qty, _fmt(price), '', False)
+
+    # Request plumbing
+
+    def _delay(self):
+        with self._lock:
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                return self.slow_latency
+            return max(0.0, self._random.uniform(self.latency - self.jitter, self.latency + self.jitter))
+
+    def _take_rate_limit(self, method):
+        # Bybit counts per UID and endpoint class in one-second windows; market data is per IP
+        endpoint = endpoint_class(method)
+        if not self.rate_limits or endpoint == 'market':
+            return {}
+        limit = ENDPOINT_LIMITS[endpoint]
+        second = int(time.time())
+        window = self._windows.get(endpoint)
+        if window is None or window[0] != second:
+            window = self._windows[endpoint] = [second, 0]
+        headers = {
+            'X-Bapi-Limit': str(limit),
+            'X-Bapi-Limit-Status': str(max(0, limit - window[1] - 1)),
+            'X-Bapi-Limit-Reset-Timestamp': str((second + 1) * 1000),
+        }
+        if window[1] >= limit:
+            raise _Rejected(RATE_LIMIT_ERROR, "Too many visits!")
+        window[1] += 1
+        return headers
+
+    def _call(self, method, handler, params):
+        start = time.perf_counter()
+        time.sleep(self._delay())
+        headers = {}
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            try:
+                headers = self._take_rate_limit(method)
+                if self.error_rate and self._random.random() < self.error_rate:
+                    error, code, message = self._random.choice(INJECTED_ERRORS)
+                    raise error(
+                        request=f"{method}: {params}", message=message, status_code=code,
+                        time=time.strftime('%H:%M:%S'), resp_headers=headers
+                    )
+                result, ext_info = handler(**params)
+            except _Rejected as e:
+                raise InvalidRequestError(
+                    request=f"{method}: {params}", message=e.message, status_code=e.code,
+                    time=time.strftime('%H:%M:%S'), resp_headers=headers
+                )
+            finally:
+                pushes, self._pushes = self._pushes, []
+        # Outside the lock, so a listener may call back into the client
+        for message in pushes:
+            for listener in self.stream_listeners:
+                listener(message)
+        response = {
+            'retCode': 0,
+            'retMsg': 'OK',
+            'result': result,
+            'retExtInfo': ext_info,
+            'time': int(time.time() * 1000),
+        }
+        if self.return_response_headers:
+            return response, timedelta(seconds=time.perf_counter() - start), headers
+        return response
+
+    @staticmethod
+    def _page(rows, limit, cursor, default_limit, max_limit):
+        start = int(cursor) if cursor else 0
+        end = start + min(int(limit or default_limit), max_limit)
+        return {'list': rows[start:end], 'nextPageCursor': str(end) if end < len(rows) else ''}
+
+    def _push(self, topic, rows):
+        if self.stream_listeners:
+            self._pushes.append({'topic': topic, 'creationTime': int(time.time() * 1000), 'data': rows})
+
+    def _push_position(self, symbol):
+        if symbol in self._positions:
+            row = self._position_row(symbol, self._positions[symbol], time.time())
+        else:
+            # Bybit pushes a closed position once more, with size 0
+            row = {'category': 'linear', 'symbol': symbol, 'side': '', 'size': '0', 'positionIdx': 0}
+        self._push('position', [row])
+
+    def _push_wallet(self):
+        self._push('wallet', self._wallet_balance()[0]['list'])
+
+    def _check_symbol(self, symbol):
+        if symbol not in self.instruments:
+            raise _Rejected(10001, f"params error: symbol {symbol} invalid")
+
+    # Account state, all called with the lock held
+
+    def _position_row(self, symbol, position, now):
+        mark = self.price(symbol, now)
+        sign = 1 if position['side'] == 'Buy' else -1
+        size, entry = position['size'], position['avg']
+        leverage = self._leverage.get(symbol, DEFAULT_LEVERAGE)
+        margin = size * entry / leverage
+        return {
+            'category': 'linear',
+            'symbol': symbol,
+            'side': position['side'],
+            'size': _fmt(size),
+            'avgPrice': _fmt(entry),
+            'markPrice': _fmt(mark),
+            'positionValue': _fmt(size * entry),
+            'unrealisedPnl': _fmt(sign * (mark - entry) * size),
+            'positionIM': _fmt(margin),
+            'positionMM': _fmt(size * mark * MAINTENANCE_RATE),
+            'leverage': _fmt(leverage),
+            'liqPrice': _fmt(max(0.0, entry * (1 - sign * (1 / leverage - MAINTENANCE_RATE)))),
+            'positionIdx': 0,
+            'positionStatus': 'Normal',
+            'createdTime': str(position['created']),
+            'updatedTime': str(position['updated']),
+        }
+
+    def _fill(self, symbol, side, qty, price, reduce_only, order_id, now_ms=None):
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        position = self._positions.get(symbol)
+        if reduce_only and (position is None or position['side'] == side):
+            raise _Rejected(110017, "current position is zero, cannot fix reduce-only order qty")
+        fee = qty * price * TAKER_FEE
+        self._coins['USDT'] -= fee
+        self._executions.append({
+            'symbol': symbol, 'orderId': order_id, 'execId': f'sim-{next(self._ids)}', 'side': side,
+            'execType': 'Trade', 'execPrice': _fmt(price), 'execQty': _fmt(qty), 'execValue': _fmt(qty * price),
+            'execFee': _fmt(fee), 'execTime': str(now_ms),
+        })
+
+        if position is not None and position['side'] != side:
+            closed = min(qty, position['size'])
+            sign = 1 if position['side'] == 'Buy' else -1
+            pnl = sign * (price - position['avg']) * closed
+            self._coins['USDT'] += pnl
+            self._closed_pnl.append({
+                'symbol': symbol, 'orderId': order_id, 'side': side, 'qty': _fmt(closed),
+                'avgEntryPrice': _fmt(position['avg']), 'avgExitPrice': _fmt(price), 'closedPnl': _fmt(pnl - fee),
+                'orderType': 'Market', 'createdTime': str(now_ms), 'updatedTime': str(now_ms),
+            })
+            position['size'] -= closed
+            position['updated'] = now_ms
+            if position['size'] <= 1e-12:
+                del self._positions[symbol]
+            qty -= closed
+            if qty <= 1e-12 or reduce_only:
+                return
+            position = None
+
+        if position is None:
+            position = self._positions[symbol] = {'side': side, 'size': 0.0, 'avg': 0.0, 'created': now_ms}
+        size = position['size'] + qty
+        position['avg'] = (position['avg'] * position['size'] + price * qty) / size
+        position['size'] = size
+        position['updated'] = now_ms
+
+    def _rest_order(self, symbol, side, qty, price, order_link_id, reduce_only):
+        order_id = f'sim-{next(self._ids)}'
+        now_ms = str(int(time.time() * 1000))
+        self._orders[order_id] = {
+            'category': 'linear', 'symbol': symbol, 'orderId': order_id, 'orderLinkId': order_link_id,
+            'side': side, 'orderType': 'Limit', 'price': price, 'qty': qty, 'leavesQty': qty,
+            'orderStatus': 'New', 'reduceOnly': reduce_only, 'timeInForce': 'GTC',
+            'createdTime': now_ms, 'updatedTime': now_ms,
+        }
+        return order_id
+
+    def _submit(self, symbol, side, orderType, qty, price=None, orderLinkId='', reduceOnly=False, **_):
+        self._check_symbol(symbol)
+        side = side.capitalize()
+        order_type = orderType.capitalize()
+        if side not in ('Buy', 'Sell') or order_type not in ('Market', 'Limit'):
+            raise _Rejected(10001, "params error: side or orderType invalid")
+        lot = self.instruments[symbol]['lotSizeFilter']
+        if Decimal(str(qty)) < Decimal(lot['minOrderQty']):
+            raise _Rejected(10001, f"The number of contracts is below the minimum of {lot['minOrderQty']}")
+        if orderLinkId:
+            if orderLinkId in self._order_link_ids:
+                raise _Rejected(110072, "OrderLinkedID is duplicate")
+            self._order_link_ids.add(orderLinkId)
+
+        if order_type == 'Market':
+            order_id = f'sim-{next(self._ids)}'
+            fill_price = self.price(symbol)
+            self._fill(symbol, side, float(qty), fill_price, reduceOnly, order_id)
+            if self.stream_listeners:
+                now_ms = str(int(time.time() * 1000))
+                self._push('order', [{
+                    'category': 'linear', 'symbol': symbol, 'orderId': order_id, 'orderLinkId': orderLinkId,
+                    'side': side, 'orderType': 'Market', 'price': _fmt(fill_price), 'qty': _fmt(Decimal(str(qty))),
+                    'leavesQty': '0', 'orderStatus': 'Filled', 'reduceOnly': reduceOnly, 'timeInForce': 'IOC',
+                    'createdTime': now_ms, 'updatedTime': now_ms,
+                }])
+                self._push_position(symbol)
+        else:
+            if price is None:
+                raise _Rejected(10001, "params error: price is required for limit orders")
+            order_id = self._rest_order(symbol, side, _fmt(Decimal(str(qty))), _fmt(Decimal(str(price))),
+                                        orderLinkId, reduceOnly)
+            self._push('order', [dict(self._orders[order_id])])
+        if self.stream_listeners:
+            self._push_wallet()
+        return {'orderId': order_id, 'orderLinkId': orderLinkId}
+
+    # Endpoints
+
+    def _wallet_balance(self, accountType='UNIFIED', **_):
+        now = time.time()
+        rows = [self._position_row(symbol, position, now) for symbol, position in self._positions.items()]
+        unrealised = sum(float(row['unrealisedPnl']) for row in rows)
+        position_margin = sum(float(row['positionIM']) for row in rows)
+        order_margin = sum(
+            float(order['price']) * float(order['leavesQty']) / self._leverage.get(order['symbol'], DEFAULT_LEVERAGE)
+            for order in self._orders.values()
+        )
+        coins = []
+        equity = 0.0
+        for coin, balance in self._coins.items():
+            price = 1.0 if coin == 'USDT' else self.price(f'{coin}USDT', now)
+            coin_equity = balance + (unrealised if coin == 'USDT' else 0.0)
+            equity += coin_equity * price
+            locked = position_margin + order_margin if coin == 'USDT' else 0.0
+            coins.append({
+                'coin': coin,
+                'walletBalance': _fmt(balance),
+                'equity': _fmt(coin_equity),
+                'usdValue': _fmt(coin_equity * price),
+                'unrealisedPnl': _fmt(unrealised if coin == 'USDT' else 0.0),
+                'availableToWithdraw': _fmt(max(0.0, balance - locked)),
+                'totalPositionIM': _fmt(position_margin if coin == 'USDT' else 0.0),
+                'totalOrderIM': _fmt(order_margin if coin == 'USDT' else 0.0),
+            })
+        maintenance = sum(float(row['positionMM']) for row in rows)
+        return {'list': [{
+            'accountType': accountType,
+            'totalEquity': _fmt(equity),
+            'totalWalletBalance': _fmt(equity - unrealised),
+            'totalMarginBalance': _fmt(equity),
+            'totalAvailableBalance': _fmt(equity - position_margin - order_margin),
+            'totalInitialMargin': _fmt(position_margin + order_margin),
+            'totalMaintenanceMargin': _fmt(maintenance),
+            'totalPerpUPL': _fmt(unrealised),
+            'coin': coins,
+        }]}, {}
+
+    def _get_positions(self, category='linear', symbol=None, settleCoin=None, limit=None, cursor=None, **_):
+        if category != 'linear':
+            return {'category': category, 'list': [], 'nextPageCursor': ''}, {}
+        now = time.time()
+        rows = [
+            self._position_row(name, position, now)
+            for name, position in sorted(self._positions.items())
+            if (symbol is None or name == symbol) and (settleCoin is None or name.endswith(settleCoin))
+        ]
+        return dict(self._page(rows, limit, cursor, 20, 200), category=category), {}
+
+    def _get_open_orders(self, category='linear', symbol=None, settleCoin=None, limit=None, cursor=None, **_):
+        rows = sorted(
+            (
+                order for order in self._orders.values()
+                if order['category'] == category
+                and (symbol is None or order['symbol'] == symbol)
+                and (settleCoin is None or order['symbol'].endswith(settleCoin))
+            ),
+            key=lambda order: int(order['createdTime']),
+            reverse=True
+        )
+        return dict(self._page(rows, limit, cursor, 20, 50), category=category), {}
+
+    def _get_tickers(self, category='linear', symbol=None, **_):
+        now = time.time()
+        rows = []
+        for name in ([symbol] if symbol else self.reference):
+            if name not in self.reference:
+                raise _Rejected(10001, f"params error: symbol {name} invalid")
+            price = self.price(name, now)
+            tick = float(self.instruments[name]['priceFilter']['tickSize'])
+            rows.append({
+                'symbol': name,
+                'lastPrice': _fmt(price),
+                'markPrice': _fmt(price),
+                'indexPrice': _fmt(price),
+                'bid1Price': _fmt(price - tick),
+                'ask1Price': _fmt(price + tick),
+                'fundingRate': '0.0001' if category == 'linear' else '',
+                'volume24h': '1000000',
+            })
+        return {'category': category, 'list': rows}, {}
+
+    def _get_instruments_info(self, category='linear', symbol=None, limit=None, cursor=None, **_):
+        rows = [info for name, info in self.instruments.items() if symbol is None or name == symbol]
+        return dict(self._page(rows, limit, cursor, 500, 1000), category=category), {}
+
+    def _place_order(self, category='linear', **params):
+        return self._submit(**params), {}
+
+    def _place_batch_order(self, category='linear', request=(), **_):
+        if len(request) > 10:
+            raise _Rejected(10001, "params error: a batch holds at most 10 orders")
+        orders, statuses = [], []
+        for params in request:
+            try:
+                orders.append(dict(self._submit(**params), symbol=params.get('symbol', ''), category=category))
+                statuses.append({'code': 0, 'msg': 'OK'})
+            except _Rejected as e:
+                orders.append({'orderId': '', 'orderLinkId': params.get('orderLinkId', ''), 'category': category})
+                statuses.append({'code': e.code, 'msg': e.message})
+        return {'list': orders}, {'list': statuses}
+
+    def _cancel_all_orders(self, category='linear', symbol=None, baseCoin=None, settleCoin=None, **_):
+        if category == 'linear' and not (symbol or baseCoin or settleCoin):
+            raise _Rejected(10001, "params error: symbol, baseCoin or settleCoin is required")
+        cancelled = [
+            order_id for order_id, order in self._orders.items()
+            if order['category'] == category
+            and (symbol is None or order['symbol'] == symbol)
+            and (baseCoin is None or order['symbol'].startswith(baseCoin))
+            and (settleCoin is None or order['symbol'].endswith(settleCoin))
+        ]
+        rows = []
+        for order_id in cancelled:
+            order = self._orders.pop(order_id)
+            rows.append({'orderId': order_id, 'orderLinkId': order['orderLinkId']})
+            self._push('order', [dict(order, orderStatus='Cancelled', leavesQty='0')])
+        if cancelled and self.stream_listeners:
+            self._push_wallet()
+        return {'list': rows, 'success': '1'}, {}
+
+    def _set_leverage(self, category='linear', symbol=None, buyLeverage=None, sellLeverage=None, **_):
+        self._check_symbol(symbol)
+        leverage = float(buyLeverage)
+        if not 1 <= leverage <= 100:
+            raise _Rejected(10001, "params error: leverage out of range")
+        if self._leverage.get(symbol, DEFAULT_LEVERAGE) == leverage:
+            raise _Rejected(110043, "leverage not modified")
+        self._leverage[symbol] = leverage
+        if self.stream_listeners:
+            if symbol in self._positions:
+                self._push_position(symbol)
+            self._push_wallet()
+        return {}, {}
+
+    def _history(self, rows, time_key, symbol, startTime, endTime, limit, cursor):
+        now_ms = int(time.time() * 1000)
+        end = int(endTime) if endTime else now_ms
+        start = int(startTime) if startTime else end - 7 * 24 * 3600 * 1000
+        matched = sorted(
+            (
+                row for row in rows
+                if start <= int(row[time_key]) <= end and (symbol is None or row['symbol'] == symbol)
+            ),
+            key=lambda row: int(row[time_key]),
+            reverse=True
+        )
+        return self._page(matched, limit, cursor, 50, 100)
+
+    def _get_executions(self, category='linear', symbol=None, startTime=None, endTime=None, limit=None,
+                        cursor=None, **_):
+        page = self._history(self._executions, 'execTime', symbol, startTime, endTime, limit, cursor)
+        return dict(page, category=category), {}
+
+    def _get_closed_pnl(self, category='linear', symbol=None, startTime=None, endTime=None, limit=None,
+                        cursor=None, **_):
+        page = self._history(self._closed_pnl, 'updatedTime', symbol, startTime, endTime, limit, cursor)
+        return dict(page, category=category), {}
+
+    # The pybit methods the bot calls
+
+    def get_wallet_balance(self, **params):
+        return self._call('get_wallet_balance', self._wallet_balance, params)
+
+    def get_positions(self, **params):
+        return self._call('get_positions', self._get_positions, params)
+
+    def get_open_orders(self, **params):
+        return self._call('get_open_orders', self._get_open_orders, params)
+
+    def get_tickers(self, **params):
+        return self._call('get_tickers', self._get_tickers, params)
+
+    def get_instruments_info(self, **params):
+        return self._call('get_instruments_info', self._get_instruments_info, params)
+
+    def place_order(self, **params):
+        return self._call('place_order', self._place_order, params)
+
+    def place_batch_order(self, **params):
+        return self._call('place_batch_order', self._place_batch_order, params)
+
+    def cancel_all_orders(self, **params):
+        return self._call('cancel_all_orders', self._cancel_all_orders, params)
+
+    def set_leverage(self, **params):
+        return self._call('set_leverage', self._set_leverage, params)
+
+    def get_executions(self, **params):
+        return self._call('get_executions', self._get_executions, params)
+
+    def get_closed_pnl(self, **params):
+        return self._call('get_closed_pnl', self._get_closed_pnl, params)
+
+
+class SimulatedTelegram(BaseRequest):
+    """Answers Bot API requests locally after ``latency`` seconds, counting them by endpoint.
+
+    Pass it to ``Application.builder().request(...)`` to run the bot
+    without network access; sent and edited messages come back as
+    Telegram would return them. Raw updates passed to ``deliver`` are
+    served to getUpdates, which long-polls like Telegram's.
+    """
+
+    def __init__(self, latency=SIMULATOR_TELEGRAM_LATENCY, bot_id=1):
+        self.latency = latency
+        self.bot_id = bot_id
+        self.requests = {}
+        self._message_ids = itertools.count(1000)
+        self._updates = []
+        self._updates_waiting = asyncio.Event()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params, message_id=None):
+        return {
+            'message_id': message_id or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': {'id': self.bot_id, 'is_bot': True, 'first_name': 'Simulated bot'},
+            'text': params.get('text', ''),
+        }
+
+    def deliver(self, update):
+        """Queue a raw update for the bot's next getUpdates."""
+        self._updates.append(update)
+        self._updates_waiting.set()
+
+    async def _get_updates(self, params):
+        # Half the latency there, then the long poll, then half the way back
+        await asyncio.sleep(self.latency / 2)
+        # Updates below the offset have been confirmed by the bot
+        offset = int(params.get('offset') or 0)
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates and params.get('timeout'):
+            try:
+                await asyncio.wait_for(self._updates_waiting.wait(), float(params['timeout']))
+            except asyncio.TimeoutError:
+                pass
+        self._updates_waiting.clear()
+        updates = self._updates[:int(params.get('limit') or 100)]
+        await asyncio.sleep(self.latency / 2)
+        return updates
+
+    def _answer(self, endpoint, params):
+        if endpoint == 'getMe':
+            return {'id': self.bot_id, 'is_bot': True, 'first_name': 'Simulated bot', 'username': 'simulated_bot'}
+        if endpoint == 'sendMessage':
+            return self._message(params)
+        if endpoint == 'editMessageText':
+            return self._message(params, int(params.get('message_id', 0)))
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint == 'getUpdates':
+            result = await self._get_updates(params)
+        else:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            result = self._answer(endpoint, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+class UpdateDriver:
+    """Builds the updates Telegram delivers when a user taps a button or sends text.
+
+    Every user talks to the bot in their own private chat, whose id is the
+    user id. Without a ``bot`` only the raw update dicts are available, for
+    handing updates to worker processes.
+    """
+
+    def __init__(self, bot=None, menu_message_id=1):
+        self.bot = bot
+        self.bot_user = {
+            'id': bot.id if bot else 1,
+            'is_bot': True,
+            'first_name': bot.first_name if bot else 'Simulated bot',
+        }
+        self.menu_message_id = menu_message_id
+        self._update_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+
+    def _chat(self, user_id):
+        return {'id': user_id, 'type': 'private', 'first_name': f'User {user_id}'}
+
+    def press_data(self, user_id, data):
+        """A tap on an inline button carrying ``data`` under the user's menu message, as a raw update."""
+        return {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._query_ids)),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': self.menu_message_id,
+                    'date': int(time.time()),
+                    'chat': self._chat(user_id),
+                    'from': self.bot_user,
+                    'text': 'Menu',
+                },
+            },
+        }
+
+    def send_data(self, user_id, text):
+        """A text message as a raw update; a leading /command is marked up the way Telegram does."""
+        message = {
+            'message_id': next(self._update_ids),
+            'date': int(time.time()),
+            'chat': self._chat(user_id),
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': message['message_id'], 'message': message}
+
+    def press(self, user_id, data):
+        return Update.de_json(self.press_data(user_id, data), self.bot)
+
+    def send(self, user_id, text):
+        return Update.de_json(self.send_data(user_id, text), self.bot)
@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_left
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+PAGE_SIZE = 12
+BUTTONS_PER_ROW = 3
+MAX_RECENTS = 6
+
+
+class SymbolSearch:
+    """Prefix and fuzzy lookup over a fixed list of symbols.
+
+    Prefix matches come from a binary search over the sorted symbols (and
+    over their base coins); only when those run short do we fall back to a
+    substring and then a subsequence scan.
+    """
+
+    def __init__(self, instruments=()):
+        self.symbols = sorted(instrument.symbol for instrument in instruments)
+        self._symbol_set = frozenset(self.symbols)
+        self._by_base = sorted((instrument.base_coin, instrument.symbol) for instrument in instruments)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._symbol_set
+
+    def _prefix(self, query):
+        matches = []
+        i = bisect_left(self.symbols, query)
+        while i < len(self.symbols) and self.symbols[i].startswith(query):
+            matches.append(self.symbols[i])
+            i += 1
+        i = bisect_left(self._by_base, (query,))
+        while i < len(self._by_base) and self._by_base[i][0].startswith(query):
+            matches.append(self._by_base[i][1])
+            i += 1
+        return matches
+
+    def _fuzzy(self, query):
+        # Characters of the query in order, with anything in between
+        pattern = re.compile('.*?'.join(map(re.escape, query)))
+        return filter(pattern.search, self.symbols)
+
+    def search(self, query, limit=PAGE_SIZE * 5):
+        query = query.strip().upper().replace('/', '').replace('-', '')
+        if not query:
+            return self.symbols[:limit]
+
+        results = []
+        seen = set()
+
+        def add(symbols):
+            for symbol in symbols:
+                if symbol not in seen:
+                    seen.add(symbol)
+                    results.append(symbol)
+
+        if query in self._symbol_set:
+            add([query])
+        add(self._prefix(query))
+        if len(results) < limit:
+            add(symbol for symbol in self.symbols if query in symbol)
+        if len(results) < limit:
+            add(self._fuzzy(query))
+        return results[:limit]
+
+
+def remember_symbol(user_data, symbol):
+    recents = [s for s in user_data.get('recent_symbols', []) if s != symbol]
+    user_data['recent_symbols'] = [symbol] + recents[:MAX_RECENTS - 1]
+
+
+def toggle_favorite(user_data, symbol):
+    favorites = user_data.setdefault('favorite_symbols', [])
+    if symbol in favorites:
+        favorites.remove(symbol)
+        return False
+    favorites.append(symbol)
+    return True
+
+
+def _button_rows(symbols, prefix):
+    buttons = [
+        InlineKeyboardButton(symbol, callback_data=f'{prefix}{symbol}')
+        for symbol in symbols
+    ]
+    return [buttons[i:i + BUTTONS_PER_ROW] for i in range(0, len(buttons), BUTTONS_PER_ROW)]
+
+
+def symbol_keyboard(symbols, page, prefix, pinned=()):
+    """Inline keyboard for one page of ``symbols``; ``pinned`` rows go on the first page."""
+    pages = max(1, (len(symbols) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    keyboard = []
+    if page == 0 and pinned:
+        keyboard += _button_rows(pinned, prefix)
+    keyboard += _button_rows(symbols[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], prefix)
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f'sympage_{page - 1}'))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f'sympage_{page + 1}'))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data='back_to_menu')])
+    return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,291 @@
+import heapq
+import itertools
+
+ALERT = 'alert'
+TAKE_PROFIT = 'take_profit'
+STOP_LOSS = 'stop_loss'
+TRAILING_STOP = 'trailing_stop'
+
+
+class Rule:
+    """One user-defined trigger. ``side`` is the side of the position it protects."""
+
+    __slots__ = (
+        'id', 'chat_id', 'symbol', 'kind', 'direction', 'price', 'pct',
+        'side', 'qty', 'linked_id', 'active', 'peak', 'group', 'user_id',
+    )
+
+    def __init__(self, id, chat_id, symbol, kind, direction=None, price=None, pct=None,
+                 side=None, qty=None, linked_id=None, peak=None, user_id=None):
+        self.id = id
+        self.chat_id = chat_id
+        # Whose account closes the position; rules from before accounts existed have none
+        self.user_id = user_id
+        self.symbol = symbol
+        self.kind = kind
+        self.direction = direction
+        self.price = price
+        self.pct = pct
+        self.side = side
+        self.qty = qty
+        self.linked_id = linked_id
+        self.active = True
+        self.peak = peak
+        self.group = None
+
+    def to_record(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('active', 'group')}
+
+    def describe(self):
+        if self.kind == TRAILING_STOP:
+            return f"#{self.id} {self.symbol} trailing stop {self.pct * 100:g}% ({self.qty})"
+        label = {ALERT: 'alert', TAKE_PROFIT: 'take profit', STOP_LOSS: 'stop loss'}[self.kind]
+        text = f"#{self.id} {self.symbol} {label} {self.direction} {self.price:g}"
+        return f"{text} ({self.qty})" if self.qty else text
+
+
+class _ThresholdBook:
+    """Rules firing once the price crosses a fixed level: one heap per direction."""
+
+    def __init__(self):
+        self.above = []
+        self.below = []
+
+    def add(self, rule, seq):
+        if rule.direction == 'above':
+            heapq.heappush(self.above, (rule.price, seq, rule))
+        else:
+            heapq.heappush(self.below, (-rule.price, seq, rule))
+
+    def crossed(self, price):
+        fired = []
+        while self.above and self.above[0][0] <= price:
+            fired.append(heapq.heappop(self.above)[2])
+        while self.below and -self.below[0][0] >= price:
+            fired.append(heapq.heappop(self.below)[2])
+        return fired
+
+
+class _TrailingBook:
+    """Trailing stops on one side of the book.
+
+    A stop fires once the price falls ``pct`` below the best price seen since
+    the stop was created. Short stops reuse the same logic on negated prices
+    (sign=-1). Stops whose peaks a new price overtakes all end up sharing
+    that price as their peak, so they are merged into one group keyed by
+    peak; groups sit in a heap by peak, and a second heap orders them by the
+    stop level of their tightest rule. Each tick therefore costs O(log n)
+    amortized instead of a scan over every stop.
+    """
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.groups = {}
+        self.by_peak = []
+        self.by_level = []
+        self._ids = itertools.count()
+
+    def _level(self, peak, pct):
+        return peak * (1 - self.sign * pct)
+
+    def _push_level(self, group_id):
+        peak, rules, version = self.groups[group_id]
+        while rules and not rules[0][2].active:
+            heapq.heappop(rules)
+        if not rules:
+            del self.groups[group_id]
+            return
+        heapq.heappush(self.by_level, (-self._level(peak, rules[0][0]), group_id, version))
+
+    def _new_group(self, peak, rules):
+        group_id = next(self._ids)
+        self.groups[group_id] = [peak, rules, 0]
+        for _, _, rule in rules:
+            rule.group = group_id
+        heapq.heappush(self.by_peak, (peak, group_id))
+        self._push_level(group_id)
+        return group_id
+
+    def add(self, rule, seq, price):
+        peak = max(price, rule.peak * self.sign) if rule.peak is not None else price
+        self._new_group(peak, [(rule.pct, seq, rule)])
+
+    def peak_of(self, rule):
+        group = self.groups.get(rule.group)
+        return group[0] * self.sign if group else None
+
+    def on_price(self, price):
+        # Every group whose peak the price overtook now peaks at the price
+        merged = None
+        while self.by_peak and self.by_peak[0][0] < price:
+            _, group_id = heapq.heappop(self.by_peak)
+            group = self.groups.pop(group_id, None)
+            if group is None:
+                continue
+            rules = group[1]
+            if merged is None:
+                merged = rules
+                continue
+            if len(rules) > len(merged):
+                merged, rules = rules, merged
+            for item in rules:
+                heapq.heappush(merged, item)
+        if merged is not None:
+            self._new_group(price, merged)
+
+        fired = []
+        while self.by_level:
+            neg_level, group_id, version = self.by_level[0]
+            group = self.groups.get(group_id)
+            if group is None or group[2] != version:
+                heapq.heappop(self.by_level)
+                continue
+            if price > -neg_level:
+                break
+            heapq.heappop(self.by_level)
+            _, rules, _ = group
+            rule = heapq.heappop(rules)[2]
+            if rule.active:
+                fired.append(rule)
+            group[2] += 1
+            self._push_level(group_id)
+        return fired
+
+
+class _SymbolBook:
+    def __init__(self):
+        self.thresholds = _ThresholdBook()
+        self.long_trailing = _TrailingBook(1)
+        self.short_trailing = _TrailingBook(-1)
+        self.last_price = None
+
+
+class TriggerEngine:
+    """Evaluates alerts, bracket TP/SL and trailing stops against a price feed.
+
+    ``on_price`` returns the rules that fired; acting on them (notifying,
+    sending the closing order) is up to the caller. Fired and cancelled
+    rules are removed; a bracket leg firing cancels its sibling.
+    """
+
+    def __init__(self):
+        self.rules = {}
+        self.books = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def _book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = _SymbolBook()
+        return book
+
+    def symbols(self):
+        return {rule.symbol for rule in self.rules.values()}
+
+    def _add(self, rule, price=None):
+        book = self._book(rule.symbol)
+        if rule.kind == TRAILING_STOP:
+            start = next((p for p in (price, book.last_price, rule.peak) if p is not None), None)
+            if start is None:
+                raise ValueError("A trailing stop needs a current price to start from.")
+            if rule.side == 'Buy':
+                book.long_trailing.add(rule, next(self._seq), start)
+            else:
+                book.short_trailing.add(rule, next(self._seq), -start)
+        else:
+            book.thresholds.add(rule, next(self._seq))
+        self.rules[rule.id] = rule
+        return rule
+
+    def add_alert(self, chat_id, symbol, direction, price):
+        return self._add(Rule(next(self._ids), chat_id, symbol, ALERT, direction=direction, price=price))
+
+    def add_bracket(self, chat_id, symbol, side, qty, take_profit=None, stop_loss=None, user_id=None):
+        """Take profit and/or stop loss for a position; whichever fires first cancels the other."""
+        long = side == 'Buy'
+        legs = []
+        if take_profit is not None:
+            legs.append(Rule(next(self._ids), chat_id, symbol, TAKE_PROFIT, direction='above' if long else 'below',
+                             price=take_profit, side=side, qty=qty, user_id=user_id))
+        if stop_loss is not None:
+            legs.append(Rule(next(self._ids), chat_id, symbol, STOP_LOSS, direction='below' if long else 'above',
+                             price=stop_loss, side=side, qty=qty, user_id=user_id))
+        if len(legs) == 2:
+            legs[0].linked_id, legs[1].linked_id = legs[1].id, legs[0].id
+        return [self._add(leg) for leg in legs]
+
+    def add_trailing_stop(self, chat_id, symbol, side, qty, pct, price=None, user_id=None):
+        rule = Rule(next(self._ids), chat_id, symbol, TRAILING_STOP, pct=pct, side=side, qty=qty, user_id=user_id)
+        return self._add(rule, price)
+
+    def cancel(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return None
+        # Heaps drop inactive rules lazily when they reach the top
+        rule.active = False
+        if rule.linked_id is not None:
+            self.cancel(rule.linked_id)
+        return rule
+
+    def rules_for(self, chat_id):
+        return sorted((rule for rule in self.rules.values() if rule.chat_id == chat_id), key=lambda rule: rule.id)
+
+    def on_price(self, symbol, price):
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+        book.last_price = price
+        candidates = book.thresholds.crossed(price)
+        candidates += book.long_trailing.on_price(price)
+        candidates += book.short_trailing.on_price(-price)
+
+        fired = []
+        for rule in candidates:
+            if not rule.active:
+                continue
+            rule.active = False
+            self.rules.pop(rule.id, None)
+            if rule.linked_id is not None:
+                self.cancel(rule.linked_id)
+            fired.append(rule)
+        return fired
+
+    def export(self):
+        """Active rules as plain dicts, trailing stops with the peak reached so far."""
+        records = []
+        for rule in self.rules.values():
+            record = rule.to_record()
+            if rule.kind == TRAILING_STOP:
+                book = self.books[rule.symbol]
+                trailing = book.long_trailing if rule.side == 'Buy' else book.short_trailing
+                record['peak'] = trailing.peak_of(rule)
+            records.append(record)
+        return records
+
+    def load(self, records):
+        # Bracket legs point at each other by id, so keep the stored ids
+        for record in sorted(records, key=lambda record: record['id']):
+            self._add(Rule(**record))
+        self._ids = itertools.count(max((record['id'] for record in records), default=0) + 1)
+
+
+def ticker_prices(messages):
+    """(symbol, price) pairs from recorded ticker stream messages."""
+    for message in messages:
+        topic = message.get('topic', '')
+        if not topic.startswith('tickers.'):
+            continue
+        data = message.get('data', {})
+        price = data.get('lastPrice') or data.get('markPrice')
+        if price:
+            yield topic.split('.', 1)[1], float(price)
+
+
+def replay(engine, messages):
+    """Run recorded ticker messages through ``engine``; returns (rule, price) per firing."""
+    fired = []
+    for symbol, price in ticker_prices(messages):
+        fired.extend((rule, price) for rule in engine.on_price(symbol, price))
+    return fired
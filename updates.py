@@ -0,0 +1,49 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats concurrently.
+
+    Updates belonging to the same chat still run one after another, so the
+    ConversationHandlers never see two steps of the same flow at once.
+    """
+
+    def __init__(self, max_concurrent_updates=256):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        # chat -> updates holding or waiting for the chat's lock
+        self._users = {}
+
+    def _chat_key(self, update):
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self._chat_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            # Drop idle locks so the dict doesn't grow with every chat ever seen
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                self._locks.pop(key, None)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._locks.clear()
+        self._users.clear()